@@ -0,0 +1,302 @@
+"""
+
+Batched moves for py2187 using NumPy
+
+Boards are held in an (N, rows, cols) integer array with 0 for an empty
+cell. Tile values are turned into the small codes used by the packed engine,
+every line that has to move is gathered into one array, and each distinct
+line is looked up once in the packed engine's transition tables. So the
+batched moves follow exactly the same merge rules as py2187.make_move.
+
+Directions are indexes into DIRECTIONS.
+
+"""
+
+import numpy as np
+
+import py2187
+import packed
+
+
+UP = 0
+DOWN = 1
+LEFT = 2
+RIGHT = 3
+
+DIRECTIONS = (py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE)
+
+# The most lines of one length a line table's arrays hold
+MAX_ARRAY_LINES = 1 << 21
+
+
+
+def direction_index(vector):
+    return DIRECTIONS.index(list(vector))
+
+
+
+def board_to_array(board):
+    return np.array([[0 if value == None else value for value in row] for row in board],
+                    dtype=np.int64)
+
+
+
+def array_to_board(array):
+    return [[None if value == 0 else int(value) for value in row] for row in array]
+
+
+
+def to_codes(engine, values):
+    """
+    Converts an array of tile values (0 for empty) to an array of engine codes.
+    """
+
+    unique_values, inverse = np.unique(values, return_inverse=True)
+    unique_codes = np.array([engine.code(int(value) if value != 0 else None)
+                             for value in unique_values], dtype=np.uint8)
+
+    return unique_codes[inverse].reshape(values.shape)
+
+
+
+def from_codes(engine, codes, dtype=np.int64):
+    lookup = np.array([0 if value == None else value for value in engine.values], dtype=dtype)
+    return lookup[codes]
+
+
+
+class _LineArrays:
+    """
+    The moves of the lines of one length that a packed line table has been
+    asked for, held as arrays sorted by line key so that any number of
+    lines can be looked up with one searchsorted. Lines that aren't held
+    yet are worked out by the line table and added. When more than
+    max_lines are held the arrays are started again.
+    """
+
+    def __init__(self, length, max_lines=MAX_ARRAY_LINES):
+        self.length = length
+        self.max_lines = max_lines
+        self.clear()
+
+
+    def clear(self):
+        self.keys = line_keys(np.zeros((0, self.length), dtype=np.uint8))
+        self.new_lines = np.zeros((0, self.length), dtype=np.uint8)
+        self.points = np.zeros(0, dtype=np.int64)
+
+
+    def find(self, keys):
+        # Returns (indexes, found) for an array of keys
+        indexes = np.searchsorted(self.keys, keys)
+        if len(self.keys) == 0:
+            return (indexes, np.zeros(len(keys), dtype=bool))
+
+        np.minimum(indexes, len(self.keys) - 1, out=indexes)
+        return (indexes, self.keys[indexes] == keys)
+
+
+    def add(self, table, keys, lines):
+        """
+        Works out and adds the distinct lines among lines, whose keys are keys.
+        """
+
+        keys, first = np.unique(keys, return_index=True)
+        lines = lines[first]
+
+        new_lines = np.empty_like(lines)
+        points = np.empty(len(lines), dtype=np.int64)
+        get_line = dict.get
+        for i in range(len(lines)):
+            line = lines[i].tobytes()
+            new_line = get_line(table, line)
+            if new_line == None:
+                new_line, points[i], merge_lengths = table.work_out(line)
+            else:
+                points[i] = table.points[line]
+            new_lines[i] = np.frombuffer(new_line, dtype=np.uint8)
+
+        if len(self.keys) + len(keys) > self.max_lines:
+            self.clear()
+
+        positions = np.searchsorted(self.keys, keys)
+        self.keys = np.insert(self.keys, positions, keys)
+        self.new_lines = np.insert(self.new_lines, positions, new_lines, axis=0)
+        self.points = np.insert(self.points, positions, points)
+
+
+
+def line_keys(lines):
+    """
+    Returns an array with a sortable key for each line of a 2D uint8 array
+    of codes: a uint64 for lines of up to 8 cells, and the line's bytes for
+    longer ones.
+    """
+
+    count, length = lines.shape
+    if length <= 8:
+        padded = np.zeros((count, 8), dtype=np.uint8)
+        padded[:, :length] = lines
+        return padded.view('<u8').ravel()
+
+    return np.ascontiguousarray(lines).view(np.dtype((np.void, length))).ravel()
+
+
+
+def move_lines(lines, table, return_points=False):
+    """
+    Moves every line in a 2D uint8 array of codes using a packed line table
+    (engine.toward_start or engine.toward_end). The lines are looked up
+    all at once in the table's _LineArrays, and only lines that haven't
+    been seen before are worked out one by one. If return_points is true,
+    returns (new_lines, points) where points holds the sum of the tiles
+    made by merges in each line.
+    """
+
+    count, length = lines.shape
+    if count == 0 or length == 0:
+        if return_points:
+            return (lines.copy(), np.zeros(count, dtype=np.int64))
+        return lines.copy()
+
+    if table.line_arrays == None:
+        table.line_arrays = {}
+    arrays = table.line_arrays.get(length)
+    if arrays == None:
+        arrays = _LineArrays(length)
+        table.line_arrays[length] = arrays
+
+    keys = line_keys(lines)
+    indexes, found = arrays.find(keys)
+    if not found.all():
+        missing = ~found
+        arrays.add(table, keys[missing], lines[missing])
+        indexes, found = arrays.find(keys)
+
+    if return_points:
+        return (arrays.new_lines[indexes], arrays.points[indexes])
+
+    return arrays.new_lines[indexes]
+
+
+
+def move_codes(engine, codes, direction, return_points=False):
+    """
+    Makes one move on every board in an (N, rows, cols) array of codes.
+    If return_points is true, returns (new_codes, points) where points holds
+    the sum of the tiles made by merges on each board.
+    """
+
+    if direction == UP or direction == DOWN:
+        lines = codes.transpose(0, 2, 1)
+    else:
+        lines = codes
+
+    if direction == DOWN or direction == RIGHT:
+        table = engine.toward_end
+    else:
+        table = engine.toward_start
+
+    count, line_count, length = lines.shape
+    if return_points:
+        new_lines, points = move_lines(lines.reshape(count * line_count, length), table, True)
+        points = points.reshape(count, line_count).sum(axis=1)
+    else:
+        new_lines = move_lines(lines.reshape(count * line_count, length), table)
+    new_lines = new_lines.reshape(count, line_count, length)
+
+    if direction == UP or direction == DOWN:
+        new_lines = new_lines.transpose(0, 2, 1)
+
+    if return_points:
+        return (new_lines, points)
+
+    return new_lines
+
+
+
+def make_moves(boards, directions, merge_lengths_func=None, merge_length=2):
+    """
+    Makes a move on each board in an (N, rows, cols) integer array.
+    directions is either a single direction shared by every board or an
+    array of N directions. Like make_move, the default merge rule merges
+    merge_length equal tiles.
+
+    Returns (new_boards, moved) where moved is a boolean array of length N.
+    """
+
+    boards = np.asarray(boards)
+    engine = packed.get_engine(merge_lengths_func, merge_length)
+    codes = to_codes(engine, boards)
+
+    if np.ndim(directions) == 0:
+        new_codes = move_codes(engine, codes, int(directions))
+    else:
+        directions = np.asarray(directions)
+        if directions.shape != boards.shape[:1]:
+            raise ValueError("There must be one direction per board.")
+        if not np.isin(directions, range(len(DIRECTIONS))).all():
+            raise ValueError("Directions must be between 0 and %d." % (len(DIRECTIONS) - 1))
+
+        new_codes = np.empty_like(codes)
+        for direction in range(len(DIRECTIONS)):
+            selected = directions == direction
+            if selected.any():
+                new_codes[selected] = move_codes(engine, codes[selected], direction)
+
+    moved = (new_codes != codes).any(axis=(1, 2))
+    new_boards = from_codes(engine, new_codes, boards.dtype)
+
+    return (new_boards, moved)
+
+
+
+def seed_indexes(thresholds, uniforms):
+    """
+    Returns the index of the seed picked by each of an array of uniform
+    random numbers in [0, 1), where thresholds is the running total of the
+    seed probabilities. Seed i is picked by the numbers in
+    [thresholds[i - 1], thresholds[i]).
+    """
+
+    # The last threshold can fall just short of 1 by rounding
+    indexes = np.searchsorted(thresholds, uniforms, side='right')
+    return np.minimum(indexes, len(thresholds) - 1)
+
+
+
+def add_seed_tiles(boards, seeds, rng=None):
+    """
+    Adds a seed tile to a random empty cell of every board that has one,
+    choosing the value from seeds the same way add_seed_tile does.
+    The boards are changed in place and returned.
+    """
+
+    if rng == None:
+        rng = np.random.default_rng()
+
+    count = boards.shape[0]
+    flat_boards = boards.reshape(count, -1)
+
+    empty = flat_boards == 0
+    has_empty = empty.any(axis=1)
+
+    # A uniform random number for each empty cell; the largest picks the cell.
+    choice = rng.random(flat_boards.shape)
+    choice[~empty] = -1.0
+    cells = choice.argmax(axis=1)
+
+    # A seed of None (no tile) is 0
+    probabilities = py2187.seed_probabilities(seeds)
+    thresholds = np.cumsum([probability for value, probability in probabilities])
+    seed_values = np.array([0 if value == None else value for value, probability in probabilities],
+                           dtype=boards.dtype)
+    values = seed_values[seed_indexes(thresholds, rng.random(count))]
+
+    rows = np.nonzero(has_empty)[0]
+    flat_boards[rows, cells[rows]] = values[rows]
+    if not np.shares_memory(flat_boards, boards):
+        boards[...] = flat_boards.reshape(boards.shape)
+
+    return boards
+
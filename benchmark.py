@@ -0,0 +1,355 @@
+"""
+
+Benchmarks for the py2187 engine
+
+Times the hot paths of the list-of-lists engine (make_move in each
+direction, Game.valid_move_exists, Game.add_seed_tile, copy_board and whole
+headless games), and a move of the packed engine, on boards from 4x4 to
+64x64 under each style of merge rule.
+
+Results are written as JSON and can be compared against a stored baseline:
+
+    python benchmark.py --out results.json --baseline benchmark_baseline.json
+
+The whole suite is run several times over and each timing is the median of
+its rounds, so a slow spell of the machine only spoils one round of each
+timing rather than every round of a few. Everything timed is called once
+before the timing starts, so caches such as the packed engine's line
+tables are warm in every round. The spread of the rounds, their
+interquartile range over the median, is kept with the median, and a timing
+counts as slower than the baseline when it is slower by more than the
+threshold (25% by default) plus the spreads of both runs. The spreads can
+add at most SPREAD_LIMIT times the threshold, so a noisy timing can't hide
+a real slowdown. Timings under a microsecond are mostly the cost of the
+timing itself and only count when they are FAST_THRESHOLD slower. Anything
+slower is reported and the exit status is 1. Timings depend on the machine, so a
+baseline should be made with --save-baseline on the machine it is
+compared on.
+
+"""
+
+import sys
+import json
+import statistics
+import time
+import random
+import platform
+import argparse
+
+import py2187
+import packed
+
+
+SIZES = (4, 8, 16, 32, 64)
+
+RULES = {
+    'merge2': {'merge_length': 2, 'seeds': ((2,0.9),(4,0.1))},
+    'merge3': {'merge_length': 3, 'seeds': ((3,0.9),(9,0.1))},
+    'power': {'merge_lengths_func': py2187.power_merge_lengths,
+              'seeds': ((2,0.6),(3,0.3),(4,0.1))},
+}
+
+MOVES = (('up', py2187.UP_MOVE), ('down', py2187.DOWN_MOVE),
+         ('left', py2187.LEFT_MOVE), ('right', py2187.RIGHT_MOVE))
+
+# Whole games are cut off after this many moves
+GAME_MOVES = 200
+
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_ROUNDS = 5
+
+# The most the spreads of a timing can add to the threshold, as a fraction
+# of the threshold
+SPREAD_LIMIT = 0.8
+
+# Timings faster than this are only compared with FAST_THRESHOLD
+FAST_SECONDS = 1e-6
+FAST_THRESHOLD = 0.75
+
+RESULTS_VERSION = 3
+
+
+
+def measure(func, calls=1, setup=None, min_time=0.05, repeats=3):
+    """
+    Returns the best time in seconds for one call of func. func is called
+    in batches that take at least min_time; func itself may make calls
+    calls of the thing being timed. setup is called, untimed, before
+    each batch. func is called once, untimed, before any batch so the
+    caches it fills are warm.
+    """
+
+    if setup != None:
+        setup()
+    func()
+
+    best = None
+    for i in range(repeats):
+        count = 0
+        seconds = 0.0
+        while seconds < min_time:
+            if setup != None:
+                setup()
+            start = time.perf_counter()
+            func()
+            seconds += time.perf_counter() - start
+            count += calls
+
+        if best == None or seconds / count < best:
+            best = seconds / count
+
+    return best
+
+
+
+def create_game(size, rule, random_seed=0):
+    return py2187.Game(rows=size, cols=size, random_seed=random_seed, **RULES[rule])
+
+
+
+def half_full_game(size, rule):
+    """
+    Returns a game with about half its cells filled at random with seed tiles.
+    """
+
+    game = create_game(size, rule)
+    rng = random.Random(size)
+    seed_table = py2187.AliasTable(game.seeds)
+
+    game.board = [[seed_table.sample(rng) if rng.random() < 0.5 else None
+                   for x in range(size)] for y in range(size)]
+
+    return game
+
+
+
+def play_game(size, rule, random_seed=0):
+    # Plays a random game and returns the number of moves made
+    game = create_game(size, rule, random_seed)
+    game.initialise()
+    rng = random.Random(random_seed)
+
+    moves = 0
+    while moves < GAME_MOVES and game.valid_move_exists():
+        game.make_move(rng.choice(MOVES)[1])
+        if game.moved:
+            game.add_seed_tile()
+            moves += 1
+
+    return moves
+
+
+
+def benchmark(size, rule, min_time=0.05, repeats=3):
+    """
+    Returns a dict of benchmark name to seconds per call for one board
+    size and rule, the best of repeats batches.
+    """
+
+    results = {}
+    game = half_full_game(size, rule)
+    board = game.board
+    merge_rule = game.merge_rule
+
+    for name, vector in MOVES:
+        results['make_move_' + name] = measure(
+            lambda: py2187.make_move(board, vector, merge_rule), min_time=min_time,
+            repeats=repeats)
+
+    # The four packed moves are timed together
+    engine = packed.engine_for_game(game)
+    packed_board = engine.pack(board)
+    movers = list(engine.movers(size, size).values())
+
+    def packed_moves():
+        for move in movers:
+            move(packed_board)
+
+    results['packed_move'] = measure(packed_moves, len(movers), min_time=min_time,
+                                     repeats=repeats)
+
+    results['valid_move_exists'] = measure(game.valid_move_exists, min_time=min_time,
+                                           repeats=repeats)
+    results['copy_board'] = measure(lambda: py2187.copy_board(board), min_time=min_time,
+                                    repeats=repeats)
+
+    # Spawns are timed in batches on a copy of the board that is put back
+    # before each batch.
+    spawns = max(1, min(100, len(game.get_empty_cells()) - 1))
+    spawn_game = create_game(size, rule)
+
+    def reset():
+        spawn_game.board = py2187.copy_board(board)
+
+    def spawn():
+        for i in range(spawns):
+            spawn_game.add_seed_tile()
+
+    results['add_seed_tile'] = measure(spawn, spawns, reset, min_time, repeats)
+
+    # Whole games are timed per move
+    moves = play_game(size, rule)
+    results['game_move'] = measure(lambda: play_game(size, rule), max(1, moves),
+                                   min_time=min_time, repeats=1)
+
+    return results
+
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2 == 1:
+        return values[middle]
+
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+
+def spread(values):
+    """
+    Returns the interquartile range of values over their median.
+    """
+
+    if len(values) < 2:
+        return 0.0
+
+    low, middle, high = statistics.quantiles(values, n=4, method='inclusive')
+    return (high - low) / median(values)
+
+
+
+def run(sizes=SIZES, rules=None, min_time=0.05, out=None, rounds=DEFAULT_ROUNDS):
+    """
+    Runs the benchmarks rounds times over and returns the results as a dict
+    that can be saved as JSON, with the median of each timing and its
+    spread(). Progress is written to out.
+    """
+
+    if rules == None:
+        rules = sorted(RULES)
+
+    samples = {}
+    for i in range(rounds):
+        for rule in rules:
+            for size in sizes:
+                if out != None:
+                    out.write("round %d/%d %s %dx%d\n" % (i + 1, rounds, rule, size, size))
+                    out.flush()
+
+                for name, seconds in benchmark(size, rule, min_time, repeats=1).items():
+                    samples.setdefault("%s/%s/%dx%d" % (name, rule, size, size), []).append(seconds)
+
+    timings = {}
+    spreads = {}
+    for name, seconds in samples.items():
+        timings[name] = median(seconds)
+        spreads[name] = spread(seconds)
+
+    return {
+        'version': RESULTS_VERSION,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'rounds': rounds,
+        'timings': timings,
+        'spreads': spreads,
+    }
+
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns a sorted list of (name, baseline seconds, seconds, ratio) for the
+    timings that are slower than the baseline by more than threshold plus
+    the spreads of both, up to SPREAD_LIMIT times threshold, or by more
+    than FAST_THRESHOLD if the baseline timing is under FAST_SECONDS.
+    """
+
+    regressions = []
+    base_timings = baseline['timings']
+    base_spreads = baseline.get('spreads', {})
+    spreads = results.get('spreads', {})
+    for name, seconds in results['timings'].items():
+        base_seconds = base_timings.get(name)
+        if base_seconds == None or base_seconds <= 0:
+            continue
+
+        allowed = threshold + min(base_spreads.get(name, 0.0) + spreads.get(name, 0.0),
+                                  SPREAD_LIMIT * threshold)
+        if base_seconds < FAST_SECONDS:
+            allowed = max(allowed, FAST_THRESHOLD)
+
+        ratio = seconds / base_seconds
+        if ratio > 1 + allowed:
+            regressions.append((name, base_seconds, seconds, ratio))
+
+    return sorted(regressions)
+
+
+
+def report(results, baseline=None, out=sys.stdout):
+    base_timings = {}
+    if baseline != None:
+        base_timings = baseline['timings']
+
+    spreads = results.get('spreads', {})
+    for name in sorted(results['timings']):
+        seconds = results['timings'][name]
+        line = "%-40s %12.2fus %5.0f%%" % (name, seconds * 1e6, spreads.get(name, 0.0) * 100)
+        if name in base_timings and base_timings[name] > 0:
+            line += " %7.2fx" % (seconds / base_timings[name])
+        out.write(line + "\n")
+
+
+
+def main(args):
+    rules = args.rules
+    if rules == None:
+        rules = sorted(RULES)
+
+    results = run(args.sizes, rules, args.min_time, sys.stderr, args.rounds)
+
+    baseline = None
+    if args.baseline != None and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    report(results, baseline)
+
+    if args.out != None:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        return 0
+
+    if baseline != None:
+        regressions = compare(results, baseline, args.threshold)
+        for name, base_seconds, seconds, ratio in regressions:
+            sys.stdout.write("REGRESSION %s: %.2fus -> %.2fus (%.2fx)\n"
+                             % (name, base_seconds * 1e6, seconds * 1e6, ratio))
+        if len(regressions) > 0:
+            return 1
+
+    return 0
+
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description='Benchmark the py2187 engine.')
+    argparser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    argparser.add_argument('--rules', choices=sorted(RULES), nargs='+')
+    argparser.add_argument('--min-time', type=float, default=0.05)
+    argparser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS)
+    argparser.add_argument('-o', '--out')
+    argparser.add_argument('-b', '--baseline')
+    argparser.add_argument('-t', '--threshold', type=float, default=DEFAULT_THRESHOLD)
+    argparser.add_argument('--save-baseline', action='store_true')
+
+    args = argparser.parse_args()
+    if args.save_baseline and args.baseline == None:
+        argparser.error("--save-baseline needs --baseline")
+
+    sys.exit(main(args))
@@ -0,0 +1,202 @@
+"""
+
+An N-dimensional board engine for py2187
+
+A board of any number of dimensions is held as a NumPy array of the packed
+engine's cell codes, with 0 for an empty cell. A move runs along one axis:
+every line parallel to that axis is gathered into one 2D array and moved at
+once by batched.move_lines, which looks each distinct line up once in the
+packed engine's transition tables. So the moves follow the same merge rules
+as py2187.make_move, whether they come from merge_length or a
+merge_lengths_func such as py2187.power_merge_lengths.
+
+A move vector has one component per axis in the order of py2187's vectors,
+[dx, dy, dz, ...], with exactly one component of 1 or -1. Component k moves
+along array axis ndim - 1 - k, so a 3D board is indexed [z][y][x] and a 2D
+board moves just like a py2187 board. A 3D board has the six moves of
+CUBE_MOVES.
+
+    game = CubeGame((4, 4, 4), merge_length=3)
+    game.initialise()
+    game.make_move(cube.BACK_MOVE)
+
+"""
+
+import random
+
+import numpy as np
+
+import py2187
+import packed
+import batched
+
+
+UP_MOVE = [0, -1, 0]
+DOWN_MOVE = [0, 1, 0]
+LEFT_MOVE = [-1, 0, 0]
+RIGHT_MOVE = [1, 0, 0]
+FRONT_MOVE = [0, 0, -1]
+BACK_MOVE = [0, 0, 1]
+
+CUBE_MOVES = (UP_MOVE, DOWN_MOVE, LEFT_MOVE, RIGHT_MOVE, FRONT_MOVE, BACK_MOVE)
+
+
+
+def axis_moves(ndim):
+    """
+    Returns the 2 * ndim move vectors of an ndim dimensional board.
+    """
+
+    moves = []
+    for k in range(ndim):
+        for step in (-1, 1):
+            vector = [0] * ndim
+            vector[k] = step
+            moves.append(vector)
+
+    return moves
+
+
+
+def vector_axis(vector):
+    """
+    Returns (axis, toward_end) for a move vector.
+    """
+
+    steps = [k for k in range(len(vector)) if vector[k] != 0]
+    if len(steps) != 1 or abs(vector[steps[0]]) != 1:
+        raise ValueError("A move vector has to have one component of 1 or -1: %s" % (vector,))
+
+    k = steps[0]
+    return (len(vector) - 1 - k, vector[k] > 0)
+
+
+
+def move_codes(engine, codes, vector, return_points=False):
+    """
+    Makes a move on an array of codes with as many dimensions as vector has
+    components. Returns the new codes, or (new_codes, points) if
+    return_points is true, where points is the sum of the tiles made by
+    merges.
+    """
+
+    if len(vector) != codes.ndim:
+        raise ValueError("A %d dimensional board needs a vector of %d components."
+                         % (codes.ndim, codes.ndim))
+
+    axis, toward_end = vector_axis(vector)
+    if toward_end:
+        table = engine.toward_end
+    else:
+        table = engine.toward_start
+
+    lines = np.moveaxis(codes, axis, -1)
+    shape = lines.shape
+    lines = lines.reshape(-1, shape[-1])
+
+    if return_points:
+        new_lines, points = batched.move_lines(lines, table, True)
+    else:
+        new_lines = batched.move_lines(lines, table)
+
+    new_codes = np.moveaxis(new_lines.reshape(shape), -1, axis)
+
+    if return_points:
+        return (new_codes, int(points.sum()))
+
+    return new_codes
+
+
+
+class CubeGame:
+    """
+    A game on a board of shape, which is a tuple of any number of sizes,
+    eg (4, 4, 4) for a cube. It has the interface of py2187.Game except for
+    undo and redo, and cells are tuples of array indexes.
+    """
+
+    def __init__(self, shape=(4, 4, 4), seeds=((3,0.9),(9,0.1)),
+                 merge_length=3, merge_lengths_func=None, random_seed=None):
+
+        self.engine = packed.get_engine(merge_lengths_func, merge_length)
+        self.merge_rule = self.engine.merge_rule
+
+        if merge_lengths_func == None:
+            self.merge_lengths_func = self.merge_rule
+            self.merge_length = merge_length
+        else:
+            self.merge_lengths_func = merge_lengths_func
+            self.merge_length = None
+
+        if random_seed == None:
+            random_seed = random.getrandbits(63)
+        self.random_seed = random_seed
+        self.rng = random.Random(random_seed)
+
+        self.shape = tuple(shape)
+        self.moves = axis_moves(len(self.shape))
+        self.seeds = seeds
+        self.codes = np.zeros(self.shape, dtype=np.uint8)
+        self.score = 0
+        self.moved = False
+        self._seed_table = None
+
+
+    def initialise(self):
+        self.add_seed_tile()
+        self.add_seed_tile()
+
+
+    def get_board(self):
+        """
+        Returns the board as nested lists of tile values, None for empty.
+        """
+
+        values = np.array(self.engine.values, dtype=object)
+        return values[self.codes].tolist()
+
+
+    def set_board(self, board):
+        values = np.array(board, dtype=object)
+        if values.shape != self.shape:
+            raise ValueError("The board has to have the shape %s." % (self.shape,))
+
+        self.codes = np.frompyfunc(self.engine.code, 1, 1)(values).astype(np.uint8)
+
+
+    def set_cell(self, cell, value):
+        self.codes[tuple(cell)] = self.engine.code(value)
+
+
+    def make_move(self, vector, animate=False):
+        new_codes, points = move_codes(self.engine, self.codes, vector, True)
+        self.moved = not np.array_equal(new_codes, self.codes)
+        self.codes = new_codes
+        self.score += points
+
+
+    def get_empty_cells(self):
+        return [tuple(int(i) for i in cell) for cell in np.argwhere(self.codes == 0)]
+
+
+    def add_seed_tile(self):
+        if self._seed_table == None or self._seed_table.seeds is not self.seeds:
+            self._seed_table = py2187.AliasTable(self.seeds)
+
+        empty = np.flatnonzero(self.codes == 0)
+        if len(empty) > 0:
+            cell = int(empty[self.rng.randrange(len(empty))])
+            self.codes.flat[cell] = self.engine.code(self._seed_table.sample(self.rng))
+
+
+    def valid_move_exists(self):
+        # Any empty cell next to a tile lets the tile move
+        tile_count = np.count_nonzero(self.codes)
+        if 0 < tile_count < self.codes.size:
+            return True
+
+        for vector in self.moves:
+            if not np.array_equal(move_codes(self.engine, self.codes, vector), self.codes):
+                return True
+
+        return False
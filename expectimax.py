@@ -0,0 +1,230 @@
+"""
+
+An expectimax player for py2187
+
+The search alternates between the player's moves (take the best) and the
+placement of a seed tile (take the average over every empty cell and every
+seed value, weighted by the chance add_seed_tile gives it). It runs on the
+packed engine so it follows the same rules as make_move.
+
+Search is by iterative deepening: each depth is searched in turn until the
+time budget for the move runs out, and the move from the deepest finished
+search is played. If not even the first depth finishes in time, as on a
+big board, the move whose board evaluates best is played. Evaluated
+positions are kept in a transposition table that drops the least recently
+used entries when it is full. The value of a
+position doesn't change when the board is turned or reflected, so the
+table holds each position under its canonical form from symmetry.py and
+its turned copies share the entry.
+
+"""
+
+import math
+import time
+import collections
+
+import py2187
+import packed
+import symmetry
+
+
+GAME_OVER_VALUE = -1000.0
+
+EMPTY_WEIGHT = 2.7
+MERGE_WEIGHT = 1.0
+MONOTONIC_WEIGHT = 1.0
+SUM_WEIGHT = 0.1
+
+
+
+class _Timeout(Exception):
+    pass
+
+
+
+class ExpectimaxAI:
+
+    def __init__(self, game, time_budget=0.1, table_size=100000, max_depth=20,
+                 min_probability=0.0001, symmetric=True):
+
+        self.engine = packed.engine_for_game(game)
+
+        if isinstance(game, packed.PackedGame):
+            self.rows = game.rows
+            self.cols = game.cols
+        else:
+            self.rows = len(game.board)
+            self.cols = len(game.board[0])
+
+        self.time_budget = time_budget
+        self.table_size = table_size
+        self.max_depth = max_depth
+        self.min_probability = min_probability
+
+        # A seed of None (no tile) has code 0, which leaves the board as it is.
+        self.seeds = [(self.engine.code(value), probability)
+                      for value, probability in py2187.seed_probabilities(game.seeds)]
+
+        movers = self.engine.movers(self.rows, self.cols)
+        self.moves = [(vector, movers[tuple(vector)]) for vector in
+                      (py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE)]
+
+        self.table = collections.OrderedDict()
+        if symmetric:
+            self._table_key = symmetry.get_symmetries(self.rows, self.cols).canonical_key
+        else:
+            self._table_key = lambda board: board
+        self.line_values = {}
+        self.depth = 0
+        self._deadline = None
+
+
+    def best_move(self, game):
+        """
+        Returns the best move vector for the game, or None if there is no move.
+        """
+
+        board = game.board
+        if not isinstance(board, int):
+            board = self.engine.pack(board)
+
+        self._deadline = time.perf_counter() + self.time_budget
+        self.depth = 0
+        best_vector = None
+        for depth in range(1, self.max_depth + 1):
+            try:
+                best_vector = self._search_root(board, depth)
+            except _Timeout:
+                break
+
+            self.depth = depth
+
+        if self.depth == 0:
+            best_vector = self._greedy_move(board)
+
+        return best_vector
+
+
+    def _greedy_move(self, board):
+        best_vector = None
+        best_value = None
+        for vector, move in self.moves:
+            new_board, moved = move(board)
+            if moved:
+                value = self.evaluate(new_board)
+                if best_value == None or value > best_value:
+                    best_vector = vector
+                    best_value = value
+
+        return best_vector
+
+
+    def _search_root(self, board, depth):
+        best_vector = None
+        best_value = None
+        for vector, move in self.moves:
+            new_board, moved = move(board)
+            if moved:
+                value = self._chance_value(new_board, depth, 1.0)
+                if best_value == None or value > best_value:
+                    best_vector = vector
+                    best_value = value
+
+        return best_vector
+
+
+    def _max_value(self, board, depth, probability):
+        if depth == 0 or probability < self.min_probability:
+            return self.evaluate(board)
+
+        # A value is cut short by min_probability less the more probable the
+        # path it was reached by, so an entry is only used for a path at
+        # most as probable as its own.
+        key = self._table_key(board)
+        entry = self.table.get(key)
+        if entry != None and entry[0] >= depth and entry[1] >= probability:
+            self.table.move_to_end(key)
+            return entry[2]
+
+        best_value = GAME_OVER_VALUE
+        for vector, move in self.moves:
+            new_board, moved = move(board)
+            if moved:
+                value = self._chance_value(new_board, depth, probability)
+                if value > best_value:
+                    best_value = value
+
+        self.table[key] = (depth, probability, best_value)
+        self.table.move_to_end(key)
+        if len(self.table) > self.table_size:
+            self.table.popitem(last=False)
+
+        return best_value
+
+
+    def _chance_value(self, board, depth, probability):
+        cells = board.to_bytes(self.rows * self.cols, 'little')
+        empty_cells = [i for i, code in enumerate(cells) if code == 0]
+
+        if len(empty_cells) == 0:
+            return self._max_value(board, depth - 1, probability)
+
+        cell_probability = 1.0 / len(empty_cells)
+
+        value = 0.0
+        for cell in empty_cells:
+            if time.perf_counter() > self._deadline:
+                raise _Timeout()
+
+            shift = cell * packed.CELL_BITS
+            for code, seed_probability in self.seeds:
+                child_probability = cell_probability * seed_probability
+                value += child_probability * self._max_value(
+                    board | (code << shift), depth - 1, probability * child_probability)
+
+        return value
+
+
+    def evaluate(self, board):
+        """
+        A heuristic value for a board: the sum of the values of its rows and columns.
+        """
+
+        cells = board.to_bytes(self.rows * self.cols, 'little')
+        cols = self.cols
+
+        value = 0.0
+        for y in range(self.rows):
+            value += self._line_value(cells[y * cols:(y + 1) * cols])
+        for x in range(cols):
+            value += self._line_value(cells[x::cols])
+
+        return value
+
+
+    def _line_value(self, line):
+        value = self.line_values.get(line)
+        if value != None:
+            return value
+
+        sizes = [0.0 if code == 0 else math.log(self.engine.values[code]) for code in line]
+        tiles = [code for code in line if code != 0]
+
+        empty = len(line) - len(tiles)
+        merges = sum(1 for i in range(len(tiles) - 1) if tiles[i] == tiles[i + 1])
+
+        # How far the line is from going up or down all the way along.
+        rises = 0.0
+        falls = 0.0
+        for i in range(len(sizes) - 1):
+            if sizes[i] < sizes[i + 1]:
+                rises += sizes[i + 1] - sizes[i]
+            else:
+                falls += sizes[i] - sizes[i + 1]
+
+        value = (EMPTY_WEIGHT * empty + MERGE_WEIGHT * merges
+                 - MONOTONIC_WEIGHT * min(rises, falls) + SUM_WEIGHT * sum(sizes))
+
+        self.line_values[line] = value
+        return value
+
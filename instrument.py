@@ -0,0 +1,162 @@
+"""
+
+Timing instrumentation for py2187
+
+A Profiler times the phases of a game: moves, game-over checks, spawning
+seed tiles, drawing and animation. It works by wrapping the functions and
+methods of each phase while it is enabled and putting the originals back
+when it is disabled, so there is no cost at all when it is off. The moves,
+game-over checks and seed tiles are the methods of the game class being
+played, which game_targets() picks out. Each phase keeps a count, a total,
+a maximum and a stats.QuantileSketch of its times rather than every time,
+so a long session takes no more memory than a short one.
+
+Phases are timed inclusively, so the time of a move includes its
+animation. Merge rule lookups aren't timed on their own: they are
+memoised and take less time than the timing would. Instead the misses,
+the calls of a merge_lengths_func, are counted.
+
+    python py2187.py --profile
+
+"""
+
+import sys
+import time
+import functools
+
+import py2187
+import stats
+
+
+def game_targets(game_class):
+    """
+    Returns the (phase, object, attribute) of everything that is timed
+    when playing a game_class.
+    """
+
+    return (
+        ('make_move', game_class, 'make_move'),
+        ('valid_move_exists', game_class, 'valid_move_exists'),
+        ('add_seed_tile', game_class, 'add_seed_tile'),
+        ('draw', py2187.BoardRenderer, 'draw'),
+        ('animate', py2187, 'animate_cells'),
+    )
+
+
+TARGETS = game_targets(py2187.Game)
+
+# The quantiles of each phase in the report
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+
+class PhaseTimes:
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.quantiles = stats.QuantileSketch()
+
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.quantiles.add(seconds)
+
+
+
+class Profiler:
+
+    def __init__(self, targets=TARGETS):
+        self.targets = targets
+        self.timings = {}
+        self._originals = []
+        self._start = None
+        self._misses_start = None
+        self.seconds = 0.0
+        self.merge_rule_misses = 0
+
+
+    def enable(self):
+        if len(self._originals) > 0:
+            return
+
+        for phase, owner, name in self.targets:
+            # An inherited method is wrapped on owner and the wrapper is
+            # deleted again afterwards
+            original = owner.__dict__.get(name)
+            self._originals.append((owner, name, original))
+            setattr(owner, name, self._wrap(phase, getattr(owner, name)))
+
+        self._start = time.perf_counter()
+        self._misses_start = py2187.MergeRule.misses
+
+
+    def disable(self):
+        for owner, name, original in reversed(self._originals):
+            if original == None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self._originals = []
+
+        if self._start != None:
+            self.seconds += time.perf_counter() - self._start
+            self._start = None
+            self.merge_rule_misses += py2187.MergeRule.misses - self._misses_start
+            self._misses_start = None
+
+
+    def _wrap(self, phase, func):
+        add = self.timings.setdefault(phase, PhaseTimes()).add
+        perf_counter = time.perf_counter
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                add(perf_counter() - start)
+
+        return timed
+
+
+    def report(self, out=sys.stdout):
+        """
+        Writes the calls and total time of each phase, its share of the
+        time the profiler was on, the mean, quantiles and longest time per
+        call and the number of merge rule misses.
+        """
+
+        seconds = self.seconds
+        misses = self.merge_rule_misses
+        if self._start != None:
+            seconds += time.perf_counter() - self._start
+            misses += py2187.MergeRule.misses - self._misses_start
+
+        quantile_names = ['p%g us' % (fraction * 100) for fraction in QUANTILES]
+
+        out.write("Profiled %.2fs, %d merge rule misses\n\n" % (seconds, misses))
+        out.write(("%-18s %8s %10s %7s %10s" + " %10s" * len(QUANTILES) + " %10s\n")
+                  % tuple(['phase', 'calls', 'total s', '%', 'mean us'] + quantile_names
+                          + ['max us']))
+
+        for phase in sorted(self.timings, key=lambda phase: -self.timings[phase].total):
+            times = self.timings[phase]
+            if times.count == 0:
+                continue
+
+            share = 0.0
+            if seconds > 0:
+                share = 100.0 * times.total / seconds
+
+            quantiles = [times.quantiles.quantile(fraction) * 1e6 for fraction in QUANTILES]
+
+            out.write(("%-18s %8d %10.3f %7.1f %10.1f" + " %10.1f" * len(QUANTILES) + " %10.1f\n")
+                      % tuple([phase, times.count, times.total, share,
+                               times.total / times.count * 1e6] + quantiles
+                              + [times.max * 1e6]))
@@ -9,6 +9,9 @@ Done
     Multiple powers on the same board (eg 2's, 3's and 4's)
     Differnt colours for 2,3,5
     Switch to choose different games.
+    Hexagonal board with 6 directions of tilt (topology.py)
+    Boards with holes and internal walls (--maze)
+    3D cube board (cube.py)
 
 
 Features to do:
@@ -17,8 +20,6 @@ Features to do:
 
 Ideas:
 
-Boards with holes (missing positions)
-
 A square of four cells that form a power of 4 can collapse to a single square 
 that's at a half-grid position.
 
@@ -29,16 +30,12 @@ The squash command that pushes tiles towards the centre and squashes 4-squares a
 
 The centrifuge command that flings tiles to the edges
 
-Hexagonal board with 6 directions of tilt
-
 Two player game
 
 Reverse game (start with the 2048 tile and split it up)
 
 Turn animation off (or reduce frames) for large boards.
 
-3D cube board
-
 Tiles decay over time back to a lower number
 
 The game develops as you play (board grows, other powers are added)
@@ -49,8 +46,6 @@ Each tile is its own board and boards can combine
 
 Imaginary numbers - the real part combines on the x-axis, the imaginary on the y-axis
 
-A maze board with internal walls
-
 Call the game "frillion"
 
 The anti-game - combine numbers that are dissimilar resisting the tendency for numbers to end up the same. 
@@ -70,8 +65,12 @@ Slowly morphing board. Eg goes from 2 x 6 -> 3 x 5 -> 4 x 4 -> 5 x 3 -> 6 x 2 an
 
 """
 
+import os
+import sys
 import random
 import math
+import collections
+import hashlib
 import time
 import curses
 import argparse
@@ -93,6 +92,8 @@ RIGHT_MOVE = [1,0]
 
 _stdscr = None
 _board_scr = None
+_renderer = None
+_animator = None
 _DEBUG_SCR = None
 
 
@@ -110,22 +111,63 @@ _board_size_y = 4
 
 _cell_scrs = []
 
-_history = []
+# The cell windows of the board window _cell_pool_scr, by their position,
+# so that animations move tiles by using the window at each position
+# rather than making a new one on every step
+_cell_pool = {}
+_cell_pool_scr = None
+
+
+# Marks a missing cell in a board with holes
+HOLE = object()
 
 
 
 class Game:
 
     def __init__(self, rows=6, cols=6, seeds=((3,0.9),(9,0.1)), 
-                 merge_length=3, merge_lengths_func=None):
+                 merge_length=3, merge_lengths_func=None, debug=False,
+                 history_cells=100000, random_seed=None):
+
+        self.merge_rule = get_merge_rule(merge_lengths_func, merge_length)
 
         if merge_lengths_func == None:
-            self.merge_lengths_func = lambda i: [merge_length]
+            self.merge_lengths_func = self.merge_rule
+            self.merge_length = merge_length
         else:
             self.merge_lengths_func = merge_lengths_func
+            self.merge_length = None
+
+        # In debug mode valid_move_exists checks the running counts
+        # against trial moves.
+        self.debug = debug
+
+        # Undo history is kept as the cells each move changed, up to a
+        # total of history_cells cells.
+        self.history_cells = history_cells
+
+        # Each game has its own random numbers so that it can be replayed
+        if random_seed == None:
+            random_seed = random.getrandbits(63)
+        self.random_seed = random_seed
+        self.rng = random.Random(random_seed)
 
         self.board = [[None for x in range(cols)] for y in range(rows)]
         self.seeds = seeds
+        self.score = 0
+        self._seed_table = None
+
+
+    @property
+    def board(self):
+        return self._board
+
+
+    @board.setter
+    def board(self, board):
+        self._board = board
+        self._count_board()
+        self.clear_history()
 
 
     def initialise(self):
@@ -133,33 +175,335 @@ class Game:
         self.add_seed_tile()
 
 
+    def get_board(self):
+        return self._board
+
+
     def make_move(self, vector, animate=False):
-        self.board, self.moved = make_move(self.board, vector, self.merge_lengths_func, animate)
+        old_board = self._board
+        merges = []
+        self._board, self.moved = make_move(old_board, vector, self.merge_rule, animate, merges)
+        if self.moved:
+            points = sum(merges)
+            self.score += points
+            self._record(self._update_counts(old_board), points)
 
 
     def add_seed_tile(self):
-        add_seed_tile(self.board, self.seeds)
+        # The alias table is built again if the seeds are changed
+        if self._seed_table == None or self._seed_table.seeds is not self.seeds:
+            self._seed_table = AliasTable(self.seeds)
+
+        cell = self.rng.choice(self._free_cells)
+        value = self._seed_table.sample(self.rng)
+        self.set_cell(cell[0], cell[1], value)
+
+        # The seed tile is undone with the move before it
+        if self._open_change != None:
+            self._open_change[0].append((cell[0], cell[1], None, value))
+            self._history_size += 1
+            self._open_change = None
+            self._trim_history()
+
+
+    def get_empty_cells(self):
+        return [list(cell) for cell in self._free_cells]
+
+
+    def hash_key(self):
+        """
+        Returns the Zobrist hash of the board, a 64 bit number that is kept
+        up to date as cells change. Equal boards of the same size have
+        equal keys in every process, so the key can be used by caches.
+        """
+
+        return self._hash
+
+
+    def set_cell(self, y, x, value):
+        board = self._board
+        row = board[y]
+        get_col = lambda i: board[i][x]
+
+        # Only the merges that start in the run of tiles leading up to
+        # the cell can change.
+        row_first = self._run_start(row.__getitem__, x)
+        col_first = self._run_start(get_col, y)
+        row_before = self._count_merge_starts(row.__getitem__, len(row), row_first, x)
+        col_before = self._count_merge_starts(get_col, len(board), col_first, y)
+
+        old_value = row[x]
+        row[x] = value
+        self._update_cell(y, x, old_value, value)
+
+        row_change = self._count_merge_starts(row.__getitem__, len(row), row_first, x) - row_before
+        col_change = self._count_merge_starts(get_col, len(board), col_first, y) - col_before
+        self._row_merges[y] += row_change
+        self._col_merges[x] += col_change
+        self._merge_count += row_change + col_change
+
+
+    def clear_history(self):
+        self._undo = collections.deque()
+        self._redo = []
+        self._history_size = 0
+        self._open_change = None
+
+
+    def can_undo(self):
+        return len(self._undo) > 0
+
+
+    def can_redo(self):
+        return len(self._redo) > 0
+
+
+    def undo(self):
+        """
+        Takes back the last move and the seed tile added after it.
+        Returns False if there is nothing to undo.
+        """
+
+        if len(self._undo) == 0:
+            return False
+
+        change = self._undo.pop()
+        cells, points = change
+        self._history_size -= len(cells)
+        for y, x, old_value, new_value in reversed(cells):
+            self.set_cell(y, x, old_value)
+        self.score -= points
+
+        self._redo.append(change)
+        self._open_change = None
+        return True
+
+
+    def redo(self):
+        """
+        Plays the last undone move again, with the same seed tile.
+        Returns False if there is nothing to redo.
+        """
+
+        if len(self._redo) == 0:
+            return False
+
+        change = self._redo.pop()
+        cells, points = change
+        for y, x, old_value, new_value in cells:
+            self.set_cell(y, x, new_value)
+        self.score += points
+
+        self._undo.append(change)
+        self._history_size += len(cells)
+        self._open_change = None
+        self._trim_history()
+        return True
+
+
+    def last_change(self):
+        """
+        Returns the cells changed by the last move that moved, and by the
+        seed tile added after it, as a list of (y, x, old value, new value).
+        """
+
+        if len(self._undo) == 0:
+            return []
+
+        return self._undo[-1][0]
+
+
+    def _record(self, cells, points):
+        # A change is ([(y, x, old value, new value), ...], points scored)
+        change = (cells, points)
+        self._undo.append(change)
+        self._history_size += len(cells)
+        self._redo = []
+        self._open_change = change
+        self._trim_history()
+
+
+    def _trim_history(self):
+        # Drop the oldest moves until the history fits, but always keep
+        # the last move.
+        while self._history_size > self.history_cells and len(self._undo) > 1:
+            self._history_size -= len(self._undo.popleft()[0])
+
+
+    def _count_board(self):
+        # Keep an index of the empty cells and a count of the places a
+        # merge could start along each row and column, so that
+        # add_seed_tile and valid_move_exists don't have to scan the board.
+        board = self._board
+        self._hash = zobrist_hash(board)
+
+        self._free_cells = []
+        self._free_index = {}
+        for y in range(len(board)):
+            for x in range(len(board[0])):
+                if board[y][x] == None:
+                    self._add_free_cell((y, x))
+
+        self._row_merges = [self._count_merges(row) for row in board]
+        self._col_merges = [self._count_merges([row[x] for row in board])
+                            for x in range(len(board[0]))]
+        self._merge_count = sum(self._row_merges) + sum(self._col_merges)
+
+
+    def _update_counts(self, old_board):
+        # Returns the changed cells as a list of (y, x, old value, new value)
+        board = self._board
+        changed_cols = set()
+        change = []
+
+        for y in range(len(board)):
+            row = board[y]
+            old_row = old_board[y]
+            if row != old_row:
+                self._update_row_count(y)
+                for x in range(len(row)):
+                    if row[x] != old_row[x]:
+                        changed_cols.add(x)
+                        change.append((y, x, old_row[x], row[x]))
+                        self._update_cell(y, x, old_row[x], row[x])
+
+        for x in changed_cols:
+            self._update_col_count(x)
+
+        return change
+
+
+    def _update_cell(self, y, x, old_value, value):
+        # Keeps the free cell index and the hash up to date with a change
+        if old_value != None:
+            self._hash ^= zobrist_key(y, x, old_value)
+        if value != None:
+            self._hash ^= zobrist_key(y, x, value)
+
+        if old_value == None and value != None:
+            self._remove_free_cell((y, x))
+        elif old_value != None and value == None:
+            self._add_free_cell((y, x))
+
+
+    def _add_free_cell(self, cell):
+        self._free_index[cell] = len(self._free_cells)
+        self._free_cells.append(cell)
+
+
+    def _remove_free_cell(self, cell):
+        # Move the last free cell into the gap
+        index = self._free_index.pop(cell)
+        last_cell = self._free_cells.pop()
+        if last_cell != cell:
+            self._free_cells[index] = last_cell
+            self._free_index[last_cell] = index
+
+
+    def _update_row_count(self, y):
+        count = self._count_merges(self._board[y])
+        self._merge_count += count - self._row_merges[y]
+        self._row_merges[y] = count
+
+
+    def _update_col_count(self, x):
+        count = self._count_merges([row[x] for row in self._board])
+        self._merge_count += count - self._col_merges[x]
+        self._col_merges[x] = count
+
+
+    def _count_merges(self, line):
+        # The number of cells that start a run of equal tiles that is at
+        # least as long as one of the tile's merge lengths.
+        count = 0
+        run = 0
+        next_value = None
+        for i in range(len(line) - 1, -1, -1):
+            value = line[i]
+            if value == None:
+                run = 0
+            else:
+                if value == next_value:
+                    run += 1
+                else:
+                    run = 1
+
+                if run >= self.merge_rule.shortest(value):
+                    count += 1
+
+            next_value = value
+
+        return count
+
+
+    def _run_start(self, get, i):
+        # The start of the run of equal tiles that ends just before i
+        if i == 0 or get(i - 1) == None:
+            return i
+
+        value = get(i - 1)
+        start = i - 1
+        while start > 0 and get(start - 1) == value:
+            start -= 1
+
+        return start
+
+
+    def _count_merge_starts(self, get, length, first, last):
+        # Counts the cells from first to last that start a merge
+        count = 0
+        for i in range(first, last + 1):
+            value = get(i)
+            if value == None:
+                continue
+
+            shortest = self.merge_rule.shortest(value)
+            run = 1
+            while run < shortest and i + run < length and get(i + run) == value:
+                run += 1
+
+            if run >= shortest:
+                count += 1
+
+        return count
 
 
     def valid_move_exists(self):
+        cell_count = len(self._board) * len(self._board[0])
+        exists = (self._merge_count > 0 or
+                  0 < len(self._free_cells) < cell_count)
+
+        if self.debug:
+            if exists != self.trial_move_exists():
+                raise AssertionError("The game over counts are out of step with the board.")
+            if sorted(self._free_cells) != [tuple(cell) for cell in get_empty_cells(self._board)]:
+                raise AssertionError("The free cell index is out of step with the board.")
+            if self._hash != zobrist_hash(self._board):
+                raise AssertionError("The hash is out of step with the board.")
+
+        return exists
+
+
+    def trial_move_exists(self):
+        # Tries every move on a copy of the board
         
         trial_board = copy_board(self.board)
-        new_board, something_moved = make_move(trial_board, UP_MOVE, self.merge_lengths_func)
+        new_board, something_moved = make_move(trial_board, UP_MOVE, self.merge_rule)
         if something_moved:
             return True
 
         trial_board = copy_board(self.board)
-        new_board, something_moved = make_move(trial_board, DOWN_MOVE, self.merge_lengths_func)
+        new_board, something_moved = make_move(trial_board, DOWN_MOVE, self.merge_rule)
         if something_moved:
             return True
 
         trial_board = copy_board(self.board)
-        new_board, something_moved = make_move(trial_board, LEFT_MOVE, self.merge_lengths_func)
+        new_board, something_moved = make_move(trial_board, LEFT_MOVE, self.merge_rule)
         if something_moved:
             return True
 
         trial_board = copy_board(self.board)
-        new_board, something_moved = make_move(trial_board, RIGHT_MOVE, self.merge_lengths_func)
+        new_board, something_moved = make_move(trial_board, RIGHT_MOVE, self.merge_rule)
         if something_moved:
             return True
 
@@ -179,12 +523,55 @@ def get_empty_cells(board):
 
 
 
-def add_seed_tile(board, seeds):
+# Only the keys of the most recently used cells and values are kept
+MAX_ZOBRIST_KEYS = 1 << 16
+
+_zobrist_keys = collections.OrderedDict()
+
+
+def zobrist_key(y, x, value):
+    """
+    Returns the Zobrist key of a tile value in the cell (y, x). The keys
+    are 64 bit numbers taken from a hash of the cell and the value, so
+    they're random but the same every time. Values are taken as ints, so
+    a numpy integer has the same key as the int.
+    """
+
+    value = int(value)
+    key = _zobrist_keys.get((y, x, value))
+    if key == None:
+        digest = hashlib.blake2b(("%d,%d,%d" % (y, x, value)).encode('ascii'),
+                                 digest_size=8).digest()
+        key = int.from_bytes(digest, 'little')
+        _zobrist_keys[(y, x, value)] = key
+        if len(_zobrist_keys) > MAX_ZOBRIST_KEYS:
+            _zobrist_keys.popitem(last=False)
+    else:
+        _zobrist_keys.move_to_end((y, x, value))
+
+    return key
+
+
+
+def zobrist_hash(board):
+    """
+    Returns the Zobrist hash of a board, the XOR of the keys of its tiles.
+    """
+
+    board_hash = 0
+    for y in range(len(board)):
+        row = board[y]
+        for x in range(len(row)):
+            if row[x] != None:
+                board_hash ^= zobrist_key(y, x, row[x])
+
+    return board_hash
 
-    seed_list = sorted(seeds, key=lambda seed: seed[1])
 
-    empty_cells = get_empty_cells(board)
-    cell = random.choice(empty_cells)
+
+def choose_seed_value(seeds):
+
+    seed_list = sorted(seeds, key=lambda seed: seed[1])
 
     index = random.random()
     threshold = 0.0
@@ -195,7 +582,86 @@ def add_seed_tile(board, seeds):
             value = seed[0]
             break
 
-    board[cell[0]][cell[1]] = value
+    return value
+
+
+
+def seed_probabilities(seeds):
+    """
+    Returns a list of (value, probability) giving the chance of
+    choose_seed_value picking each seed value. If the seed probabilities
+    add up to less than one the rest of the chance is for None (no tile).
+    """
+
+    seed_list = sorted(seeds, key=lambda seed: seed[1])
+
+    probabilities = []
+    threshold = 0.0
+    for seed in seed_list:
+        low = min(threshold, 1.0)
+        threshold += seed[1]
+        high = min(threshold, 1.0)
+        if high > low:
+            probabilities.append((seed[0], high - low))
+
+    if threshold < 1.0:
+        probabilities.append((None, 1.0 - threshold))
+
+    return probabilities
+
+
+
+class AliasTable:
+    """
+    Picks seed values in constant time with Walker's alias method. The
+    odds are those of seed_probabilities, the same as choose_seed_value.
+    """
+
+    def __init__(self, seeds):
+        self.seeds = seeds
+
+        probabilities = seed_probabilities(seeds)
+        count = len(probabilities)
+        total = sum(probability for value, probability in probabilities)
+
+        self.values = [value for value, probability in probabilities]
+        self.probabilities = [1.0] * count
+        self.aliases = list(range(count))
+
+        scaled = [probability * count / total for value, probability in probabilities]
+        small = [i for i in range(count) if scaled[i] < 1.0]
+        large = [i for i in range(count) if scaled[i] >= 1.0]
+
+        while len(small) > 0 and len(large) > 0:
+            less = small.pop()
+            more = large.pop()
+
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+
+            scaled[more] += scaled[less] - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+
+
+    def sample(self, rng=random):
+        position = rng.random() * len(self.values)
+        i = int(position)
+        if position - i < self.probabilities[i]:
+            return self.values[i]
+
+        return self.values[self.aliases[i]]
+
+
+
+def add_seed_tile(board, seeds):
+
+    empty_cells = get_empty_cells(board)
+    cell = random.choice(empty_cells)
+
+    board[cell[0]][cell[1]] = choose_seed_value(seeds)
 
     return board
 
@@ -217,44 +683,130 @@ def create_board_scr(board):
     return _stdscr.derwin(board_size_y, board_size_x, oy, ox,)
 
 
-def draw_cell(y, x, number, board_scr, y_offset=0, x_offset=0):
+def get_cell_scr(board_scr, top, left):
+    # Returns the cell window at (top, left) in board_scr, making it the
+    # first time it's needed
+    global _cell_pool, _cell_pool_scr
 
-            cell_scr = board_scr.derwin(_cell_size_y, _cell_size_x, 
-                             _v_border + y * _cell_size_y + y_offset, 
-                             _h_border + x * _cell_size_x + x_offset)
-            
-            if number != None:
-                cell_str = str(number).center(_cell_digits)
-                cell_scr.attrset(curses.color_pair(
-                    ((int(math.log(number, 2)) + ((number % 2) * 3))  % 7) + 1))
+    if board_scr is not _cell_pool_scr:
+        _cell_pool = {}
+        _cell_pool_scr = board_scr
+
+    cell_scr = _cell_pool.get((top, left))
+    if cell_scr == None:
+        cell_scr = board_scr.derwin(_cell_size_y, _cell_size_x, top, left)
+        _cell_pool[(top, left)] = cell_scr
+
+    return cell_scr
 
-            else:
-                cell_str = " ".center(_cell_digits)
-                cell_scr.attrset(curses.color_pair(0))
-            
-            cell_scr.addstr(1, 1, cell_str)
 
-            cell_scr.box()
-            cell_scr.refresh()
+def draw_cell(y, x, number, board_scr, y_offset=0, x_offset=0):
+
+            cell_scr = get_cell_scr(board_scr,
+                                    _v_border + y * _cell_size_y + y_offset,
+                                    _h_border + x * _cell_size_x + x_offset)
+
+            paint_cell(cell_scr, number)
+            cell_scr.noutrefresh()
 
             return cell_scr
 
 
-def show_board(board, board_scr):
-    global _cell_scrs
+def paint_cell(cell_scr, number, wall_sides=None):
+    # Writes a cell into its window without sending it to the terminal.
+    # wall_sides says which of the left, right, top and bottom sides have
+    # a wall.
 
+    if number is HOLE:
+        cell_scr.attrset(curses.color_pair(0))
+        cell_scr.erase()
+        return
 
-    _cell_scrs = [[None for i in range(len(board[0]))] for j in range(len(board))]
+    if number != None:
+        cell_str = str(number).center(_cell_digits)
+        cell_scr.attrset(curses.color_pair(
+            ((int(math.log(number, 2)) + ((number % 2) * 3))  % 7) + 1))
 
+    else:
+        cell_str = " ".center(_cell_digits)
+        cell_scr.attrset(curses.color_pair(0))
 
-    board_scr.box()
-    board_scr.refresh()
+    cell_scr.addstr(1, 1, cell_str)
+    if wall_sides == None:
+        cell_scr.box()
+    else:
+        cell_scr.border(*[ord('#') if side else 0 for side in wall_sides])
 
-    for y in range(len(board)):
-        for x in range(len(board[0])):
-            _cell_scrs[y][x] = draw_cell(y, x, board[y][x], board_scr)
 
 
+# Marks a cell that has to be drawn whatever is in it
+_UNDRAWN = object()
+
+
+class BoardRenderer:
+    """
+    Draws boards on a curses window. The cell windows are made once, and
+    shared with animate_cells, and only the cells that differ from the last
+    board drawn are redrawn. The changes are sent to the terminal in a
+    single update.
+    """
+
+    def __init__(self, board_scr, rows, cols, walls=()):
+        self.board_scr = board_scr
+        self.cell_scrs = [[get_cell_scr(board_scr,
+                                        _v_border + y * _cell_size_y,
+                                        _h_border + x * _cell_size_x)
+                           for x in range(cols)] for y in range(rows)]
+
+        # The sides of each cell that have a wall, drawn on the cell's box
+        self.wall_sides = [[None for x in range(cols)] for y in range(rows)]
+        for wall in walls:
+            (y1, x1), (y2, x2) = sorted(wall)
+            for y, x in ((y1, x1), (y2, x2)):
+                if self.wall_sides[y][x] == None:
+                    self.wall_sides[y][x] = [False, False, False, False]
+            if y1 == y2:
+                self.wall_sides[y1][x1][1] = True
+                self.wall_sides[y2][x2][0] = True
+            else:
+                self.wall_sides[y1][x1][3] = True
+                self.wall_sides[y2][x2][2] = True
+
+        self.invalidate()
+
+
+    def invalidate(self):
+        self._drawn = [[_UNDRAWN for cell_scr in row] for row in self.cell_scrs]
+        self._border_drawn = False
+
+
+    def touch(self, cells):
+        """
+        Marks cells that have been drawn over, eg by an animation, so they
+        are drawn again by the next draw().
+        """
+
+        for y, x in cells:
+            self._drawn[y][x] = _UNDRAWN
+
+
+    def draw(self, board):
+        if not self._border_drawn:
+            self.board_scr.box()
+            self.board_scr.noutrefresh()
+            self._border_drawn = True
+
+        for y in range(len(board)):
+            row = board[y]
+            drawn_row = self._drawn[y]
+            for x in range(len(row)):
+                if drawn_row[x] is _UNDRAWN or drawn_row[x] != row[x]:
+                    cell_scr = self.cell_scrs[y][x]
+                    paint_cell(cell_scr, row[x], self.wall_sides[y][x])
+                    cell_scr.noutrefresh()
+                    drawn_row[x] = row[x]
+
+        curses.doupdate()
 
 
 
@@ -284,7 +836,7 @@ def remove_flags_from_board(board):
 
 
 
-def animate_cells(cell_animation_frames, dy, dx, board_scr):
+def animate_cells(cell_animation_frames, dy, dx, board_scr, steps=None, delay=.03):
 
     # Takes a list of animation frames. 
     # Each animation frame is a list of cells to animate.
@@ -295,49 +847,143 @@ def animate_cells(cell_animation_frames, dy, dx, board_scr):
     #   |----------------FRAME---------|
     #   | |----CELL----|               |
     # [ [ [1, 1, 9, scr], [1, 2, 9, scr] ], [ [1, 1, 9, scr] ]  ]
+    #
+    # Each frame slides its cells one cell along in the given number of
+    # steps. Returns False if it stopped because a key was pressed.
 
+    distance = 0
+    if dy != 0:
+        distance = _cell_size_y
 
-    if len(cell_animation_frames) > 0:
+    if dx != 0:
+        distance = _cell_size_x
 
-        for cell_animation_list in cell_animation_frames:
+    if steps == None:
+        steps = animation_steps(dy, dx)
 
+    for cell_animation_list in cell_animation_frames:
 
-            if len(cell_animation_list) > 0:
+        if len(cell_animation_list) > 0:
 
-                y_offset = dy
-                x_offset = dx * 2
-                steps = 0
-                if dy != 0:
-                    steps = _cell_size_y
+            for i in range(1, steps + 1):
+                if key_waiting():
+                    return False
 
-                if dx != 0:
-                    steps = int(_cell_size_x / 2)
+                offset = int(round(float(distance * i) / steps))
+                for cell in cell_animation_list:
+                    cell[3].erase()
+                    cell[3].noutrefresh()
+                    cell[3] = draw_cell(cell[0], cell[1], cell[2], board_scr,
+                                        dy * offset, dx * offset)
 
-                for i in range(steps):
-                    for cell in cell_animation_list:
-                        cell[3].clear()
-                        #cell[3].refresh()
-                        cell[3] = draw_cell(cell[0], cell[1], cell[2], board_scr, y_offset, x_offset)
-                
-                    board_scr.refresh()
-                    time.sleep(.03)
-                    y_offset += dy
-                    x_offset += dx * 2
+                curses.doupdate()
+                time.sleep(delay)
 
-                #redraw the empty cell in the wake of the moving cell
+            #redraw the empty cell in the wake of the moving cell
 
-                #create a dict of moved cells
-                moved_cells = {}
-                for cell in cell_animation_list:
-                    key = (cell[0], cell[1])
-                    moved_cells[key] = True
+            #create a dict of moved cells
+            moved_cells = {}
+            for cell in cell_animation_list:
+                key = (cell[0], cell[1])
+                moved_cells[key] = True
 
-                for cell in cell_animation_list:
-                    # Check there isn't a cell moving behind this one 
-                    key = (cell[0] - dy, cell[1] - dx)
-                    if moved_cells.has_key(key) == False:
-                        draw_cell(cell[0], cell[1], None, board_scr)
+            for cell in cell_animation_list:
+                # Check there isn't a cell moving behind this one 
+                key = (cell[0] - dy, cell[1] - dx)
+                if key not in moved_cells:
+                    draw_cell(cell[0], cell[1], None, board_scr)
+
+            curses.doupdate()
+
+    return True
+
+
+def animation_steps(dy, dx):
+    # The number of steps for a full speed slide of one cell
+    if dy != 0:
+        return _cell_size_y
+
+    return int(_cell_size_x / 2)
+
+
+def key_waiting():
+    # Checks for a key press without taking it off the input queue
+    if _stdscr == None:
+        return False
+
+    _stdscr.nodelay(True)
+    key = _stdscr.getch()
+    _stdscr.nodelay(False)
+
+    if key == -1:
+        return False
+
+    curses.ungetch(key)
+    return True
+
+
+
+class AnimationScheduler:
+    """
+    Plays the animation of a move within a time budget. The frame count of
+    every slide is cut down to fit the budget, so big boards with long
+    chains of moves animate in fewer, coarser steps. The animation stops
+    as soon as a key is pressed and the board is then drawn as it ends up.
+    """
+
+    def __init__(self, budget=0.3, frame_delay=.03, min_frame_delay=.01):
+        self.budget = budget
+        self.frame_delay = frame_delay
+        self.min_frame_delay = min_frame_delay
+
+
+    def plan(self, slides, dy, dx):
+        """
+        Returns (steps, delay) for a move with a number of slides.
+        """
 
+        steps = animation_steps(dy, dx)
+        if slides == 0:
+            return (steps, self.frame_delay)
+
+        delay = self.budget / (slides * steps)
+        if delay < self.min_frame_delay:
+            steps = max(1, int(self.budget / (slides * self.min_frame_delay)))
+            delay = self.budget / (slides * steps)
+
+        return (steps, min(delay, self.frame_delay))
+
+
+    def run(self, frames, dy, dx, board_scr):
+        frames = [cells_to_animate for cells_to_animate in frames
+                  if len(cells_to_animate[0]) > 0]
+        slides = sum(1 for cells_to_animate in frames
+                     for cell_animation_list in cells_to_animate
+                     if len(cell_animation_list) > 0)
+
+        steps, delay = self.plan(slides, dy, dx)
+
+        for cells_to_animate in frames:
+            if not animate_cells(cells_to_animate, dy, dx, board_scr, steps, delay):
+                return False
+
+        return True
+
+
+
+def is_power(value, base):
+    """
+    Returns True if value is base raised to a whole power of one or more.
+    Uses integer arithmetic so large powers are never lost to rounding.
+    """
+
+    if value < base:
+        return False
+
+    while value % base == 0:
+        value //= base
+
+    return value == 1
 
 
 
@@ -351,14 +997,354 @@ def power_merge_lengths(cell_value):
     for m in range(2, min(10, cell_value + 1)):
         # If the cell is a power of two it can do a two cell merge,
         # if it's a power of 3 it can do a three cell merge etc.
-        if math.log(cell_value, m) % 1 == 0:
+        if is_power(cell_value, m):
             possible_merges.append(m)
 
     return possible_merges
 
 
 
-def make_move(board, vector, merge_lengths_func=None, animate=False):
+class MergeRule:
+    """
+    Wraps a merge_lengths_func and remembers the merge lengths it gives for
+    each tile value. A MergeRule can be used anywhere a merge_lengths_func can.
+    """
+
+    # The number of calls of any rule's merge_lengths_func, that is, of
+    # values that weren't remembered yet
+    misses = 0
+
+    def __init__(self, merge_lengths_func):
+        self.merge_lengths_func = merge_lengths_func
+        self._longest_first = {}
+        self._shortest = {}
+
+
+    def __call__(self, cell_value):
+        return sorted(self.longest_first(cell_value))
+
+
+    def longest_first(self, cell_value):
+        """
+        Returns a tuple of the merge lengths for a tile value, longest first,
+        which is the order make_move tries them in.
+        """
+
+        merge_lengths = self._longest_first.get(cell_value)
+        if merge_lengths == None:
+            MergeRule.misses += 1
+            merge_lengths = tuple(sorted(self.merge_lengths_func(cell_value), reverse=True))
+            self._longest_first[cell_value] = merge_lengths
+
+        return merge_lengths
+
+
+    def shortest(self, cell_value):
+        """
+        Returns the shortest merge length for a tile value, or infinity if
+        the tile can't merge.
+        """
+
+        shortest = self._shortest.get(cell_value)
+        if shortest == None:
+            merge_lengths = self.longest_first(cell_value)
+            if len(merge_lengths) > 0:
+                shortest = merge_lengths[-1]
+            else:
+                shortest = float('inf')
+            self._shortest[cell_value] = shortest
+
+        return shortest
+
+
+
+# The shared rules are kept for the most recently used functions only, so
+# a program that makes a new function for every game doesn't keep them all
+MAX_MERGE_RULES = 64
+
+_merge_rules = collections.OrderedDict()
+
+
+def get_merge_rule(merge_lengths_func=None, merge_length=2):
+    """
+    Returns a shared MergeRule for a merge_lengths_func or, if that is None,
+    for merging merge_length equal tiles. A MergeRule is returned as it is.
+    """
+
+    if isinstance(merge_lengths_func, MergeRule):
+        return merge_lengths_func
+
+    if merge_lengths_func == None:
+        key = ('merge_length', merge_length)
+    else:
+        key = merge_lengths_func
+
+    merge_rule = _merge_rules.get(key)
+    if merge_rule == None:
+        if merge_lengths_func == None:
+            merge_lengths_func = lambda i: [merge_length]
+        merge_rule = MergeRule(merge_lengths_func)
+        _merge_rules[key] = merge_rule
+        if len(_merge_rules) > MAX_MERGE_RULES:
+            _merge_rules.popitem(last=False)
+    else:
+        _merge_rules.move_to_end(key)
+
+    return merge_rule
+
+
+
+# Goes up whenever a change to the rules or the engines changes how games
+# play out, so results cached from older versions aren't used
+ENGINE_VERSION = 1
+
+
+
+_board_lines = {}
+
+
+def board_lines(rows, cols, vector):
+    """
+    Returns the lines of cells a move acts on. Each line is a list of
+    (y, x) ordered from the cell the tiles move towards.
+    """
+
+    dx = vector[0]
+    dy = vector[1]
+    key = (rows, cols, dx, dy)
+
+    lines = _board_lines.get(key)
+    if lines == None:
+        if dy != 0:
+            if dy < 0:
+                ys = range(rows)
+            else:
+                ys = range(rows - 1, -1, -1)
+            lines = [[(y, x) for y in ys] for x in range(cols)]
+
+        elif dx != 0:
+            if dx < 0:
+                xs = range(cols)
+            else:
+                xs = range(cols - 1, -1, -1)
+            lines = [[(y, x) for x in xs] for y in range(rows)]
+
+        else:
+            lines = []
+
+        _board_lines[key] = lines
+
+    return lines
+
+
+
+def move_tiles(tiles, length, merge_rule, frames=None, merges=None, merge_lengths=None):
+    """
+    Moves the tiles of one line towards position 0 and merges them, in a
+    single pass over the tiles. tiles is a list of (position, value) in
+    position order and length is the length of the line.
+
+    Gives the same result as make_move_reference, which moves every tile
+    one step per pass for length - 1 passes. In each of those passes the
+    tiles packed up against position 0 stand still and the first of them
+    that can merge does (longest merge first, and a tile only merges once).
+    Every other tile moves one step. So the passes where nothing merges are
+    skipped over in one go.
+
+    If frames is a list, a list of animation frames for each pass is
+    appended to it. Each frame is a list of (position, number). If merges
+    is a list, the value of each tile made by a merge is appended to it,
+    and if merge_lengths is a list, the number of tiles in each merge.
+
+    Returns (new_tiles, moved).
+    """
+
+    # settled holds [value, merged] for the tiles packed from position 0.
+    # waiting holds (anchor, value, merged) for the moving tiles, which are
+    # at position anchor - passes.
+    settled = []
+    waiting = collections.deque((position, value, False) for position, value in tiles)
+    passes = 0
+    max_passes = length - 1
+    moved = False
+
+    # There is no merge that lies wholly in settled[:clean].
+    clean = 0
+
+    while passes < max_passes:
+        while len(waiting) > 0 and waiting[0][0] - passes == len(settled):
+            anchor, value, merged = waiting.popleft()
+            settled.append([value, merged])
+
+        merge_at, merge = _find_merge(settled, clean, merge_rule)
+        clean = len(settled)
+
+        if merge_at != None:
+            number = settled[merge_at][0] * merge
+            if merges != None:
+                merges.append(number)
+            if merge_lengths != None:
+                merge_lengths.append(merge)
+            if frames != None:
+                pass_frames = [[] for i in range(merge - 1)]
+                for k in range(1, merge):
+                    pass_frames[merge - 1 - k].append((merge_at + k, number))
+
+            # The tiles behind the merge start moving again
+            released = settled[merge_at + merge:]
+            for i in range(len(released) - 1, -1, -1):
+                value, merged = released[i]
+                waiting.appendleft((merge_at + merge + i + passes, value, merged))
+
+            del settled[merge_at + 1:]
+            settled[merge_at] = [number, True]
+            clean = len(settled)
+            moved = True
+            step = 1
+
+        elif len(waiting) > 0:
+            if frames != None:
+                pass_frames = [[]]
+                step = 1
+            else:
+                step = waiting[0][0] - passes - len(settled)
+            moved = True
+
+        else:
+            break
+
+        if frames != None:
+            for anchor, value, merged in waiting:
+                pass_frames[0].append((anchor - passes, value))
+            frames.append(pass_frames)
+
+        passes = min(passes + step, max_passes)
+
+    new_tiles = [(position, settled[position][0]) for position in range(len(settled))]
+    for anchor, value, merged in waiting:
+        new_tiles.append((anchor - passes, value))
+
+    return (new_tiles, moved)
+
+
+
+def _find_merge(settled, clean, merge_rule):
+    # Returns (position, merge length) of the first merge in the settled
+    # tiles, or (None, None). A new merge has to reach past clean.
+
+    start = clean
+    if clean < len(settled):
+        value = settled[clean][0]
+        while start > 0 and not settled[start - 1][1] and settled[start - 1][0] == value:
+            start -= 1
+
+    for y in range(start, len(settled)):
+        value, merged = settled[y]
+        if merged:
+            continue
+
+        possible_merges = merge_rule.longest_first(value)
+        if len(possible_merges) == 0:
+            continue
+
+        # The run of equal tiles that haven't merged yet, as far as it matters.
+        run = 1
+        while (run < possible_merges[0] and y + run < len(settled) and
+               settled[y + run][0] == value and not settled[y + run][1]):
+            run += 1
+
+        for merge in possible_merges:
+            if merge <= run:
+                return (y, merge)
+
+    return (None, None)
+
+
+
+def make_move(board, vector, merge_lengths_func=None, animate=False, merges=None,
+              merge_lengths=None):
+    #if no merging function is given, assume the functions is merging two equal cells
+    merge_rule = get_merge_rule(merge_lengths_func, 2)
+
+    # Other board backends, such as sparse.SparseBoard, move themselves
+    if not isinstance(board, list):
+        return board.make_move(vector, merge_rule, merges)
+
+    new_board = copy_board(board)
+    something_moved = False
+
+    if animate:
+        frames = []
+
+    for cells in board_lines(len(board), len(board[0]), vector):
+        tiles = []
+        for i in range(len(cells)):
+            y, x = cells[i]
+            if board[y][x] != None:
+                tiles.append((i, board[y][x]))
+
+        if len(tiles) == 0:
+            continue
+
+        if animate:
+            line_frames = []
+        else:
+            line_frames = None
+
+        new_tiles, moved = move_tiles(tiles, len(cells), merge_rule, line_frames, merges,
+                                      merge_lengths)
+
+        if moved:
+            something_moved = True
+
+            for i, value in tiles:
+                y, x = cells[i]
+                new_board[y][x] = None
+            for i, value in new_tiles:
+                y, x = cells[i]
+                new_board[y][x] = value
+
+            if animate:
+                add_line_frames(frames, line_frames, cells)
+                if _renderer != None:
+                    _renderer.touch(cells)
+
+    if animate:
+        if _animator == None:
+            for cells_to_animate in frames:
+                if len(cells_to_animate[0]) > 0:
+                    animate_cells(cells_to_animate, vector[1], vector[0], _board_scr)
+        else:
+            _animator.run(frames, vector[1], vector[0], _board_scr)
+
+    return (new_board, something_moved)
+
+
+
+def add_line_frames(frames, line_frames, cells):
+    # Adds the animation frames of one line to the frames for the whole
+    # board, as [y, x, number, cell_scr] for animate_cells.
+
+    while len(frames) < len(line_frames):
+        frames.append([[]])
+
+    for p in range(len(line_frames)):
+        while len(frames[p]) < len(line_frames[p]):
+            frames[p].append([])
+
+        for k in range(len(line_frames[p])):
+            for i, number in line_frames[p][k]:
+                y, x = cells[i]
+                frames[p][k].append([y, x, number, _cell_scrs[y][x]])
+
+
+
+def make_move_reference(board, vector, merge_lengths_func=None, animate=False):
+    """
+    The original make_move, which moves tiles one step per pass. It is kept
+    to check make_move against.
+    """
+
     rows = len(board)
     cols = len(board[0])
     dx = vector[0]
@@ -367,8 +1353,7 @@ def make_move(board, vector, merge_lengths_func=None, animate=False):
     fboard = add_flags_to_board(board)
 
     #if no merging function is given, assume the functions is merging two equal cells
-    if merge_lengths_func == None:
-        merge_lengths_func = lambda a: [2]
+    merge_rule = get_merge_rule(merge_lengths_func, 2)
 
 
     #If the vector is moving up or down
@@ -412,12 +1397,11 @@ def make_move(board, vector, merge_lengths_func=None, animate=False):
                         elif fboard[y][x][0] != None and not fboard[y][x][1]:
 
 
-                            possible_merges = merge_lengths_func(fboard[y][x][0])
+                            possible_merges = merge_rule.longest_first(fboard[y][x][0])
 
                             #is there a valid merge?
                             #Try all the possible merges starting with the largest
                             valid_merge = False
-                            possible_merges.sort(reverse=True)
                             for merge in possible_merges:
                                 valid_merge = True
                                 for j in range(1, merge):
@@ -493,12 +1477,11 @@ def make_move(board, vector, merge_lengths_func=None, animate=False):
                         elif fboard[y][x][0] != None and not fboard[y][x][1]:
 
 
-                            possible_merges = merge_lengths_func(fboard[y][x][0])
+                            possible_merges = merge_rule.longest_first(fboard[y][x][0])
 
                             #is there a valid merge?
                             #Try all the possible merges starting with the largest
                             valid_merge = False
-                            possible_merges.sort(reverse=True)
                             for merge in possible_merges:
                                 valid_merge = True
                                 for j in range(1, merge):
@@ -554,16 +1537,6 @@ def copy_board(board):
     return new_board
 
 
-def save_history(board):
-    _history.append(copy_board(board))
-
-
-def pop_history(board):
-#    if len(_history) > 0:
-#        board = _history.pop()
-    board = _history.pop()
-
-
 
 def create_seed_distribution(seed_values, distribution):
     total_probability = 0
@@ -583,8 +1556,83 @@ def create_seed_distribution(seed_values, distribution):
 
 
 
+BACKENDS = ('list', 'packed', 'sparse', 'topology')
+
+
+def create_game(backend='list', **game_kwargs):
+    """
+    Creates a game with the given board backend: 'list' for Game, 'packed'
+    for packed.PackedGame, 'sparse' for sparse.SparseGame or 'topology' for
+    a topology.TopologyGame on a square board.
+    """
+
+    if backend == 'list':
+        return Game(**game_kwargs)
+    elif backend == 'packed':
+        import packed
+        return packed.PackedGame(**game_kwargs)
+    elif backend == 'sparse':
+        import sparse
+        return sparse.SparseGame(**game_kwargs)
+    elif backend == 'topology':
+        import topology
+        board_topology = topology.square_topology(game_kwargs.pop('rows', 6),
+                                                  game_kwargs.pop('cols', 6))
+        return topology.TopologyGame(board_topology, **game_kwargs)
+
+    raise ValueError("Unknown backend: %s" % backend)
+
+
+
+def game_kwargs_from_args(args):
+    """
+    Builds the keyword arguments for Game from the command line options.
+    """
+
+    game_kwargs = {}
+    distribution = 0.75
+
+    if args.distribution != None:
+        distribution = args.distribution
+
+    if args.basic != None:
+        power = args.basic
+
+        game_kwargs['rows'] = power*2
+        game_kwargs['cols'] = power*2
+
+        if args.multiple:
+
+            seed_values = []
+            for i in range(2, power + 1):
+                seed_values.append(i)
+
+            game_kwargs['seeds'] = create_seed_distribution(seed_values, distribution)
+
+        else:
+
+            game_kwargs['merge_length'] = power
+            game_kwargs['seeds'] = ((power, 0.9), (power**2, 0.1))
+
+
+    if args.rows != None:
+        game_kwargs['rows'] = args.rows
+
+    if args.cols != None:
+        game_kwargs['cols'] = args.cols
+
+    if args.multiple:
+        game_kwargs['merge_lengths_func'] = power_merge_lengths
+
+    if args.seeds != None and len(args.seeds) > 0:
+        game_kwargs['seeds'] = create_seed_distribution(args.seeds, distribution)
+
+    return game_kwargs
+
+
+
 def main(stdscr):
-    global _stdscr, _board_scr, _DEBUG_SCR
+    global _stdscr, _board_scr, _renderer, _animator, _cell_scrs, _DEBUG_SCR
 
     curses.init_pair(1, curses.COLOR_GREEN, curses.COLOR_BLACK)
     curses.init_pair(2, curses.COLOR_YELLOW, curses.COLOR_BLACK)
@@ -599,6 +1647,11 @@ def main(stdscr):
     _stdscr = stdscr
     _DEBUG_SCR = stdscr.subwin(_stdscr.getmaxyx()[0] - 12, 0)
 
+    animate = not _args.no_animate
+    _animator = AnimationScheduler(_args.frame_budget)
+
+    table = _tablebase
+
     #set up game...
 
     quit = False
@@ -606,47 +1659,25 @@ def main(stdscr):
     while quit != True:
         quit = not(_args.interactive)
     
-        game_kwargs = {}
-        distribution = 0.75
-
-        if _args.distribution != None:
-            distribution = _args.distribution
-
-        if _args.basic != None:
-            power = _args.basic
-
-            game_kwargs['rows'] = power*2
-            game_kwargs['cols'] = power*2
-
-            if _args.multiple:
-
-                seed_values = []
-                for i in range(2, power + 1):
-                    seed_values.append(i)
-
-                game_kwargs['seeds'] = create_seed_distribution(seed_values, distribution)
-
-            else:
-
-                game_kwargs['merge_length'] = power
-                game_kwargs['seeds'] = ((power, 0.9), (power**2, 0.1))
-
-
-        if _args.rows != None:
-            game_kwargs['rows'] = _args.rows
-
-        if _args.cols != None:
-            game_kwargs['cols'] = _args.cols
-
-        if _args.multiple:
-            game_kwargs['merge_lengths_func'] = power_merge_lengths
-
-        if _args.seeds != None and len(_args.seeds) > 0:
-            game_kwargs['seeds'] = create_seed_distribution(_args.seeds, distribution)
-
-
+        game_kwargs = game_kwargs_from_args(_args)
+
+        walls = ()
+        if _args.maze != None:
+            import topology
+            with open(_args.maze) as f:
+                maze = topology.MazeTopology.from_text(f.read())
+            game_kwargs.pop('rows', None)
+            game_kwargs.pop('cols', None)
+            game = topology.TopologyGame(maze, **game_kwargs)
+            walls = maze.walls
+        else:
+            game = Game(**game_kwargs)
 
-        game = Game(**game_kwargs)
+        # The game is played through a recorder if it is to be logged
+        player = game
+        if _args.record != None:
+            import replay
+            player = replay.GameRecorder(game)
 
         #game = Game()
         #game = Game(rows=6, cols=6, seeds=((3,0.9),(9,0.1)), merge_length=3)
@@ -657,12 +1688,16 @@ def main(stdscr):
 
 
 
-        _board_scr = create_board_scr(game.board)
+        board = game.get_board()
+        _board_scr = create_board_scr(board)
+        _renderer = BoardRenderer(_board_scr, len(board), len(board[0]), walls)
+        _cell_scrs = _renderer.cell_scrs
 
-        game.initialise()
+        player.initialise()
 
 
-        show_board(game.board, _board_scr)
+        _renderer.draw(game.get_board())
+        show_hint(table, game.get_board())
         
         while game.valid_move_exists():
             vector = []
@@ -675,24 +1710,26 @@ def main(stdscr):
                 vector = LEFT_MOVE
             elif command_chr == RIGHT_KEY or command_chr == ord("l"):
                 vector = RIGHT_MOVE
-            #elif chr(command_chr) == "z":
-            #    pop_history(_board)
-
+            elif command_chr == ord("z") and _args.maze == None:
+                player.undo()
+            elif command_chr == ord("y") and _args.maze == None:
+                player.redo()
 
-            #save_history(_board)
             if vector != []:
-                game.make_move(vector, animate=True)
+                player.make_move(vector, animate=animate)
                 if game.moved:
-                    game.add_seed_tile()
-            #    else:
-            #        pop_history(_board)
-            #else:
-            #    pop_history(_board)
+                    player.add_seed_tile()
 
-            show_board(game.board, _board_scr)
+            _renderer.draw(game.get_board())
+            show_hint(table, game.get_board())
 
         show("\n\n")
         show(" ==================== GAME OVER ==================== ".center(_stdscr.getmaxyx()[1]))
+
+        if player is not game:
+            log_path = os.path.join(_args.record, "%d.log" % game.random_seed)
+            with open(log_path, 'wb') as out:
+                player.save(out)
         _stdscr.getch()
 
         _stdscr.clear()
@@ -700,6 +1737,30 @@ def main(stdscr):
 
 
 
+MOVE_NAMES = {(0, -1): "up", (0, 1): "down", (-1, 0): "left", (1, 0): "right"}
+
+
+def show_hint(table, board):
+    # Shows the tablebase's best move and expected score on the top line
+    if table == None:
+        return
+
+    result = table.lookup(board)
+    if result == None:
+        hint = "Not in the tablebase"
+    else:
+        score, vector, win = result
+        hint = "Best move: %s   Expected score to come: %.1f" % (
+            MOVE_NAMES.get(tuple(vector or ()), "none"), score)
+        if win != None:
+            hint += "   Chance of %d: %.1f%%" % (table.config['target'], win * 100)
+
+    _stdscr.addstr(0, 0, hint.ljust(_stdscr.getmaxyx()[1] - 1))
+    _stdscr.noutrefresh()
+    curses.doupdate()
+
+
+
 def DEBUG(msg, wait=False):
     if _debug:
         y, x = _DEBUG_SCR.getyx()
@@ -727,8 +1788,16 @@ def probability_arg(arg_str):
     return prob
 
 
-if __name__ == "__main__":
-    argparser = argparse.ArgumentParser(description='A game of combining sliding numeric tiles.')
+def positive_int(arg_str):
+    value = int(arg_str)
+    if value < 1:
+        raise argparse.ArgumentTypeError("Must be at least 1.")
+
+    return value
+
+
+def create_argparser(description='A game of combining sliding numeric tiles.'):
+    argparser = argparse.ArgumentParser(description=description)
     argparser.add_argument('-b', '--basic', type=int)
     argparser.add_argument('-r', '--rows', type=int)
     argparser.add_argument('-c', '--cols', type=int)
@@ -736,6 +1805,50 @@ if __name__ == "__main__":
     argparser.add_argument('-m', '--multiple', action='store_true')
     argparser.add_argument('-i', '--interactive', action='store_true')
     argparser.add_argument('-s', '--seeds', type=int, nargs='*')
+
+    return argparser
+
+
+if __name__ == "__main__":
+    argparser = create_argparser()
+    argparser.add_argument('--no-animate', action='store_true')
+    argparser.add_argument('--frame-budget', type=float, default=0.3)
+    argparser.add_argument('--record', metavar='DIR')
+    argparser.add_argument('--profile', action='store_true')
+    argparser.add_argument('--tablebase', metavar='PATH')
+    argparser.add_argument('--maze', metavar='FILE')
     _args = argparser.parse_args()
 
-    curses.wrapper(main)
+    if _args.maze != None and _args.record != None:
+        argparser.error("--record can't be used with --maze")
+
+    # Modules imported from here, such as replay and instrument, have to
+    # see this module rather than load a second copy of it.
+    sys.modules.setdefault('py2187', sys.modules[__name__])
+
+    # The tablebase is checked against the game before curses starts, so
+    # a mismatch can be reported on the command line
+    _tablebase = None
+    if _args.tablebase != None:
+        import tablebase
+        _tablebase = tablebase.Tablebase(_args.tablebase)
+        try:
+            _tablebase.check_game(game_kwargs_from_args(_args))
+        except ValueError as e:
+            argparser.error(str(e))
+
+    if _args.profile:
+        import instrument
+        if _args.maze != None:
+            import topology
+            profiler = instrument.Profiler(instrument.game_targets(topology.TopologyGame))
+        else:
+            profiler = instrument.Profiler()
+        profiler.enable()
+
+    try:
+        curses.wrapper(main)
+    finally:
+        if _args.profile:
+            profiler.disable()
+            profiler.report()
@@ -0,0 +1,364 @@
+"""
+
+Recording and replaying games of py2187
+
+A game log holds the configuration of a game, the seed of its random
+numbers and the moves that were made, packed at 2 bits each. Replaying a
+log plays the same game again, so the final board and score can be checked
+against the ones recorded when it was played.
+
+A log file can hold any number of logs one after the other, and a directory
+of log files is read one log at a time.
+
+    python replay.py logs/
+
+Log layout, little endian:
+
+    header    b'2187', version (1 byte)
+    config    length (2 bytes), JSON object of Game arguments
+    seed      random seed (8 bytes)
+    moves     move count (4 bytes), 4 moves per byte, first move lowest
+    history   event count (4 bytes), (move count so far (4 bytes),
+              b'u' for undo or b'r' for redo) for each
+    trailer   score (8 bytes), CRC32 of the final board (4 bytes), b'END!'
+
+Only the moves that moved a tile are recorded.
+
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import argparse
+
+import py2187
+
+
+MAGIC = b'2187'
+VERSION = 1
+END = b'END!'
+
+MOVES = (py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE)
+MOVE_CODES = dict((tuple(vector), code) for code, vector in enumerate(MOVES))
+
+UNDO = b'u'
+REDO = b'r'
+
+# The merge functions that can be named in a log
+MERGE_FUNCTIONS = {
+    'power': py2187.power_merge_lengths,
+}
+
+_HEADER = struct.Struct('<4sB')
+_LENGTH = struct.Struct('<H')
+_SEED = struct.Struct('<Q')
+_COUNT = struct.Struct('<I')
+_EVENT = struct.Struct('<Ic')
+_TRAILER = struct.Struct('<QI4s')
+
+
+
+class LogError(Exception):
+    pass
+
+
+
+class GameLog:
+
+    def __init__(self, config, random_seed, moves=b'', move_count=0, events=(),
+                 score=None, board_crc=None):
+
+        self.config = config
+        self.random_seed = random_seed
+        self.moves = bytearray(moves)
+        self.move_count = move_count
+        self.events = list(events)
+        self.score = score
+        self.board_crc = board_crc
+
+
+    def add_move(self, vector):
+        code = MOVE_CODES[tuple(vector)]
+        if self.move_count % 4 == 0:
+            self.moves.append(0)
+        self.moves[-1] |= code << ((self.move_count % 4) * 2)
+        self.move_count += 1
+
+
+    def iter_moves(self):
+        for i in range(self.move_count):
+            yield MOVES[(self.moves[i >> 2] >> ((i & 3) * 2)) & 3]
+
+
+    def to_bytes(self):
+        config = json.dumps(self.config, sort_keys=True).encode('utf-8')
+
+        parts = [_HEADER.pack(MAGIC, VERSION), _LENGTH.pack(len(config)), config,
+                 _SEED.pack(self.random_seed), _COUNT.pack(self.move_count),
+                 bytes(self.moves), _COUNT.pack(len(self.events))]
+        for position, event in self.events:
+            parts.append(_EVENT.pack(position, event))
+        parts.append(_TRAILER.pack(self.score, self.board_crc, END))
+
+        return b''.join(parts)
+
+
+
+def game_config(game):
+    """
+    Returns the Game arguments of a game as a dict that can be put in a log.
+    """
+
+    if game.merge_length != None:
+        merge_function = None
+    else:
+        names = [name for name, function in MERGE_FUNCTIONS.items()
+                 if function is game.merge_lengths_func]
+        if len(names) == 0:
+            raise ValueError("The game's merge function can't be recorded.")
+        merge_function = names[0]
+
+    return {
+        'rows': len(game.board),
+        'cols': len(game.board[0]),
+        'seeds': [list(seed) for seed in game.seeds],
+        'merge_length': game.merge_length,
+        'merge_function': merge_function,
+    }
+
+
+
+def create_game(config, random_seed):
+    merge_function = config['merge_function']
+    if merge_function != None and merge_function not in MERGE_FUNCTIONS:
+        raise LogError("Unknown merge function: %s" % merge_function)
+
+    kwargs = {
+        'rows': config['rows'],
+        'cols': config['cols'],
+        'seeds': tuple(tuple(seed) for seed in config['seeds']),
+        'random_seed': random_seed,
+    }
+    if merge_function == None:
+        kwargs['merge_length'] = config['merge_length']
+    else:
+        kwargs['merge_lengths_func'] = MERGE_FUNCTIONS[merge_function]
+
+    return py2187.Game(**kwargs)
+
+
+
+def board_crc(board):
+    return zlib.crc32(json.dumps(board).encode('utf-8'))
+
+
+
+class GameRecorder:
+    """
+    Records a game from the time it is created. It has the same methods for
+    playing as a Game, and they have to be called on the recorder rather
+    than the game.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.log = GameLog(game_config(game), game.random_seed)
+
+
+    def initialise(self):
+        self.game.initialise()
+
+
+    def make_move(self, vector, animate=False):
+        self.game.make_move(vector, animate)
+        if self.game.moved:
+            self.log.add_move(vector)
+
+
+    def add_seed_tile(self):
+        self.game.add_seed_tile()
+
+
+    def undo(self):
+        if self.game.undo():
+            self.log.events.append((self.log.move_count, UNDO))
+
+
+    def redo(self):
+        if self.game.redo():
+            self.log.events.append((self.log.move_count, REDO))
+
+
+    def finish(self):
+        """
+        Returns the log with the final score and board.
+        """
+
+        self.log.score = self.game.score
+        self.log.board_crc = board_crc(self.game.board)
+        return self.log
+
+
+    def save(self, out):
+        out.write(self.finish().to_bytes())
+
+
+
+def _read(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise LogError("The log ends early.")
+
+    return data
+
+
+
+def read_log(stream):
+    """
+    Reads the next log from a binary stream. Returns None at the end of
+    the stream.
+    """
+
+    header = stream.read(_HEADER.size)
+    if len(header) == 0:
+        return None
+    if len(header) != _HEADER.size:
+        raise LogError("The log ends early.")
+
+    magic, version = _HEADER.unpack(header)
+    if magic != MAGIC:
+        raise LogError("This is not a py2187 log.")
+    if version != VERSION:
+        raise LogError("Unknown log version: %d" % version)
+
+    length, = _LENGTH.unpack(_read(stream, _LENGTH.size))
+    config = json.loads(_read(stream, length).decode('utf-8'))
+    random_seed, = _SEED.unpack(_read(stream, _SEED.size))
+
+    move_count, = _COUNT.unpack(_read(stream, _COUNT.size))
+    moves = _read(stream, (move_count + 3) // 4)
+
+    event_count, = _COUNT.unpack(_read(stream, _COUNT.size))
+    events = [_EVENT.unpack(_read(stream, _EVENT.size)) for i in range(event_count)]
+
+    score, crc, end = _TRAILER.unpack(_read(stream, _TRAILER.size))
+    if end != END:
+        raise LogError("The log has a bad trailer.")
+
+    return GameLog(config, random_seed, moves, move_count, events, score, crc)
+
+
+
+def iter_logs(path):
+    """
+    Yields (file path, log) for every log in a file, or in every file under
+    a directory. Only one file is open and one log held at a time.
+    """
+
+    if os.path.isdir(path):
+        for directory, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                for item in iter_logs(os.path.join(directory, filename)):
+                    yield item
+        return
+
+    with open(path, 'rb') as stream:
+        while True:
+            log = read_log(stream)
+            if log == None:
+                break
+            yield (path, log)
+
+
+
+def replay(log):
+    """
+    Plays a log again and returns the game as it ends up.
+    Raises LogError if a recorded move doesn't move a tile.
+    """
+
+    game = create_game(log.config, log.random_seed)
+    game.initialise()
+
+    events = log.events
+    e = 0
+    move_number = 0
+    for vector in log.iter_moves():
+        while e < len(events) and events[e][0] == move_number:
+            _replay_event(game, events[e][1])
+            e += 1
+
+        game.make_move(vector)
+        if not game.moved:
+            raise LogError("Move %d doesn't move a tile." % move_number)
+        game.add_seed_tile()
+        move_number += 1
+
+    while e < len(events):
+        _replay_event(game, events[e][1])
+        e += 1
+
+    return game
+
+
+
+def _replay_event(game, event):
+    if event == UNDO:
+        game.undo()
+    elif event == REDO:
+        game.redo()
+    else:
+        raise LogError("Unknown history event: %r" % event)
+
+
+
+def verify(log):
+    """
+    Returns True if replaying the log gives the recorded score and board.
+    """
+
+    game = replay(log)
+    return game.score == log.score and board_crc(game.board) == log.board_crc
+
+
+
+def main(args):
+    games = 0
+    moves = 0
+    failures = 0
+
+    start = time.perf_counter()
+    for path in args.paths:
+        for log_path, log in iter_logs(path):
+            games += 1
+            moves += log.move_count
+            try:
+                ok = verify(log)
+            except LogError as e:
+                sys.stdout.write("%s: game %d: %s\n" % (log_path, games, e))
+                ok = False
+                failures += 1
+                continue
+
+            if not ok:
+                sys.stdout.write("%s: game %d doesn't match\n" % (log_path, games))
+                failures += 1
+
+    seconds = time.perf_counter() - start
+
+    sys.stdout.write("Replayed %d games (%d moves) in %.2fs, %d failed\n"
+                     % (games, moves, seconds, failures))
+
+    return failures
+
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description='Replay and check py2187 game logs.')
+    argparser.add_argument('paths', nargs='+')
+
+    sys.exit(1 if main(argparser.parse_args()) > 0 else 0)
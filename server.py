@@ -0,0 +1,378 @@
+"""
+
+An asyncio game server for py2187
+
+The server holds many games, one per session, and plays them for clients
+over a line protocol on a TCP port or a Unix socket. Every game uses the
+rules the server was started with. After a move only the cells that changed
+are sent back.
+
+Requests are one line each and every request gets one line back:
+
+    NEW [seed]            ->  BOARD id score over cells...
+    BOARD id              ->  BOARD id score over cells...
+    MOVE id U|D|L|R       ->  MOVED id score over cells...  or  SAME id
+    CLOSE id              ->  CLOSED id
+    anything wrong        ->  ERR message
+
+A cell is y,x,value with '.' for an empty cell. BOARD lists the tiles on
+the board and MOVED lists the cells changed by the move and the seed tile
+added after it. over is 1 once no move is left.
+
+A session can only be used by the connection that made it. It is closed
+when that connection closes or when it has been idle for idle_timeout
+seconds. Requests on a connection are handled in order, and a client that
+doesn't read its replies holds up its own requests, not other clients.
+
+    python server.py serve --port 2187 --basic 2
+    python server.py load --port 2187 --sessions 5000
+
+"""
+
+import sys
+import time
+import random
+import asyncio
+import itertools
+
+import py2187
+
+
+MOVES = {
+    'U': py2187.UP_MOVE,
+    'D': py2187.DOWN_MOVE,
+    'L': py2187.LEFT_MOVE,
+    'R': py2187.RIGHT_MOVE,
+}
+
+# The longest request line the server reads
+LINE_LIMIT = 1024
+
+
+
+def format_cells(cells):
+    return ' '.join("%d,%d,%s" % (y, x, '.' if value == None else value)
+                    for y, x, value in cells)
+
+
+
+def parse_cells(words):
+    cells = []
+    for word in words:
+        y, x, value = word.split(',')
+        cells.append((int(y), int(x), None if value == '.' else int(value)))
+
+    return cells
+
+
+
+class ProtocolError(Exception):
+    pass
+
+
+
+class Session:
+
+    def __init__(self, session_id, game, owner):
+        self.id = session_id
+        self.game = game
+        self.owner = owner
+        self.last_used = time.monotonic()
+
+
+
+class GameServer:
+
+    def __init__(self, game_kwargs=None, max_sessions=10000, idle_timeout=300.0):
+        if game_kwargs == None:
+            game_kwargs = {}
+
+        self.game_kwargs = game_kwargs
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+
+        self.sessions = {}
+        self._session_ids = itertools.count(1)
+        self._connection_ids = itertools.count(1)
+        self.moves = 0
+
+
+    def handle_line(self, connection, line):
+        """
+        Handles one request line from a connection and returns the reply line.
+        """
+
+        words = line.split()
+        try:
+            if len(words) == 0:
+                raise ProtocolError("empty request")
+
+            command = words[0].upper()
+            if command == 'NEW':
+                return self._new(connection, words[1:])
+            elif command == 'BOARD':
+                return self._board(self._session(connection, words, 2))
+            elif command == 'MOVE':
+                return self._move(self._session(connection, words, 3), words[2])
+            elif command == 'CLOSE':
+                session = self._session(connection, words, 2)
+                del self.sessions[session.id]
+                return "CLOSED %d" % session.id
+
+            raise ProtocolError("unknown command %s" % words[0])
+
+        except ProtocolError as e:
+            return "ERR %s" % e
+
+
+    def _session(self, connection, words, word_count):
+        if len(words) != word_count:
+            raise ProtocolError("%s takes %d arguments" % (words[0].upper(), word_count - 1))
+
+        try:
+            session = self.sessions.get(int(words[1]))
+        except ValueError:
+            session = None
+
+        # Other connections' sessions look the same as missing ones
+        if session == None or session.owner != connection:
+            raise ProtocolError("no session %s" % words[1])
+
+        session.last_used = time.monotonic()
+        return session
+
+
+    def _new(self, connection, args):
+        if len(args) > 1:
+            raise ProtocolError("NEW takes at most 1 argument")
+        if len(self.sessions) >= self.max_sessions:
+            raise ProtocolError("server full")
+
+        random_seed = None
+        if len(args) == 1:
+            try:
+                random_seed = int(args[0])
+            except ValueError:
+                raise ProtocolError("bad seed %s" % args[0])
+
+        # Only the last move is kept, for last_change
+        game = py2187.Game(history_cells=0, random_seed=random_seed, **self.game_kwargs)
+        game.initialise()
+
+        session = Session(next(self._session_ids), game, connection)
+        self.sessions[session.id] = session
+
+        return self._board(session)
+
+
+    def _board(self, session):
+        game = session.game
+        board = game.board
+        cells = [(y, x, board[y][x]) for y in range(len(board)) for x in range(len(board[0]))
+                 if board[y][x] != None]
+
+        return "BOARD %d %d %d %s" % (session.id, game.score,
+                                      0 if game.valid_move_exists() else 1,
+                                      format_cells(cells))
+
+
+    def _move(self, session, direction):
+        vector = MOVES.get(direction.upper())
+        if vector == None:
+            raise ProtocolError("bad direction %s" % direction)
+
+        game = session.game
+        if not game.valid_move_exists():
+            return "SAME %d" % session.id
+
+        game.make_move(vector)
+        if not game.moved:
+            return "SAME %d" % session.id
+
+        game.add_seed_tile()
+        self.moves += 1
+
+        cells = [(y, x, new_value) for y, x, old_value, new_value in game.last_change()]
+        return "MOVED %d %d %d %s" % (session.id, game.score,
+                                      0 if game.valid_move_exists() else 1,
+                                      format_cells(cells))
+
+
+    def close_connection(self, connection):
+        for session_id in [session.id for session in self.sessions.values()
+                           if session.owner == connection]:
+            del self.sessions[session_id]
+
+
+    def evict_idle(self, now=None):
+        """
+        Closes the sessions that have been idle for too long and returns
+        how many there were.
+        """
+
+        if now == None:
+            now = time.monotonic()
+
+        idle = [session.id for session in self.sessions.values()
+                if now - session.last_used > self.idle_timeout]
+        for session_id in idle:
+            del self.sessions[session_id]
+
+        return len(idle)
+
+
+    async def handle_connection(self, reader, writer):
+        connection = next(self._connection_ids)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(b"ERR line too long\n")
+                    break
+
+                if len(line) == 0:
+                    break
+
+                # Error replies echo the request, so bytes that aren't ASCII
+                # are sent back escaped
+                reply = self.handle_line(connection, line.decode('ascii', 'replace'))
+                writer.write(reply.encode('ascii', 'backslashreplace') + b"\n")
+
+                # Stop reading requests while the client isn't reading replies
+                await writer.drain()
+
+        except ConnectionError:
+            pass
+
+        finally:
+            self.close_connection(connection)
+            writer.close()
+
+
+    async def evict_idle_forever(self):
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 2, 0.1))
+            self.evict_idle()
+
+
+    async def serve(self, host='127.0.0.1', port=2187, path=None):
+        if path != None:
+            server = await asyncio.start_unix_server(self.handle_connection, path,
+                                                     limit=LINE_LIMIT)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port,
+                                                limit=LINE_LIMIT)
+
+        evictor = asyncio.ensure_future(self.evict_idle_forever())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            evictor.cancel()
+
+
+
+async def open_connection(host='127.0.0.1', port=2187, path=None):
+    if path != None:
+        return await asyncio.open_unix_connection(path)
+
+    return await asyncio.open_connection(host, port)
+
+
+
+async def _load_connection(args, session_count, deadline, counts, seed):
+    reader, writer = await open_connection(args.host, args.port, args.path)
+    rng = random.Random(seed)
+    directions = sorted(MOVES)
+
+    async def request(lines):
+        # Sends a batch of requests at once and reads their replies
+        writer.write(''.join(line + "\n" for line in lines).encode('ascii'))
+        replies = []
+        for i in range(len(lines)):
+            replies.append((await reader.readline()).decode('ascii').split())
+        return replies
+
+    replies = await request(["NEW %d" % rng.getrandbits(32) for i in range(session_count)])
+    sessions = [reply[1] for reply in replies]
+
+    while time.monotonic() < deadline:
+        replies = await request(["MOVE %s %s" % (session_id, rng.choice(directions))
+                                 for session_id in sessions])
+
+        finished = []
+        for i in range(len(replies)):
+            reply = replies[i]
+            if reply[0] == 'MOVED':
+                counts['moves'] += 1
+                if reply[3] == '1':
+                    finished.append(i)
+            elif reply[0] == 'ERR':
+                raise RuntimeError(' '.join(reply))
+
+        # Finished games are swapped for new ones
+        if len(finished) > 0:
+            await request(["CLOSE %s" % sessions[i] for i in finished])
+            replies = await request(["NEW %d" % rng.getrandbits(32) for i in finished])
+            for i, reply in zip(finished, replies):
+                sessions[i] = reply[1]
+            counts['games'] += len(finished)
+
+    writer.close()
+
+
+
+async def load_test(args, out=sys.stdout):
+    """
+    Plays random moves on args.sessions sessions spread over
+    args.connections connections for args.seconds seconds and reports the
+    rate of moves.
+    """
+
+    counts = {'moves': 0, 'games': 0}
+    start = time.monotonic()
+    deadline = start + args.seconds
+
+    connections = min(args.connections, args.sessions)
+    per_connection = [args.sessions // connections + (1 if i < args.sessions % connections else 0)
+                      for i in range(connections)]
+
+    await asyncio.gather(*[_load_connection(args, per_connection[i], deadline, counts, i)
+                           for i in range(connections)])
+
+    seconds = time.monotonic() - start
+    out.write("%d sessions on %d connections: %d moves in %.1fs, %.0f moves/sec, %d games finished\n"
+              % (args.sessions, connections, counts['moves'], seconds,
+                 counts['moves'] / seconds, counts['games']))
+
+    return counts
+
+
+
+def main(args):
+    if args.command == 'serve':
+        server = GameServer(py2187.game_kwargs_from_args(args), args.max_sessions,
+                            args.idle_timeout)
+        try:
+            asyncio.run(server.serve(args.host, args.port, args.path))
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(load_test(args))
+
+
+
+if __name__ == "__main__":
+    argparser = py2187.create_argparser('Serve games of py2187, or load test a server.')
+    argparser.add_argument('command', choices=['serve', 'load'])
+    argparser.add_argument('--host', default='127.0.0.1')
+    argparser.add_argument('--port', type=int, default=2187)
+    argparser.add_argument('--path')
+    argparser.add_argument('--max-sessions', type=int, default=10000)
+    argparser.add_argument('--idle-timeout', type=float, default=300.0)
+    argparser.add_argument('--sessions', type=int, default=5000)
+    argparser.add_argument('--connections', type=int, default=50)
+    argparser.add_argument('--seconds', type=float, default=10.0)
+
+    main(argparser.parse_args())
@@ -0,0 +1,205 @@
+"""
+
+Headless self-play for py2187
+
+Plays many games of one configuration with a simple policy, spread over a
+pool of processes, and reports how fast they were played and how they went.
+The games use the packed engine.
+
+iter_records yields a GameRecord for each game as the games finish, and the
+streaming aggregators in stats.py sum them up, so any number of games can be
+played in constant memory. With --stats a snapshot of the statistics is
+written to a JSON file every --snapshot-every seconds while the games run.
+
+    python simulate.py --basic 3 --multiple --games 1000 --policy greedy
+    python simulate.py --basic 3 --multiple --games 1000000 --stats stats.json
+
+"""
+
+import os
+import time
+import random
+import collections
+import concurrent.futures
+
+import py2187
+import packed
+import stats
+
+
+MOVES = (py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE)
+
+# The corner policy keeps the big tiles in the bottom left corner.
+CORNER_PREFERENCE = (py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE, py2187.UP_MOVE)
+
+# The most games a worker plays in one go
+CHUNK_LIMIT = 256
+
+# merges maps a merge length to the number of merges of that many tiles and
+# seconds is the time spent choosing and making the moves
+GameRecord = collections.namedtuple('GameRecord', 'seed moves max_tile score merges seconds')
+
+
+
+def possible_moves(game):
+    """
+    Returns a list of (vector, new_board) for the moves that change the board.
+    """
+
+    moves = []
+    for vector in MOVES:
+        new_board, moved = game.engine.make_move(game.board, game.rows, game.cols, vector)
+        if moved:
+            moves.append((vector, new_board))
+
+    return moves
+
+
+
+def random_policy(game):
+    return game.rng.choice(possible_moves(game))[0]
+
+
+
+def greedy_policy(game):
+    # Take the move that leaves the most empty cells, which is the one
+    # that merges the most tiles.
+    best_vector = None
+    best_empty = -1
+    for vector, new_board in possible_moves(game):
+        empty = new_board.to_bytes(game.rows * game.cols, 'little').count(0)
+        if empty > best_empty:
+            best_vector = vector
+            best_empty = empty
+
+    return best_vector
+
+
+
+def corner_policy(game):
+    moves = [vector for vector, new_board in possible_moves(game)]
+    for vector in CORNER_PREFERENCE:
+        if vector in moves:
+            return vector
+
+
+
+POLICIES = {
+    'random': random_policy,
+    'greedy': greedy_policy,
+    'corner': corner_policy,
+}
+
+
+
+def play_game(game_kwargs, policy, seed=None):
+    """
+    Plays one game to the end and returns a GameRecord. The game and the
+    policy draw from the game's own random numbers, from seed.
+    """
+
+    game = packed.PackedGame(random_seed=seed, **game_kwargs)
+    game.initialise()
+
+    moves = 0
+    score = 0
+    merges = collections.Counter()
+    seconds = 0.0
+    perf_counter = time.perf_counter
+
+    while True:
+        start = perf_counter()
+        if not game.valid_move_exists():
+            seconds += perf_counter() - start
+            break
+
+        board = game.board
+        vector = policy(game)
+        game.make_move(vector)
+        game.add_seed_tile()
+        seconds += perf_counter() - start
+        moves += 1
+
+        # The merges are counted outside the timing
+        points, merge_lengths = game.engine.merges(board, game.rows, game.cols, vector)
+        score += points
+        merges.update(merge_lengths)
+
+    max_tile = max(value for row in game.get_board() for value in row if value != None)
+
+    return GameRecord(seed, moves, max_tile, score, dict(merges), seconds)
+
+
+
+def play_games(game_kwargs, policy_name, seeds):
+    policy = POLICIES[policy_name]
+    return [play_game(game_kwargs, policy, seed) for seed in seeds]
+
+
+
+def iter_records(game_kwargs, games, policy_name='random', workers=None, seed=None):
+    """
+    Plays a number of games over a pool of worker processes and yields a
+    GameRecord for each, in the same order whatever the number of workers.
+    Only a few chunks of games are in hand at once, so memory use doesn't
+    grow with the number of games.
+    """
+
+    if policy_name not in POLICIES:
+        raise ValueError("Unknown policy: %s" % policy_name)
+
+    if workers == None:
+        workers = os.cpu_count() or 1
+
+    seed_rng = random.Random(seed)
+
+    # Several chunks per worker keeps them all busy to the end.
+    chunk_size = max(1, min(CHUNK_LIMIT, games // (workers * 4)))
+
+    def chunks():
+        for start in range(0, games, chunk_size):
+            yield [seed_rng.getrandbits(62) for i in range(min(chunk_size, games - start))]
+
+    if workers == 1:
+        for chunk in chunks():
+            for record in play_games(game_kwargs, policy_name, chunk):
+                yield record
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for chunk in chunks():
+            pending.append(executor.submit(play_games, game_kwargs, policy_name, chunk))
+            if len(pending) >= workers * 2:
+                for record in pending.popleft().result():
+                    yield record
+
+        while len(pending) > 0:
+            for record in pending.popleft().result():
+                yield record
+
+
+
+def main(args):
+    game_kwargs = py2187.game_kwargs_from_args(args)
+
+    start = time.perf_counter()
+    records = iter_records(game_kwargs, args.games, args.policy, args.workers, args.random_seed)
+    game_stats = stats.collect(records, stats.GameStats(), args.stats, args.snapshot_every)
+    seconds = time.perf_counter() - start
+
+    stats.report(game_stats, seconds)
+
+
+
+if __name__ == "__main__":
+    argparser = py2187.create_argparser('Play headless games of py2187.')
+    argparser.add_argument('-g', '--games', type=py2187.positive_int, default=100)
+    argparser.add_argument('-p', '--policy', choices=sorted(POLICIES), default='random')
+    argparser.add_argument('-w', '--workers', type=int)
+    argparser.add_argument('--random-seed', type=int)
+    argparser.add_argument('--stats', metavar='PATH')
+    argparser.add_argument('--snapshot-every', type=float, default=10.0)
+
+    main(argparser.parse_args())
+
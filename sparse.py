@@ -0,0 +1,237 @@
+"""
+
+A sparse board backend for py2187
+
+The board keeps only its tiles, in a dict of {x: value} for each row that
+has a tile and a dict of {y: value} for each column that has a tile. A move
+sorts the tiles of each occupied line and runs them through
+py2187.move_tiles, so it costs time in proportion to the number of tiles
+and not the size of the board. That makes very large, mostly empty boards
+(1000x1000 say) practical.
+
+py2187.make_move moves a SparseBoard with its own make_move, and
+py2187.create_game(backend='sparse') makes a SparseGame.
+
+"""
+
+import random
+
+import py2187
+
+
+
+class SparseBoard:
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.row_tiles = {}
+        self.col_tiles = {}
+        self.count = 0
+
+
+    @classmethod
+    def from_lists(cls, board):
+        sparse_board = cls(len(board), len(board[0]))
+        for y in range(len(board)):
+            for x in range(len(board[0])):
+                if board[y][x] != None:
+                    sparse_board.set(y, x, board[y][x])
+
+        return sparse_board
+
+
+    def to_lists(self):
+        board = [[None for x in range(self.cols)] for y in range(self.rows)]
+        for y, x, value in self.tiles():
+            board[y][x] = value
+
+        return board
+
+
+    def __eq__(self, other):
+        return (isinstance(other, SparseBoard) and self.rows == other.rows and
+                self.cols == other.cols and self.row_tiles == other.row_tiles)
+
+
+    def __ne__(self, other):
+        return not self == other
+
+
+    def get(self, y, x):
+        row = self.row_tiles.get(y)
+        if row == None:
+            return None
+
+        return row.get(x)
+
+
+    def set(self, y, x, value):
+        if value == None:
+            row = self.row_tiles.get(y)
+            if row == None or x not in row:
+                return
+
+            del row[x]
+            if len(row) == 0:
+                del self.row_tiles[y]
+
+            col = self.col_tiles[x]
+            del col[y]
+            if len(col) == 0:
+                del self.col_tiles[x]
+
+            self.count -= 1
+
+        else:
+            row = self.row_tiles.setdefault(y, {})
+            if x not in row:
+                self.count += 1
+
+            row[x] = value
+            self.col_tiles.setdefault(x, {})[y] = value
+
+
+    def tiles(self):
+        """
+        Yields (y, x, value) for every tile.
+        """
+
+        for y, row in self.row_tiles.items():
+            for x, value in row.items():
+                yield (y, x, value)
+
+
+    def make_move(self, vector, merge_rule, merges=None):
+        """
+        Returns (new_board, moved) like py2187.make_move.
+        """
+
+        dx, dy = vector
+        if dx != 0:
+            lines = self.row_tiles
+            length = self.cols
+            toward_end = dx > 0
+        else:
+            lines = self.col_tiles
+            length = self.rows
+            toward_end = dy > 0
+
+        new_board = SparseBoard(self.rows, self.cols)
+        something_moved = False
+
+        for line, line_tiles in lines.items():
+            # Positions are counted from the end the tiles move towards
+            if toward_end:
+                tiles = sorted((length - 1 - i, value) for i, value in line_tiles.items())
+            else:
+                tiles = sorted(line_tiles.items())
+
+            new_tiles, moved = py2187.move_tiles(tiles, length, merge_rule, None, merges)
+            if moved:
+                something_moved = True
+
+            for position, value in new_tiles:
+                if toward_end:
+                    i = length - 1 - position
+                else:
+                    i = position
+
+                if dx != 0:
+                    new_board.set(line, i, value)
+                else:
+                    new_board.set(i, line, value)
+
+        return (new_board, something_moved)
+
+
+
+class SparseGame:
+    """
+    A Game on a SparseBoard. It has the same interface as py2187.Game except
+    for undo and redo, and the board is only turned into lists by get_board().
+    """
+
+    def __init__(self, rows=6, cols=6, seeds=((3,0.9),(9,0.1)),
+                 merge_length=3, merge_lengths_func=None, random_seed=None):
+
+        self.merge_rule = py2187.get_merge_rule(merge_lengths_func, merge_length)
+
+        if merge_lengths_func == None:
+            self.merge_lengths_func = self.merge_rule
+            self.merge_length = merge_length
+        else:
+            self.merge_lengths_func = merge_lengths_func
+            self.merge_length = None
+
+        if random_seed == None:
+            random_seed = random.getrandbits(63)
+        self.random_seed = random_seed
+        self.rng = random.Random(random_seed)
+
+        self.rows = rows
+        self.cols = cols
+        self.seeds = seeds
+        self.board = SparseBoard(rows, cols)
+        self.score = 0
+        self.moved = False
+        self._seed_table = None
+
+
+    def initialise(self):
+        self.add_seed_tile()
+        self.add_seed_tile()
+
+
+    def get_board(self):
+        return self.board.to_lists()
+
+
+    def set_board(self, board):
+        self.board = SparseBoard.from_lists(board)
+
+
+    def set_cell(self, y, x, value):
+        self.board.set(y, x, value)
+
+
+    def make_move(self, vector, animate=False):
+        merges = []
+        self.board, self.moved = self.board.make_move(vector, self.merge_rule, merges)
+        self.score += sum(merges)
+
+
+    def get_empty_cells(self):
+        return [[y, x] for y in range(self.rows) for x in range(self.cols)
+                if self.board.get(y, x) == None]
+
+
+    def add_seed_tile(self):
+        if self._seed_table == None or self._seed_table.seeds is not self.seeds:
+            self._seed_table = py2187.AliasTable(self.seeds)
+
+        # While at least half the board is empty, picking cells at random
+        # until an empty one turns up takes two tries on average.
+        cell_count = self.rows * self.cols
+        if self.board.count * 2 <= cell_count:
+            while True:
+                cell = self.rng.randrange(cell_count)
+                y, x = divmod(cell, self.cols)
+                if self.board.get(y, x) == None:
+                    break
+        else:
+            y, x = self.rng.choice(self.get_empty_cells())
+
+        self.board.set(y, x, self._seed_table.sample(self.rng))
+
+
+    def valid_move_exists(self):
+        if 0 < self.board.count < self.rows * self.cols:
+            return True
+
+        for vector in (py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE):
+            new_board, moved = self.board.make_move(vector, self.merge_rule)
+            if moved:
+                return True
+
+        return False
@@ -0,0 +1,247 @@
+"""
+
+Streaming statistics for py2187 simulations
+
+The aggregators here take values one at a time and keep a fixed amount of
+state however many they are given, so a stream of game records from
+simulate.iter_records can be summed up without holding the records.
+
+    RunningMean      count, mean, standard deviation, min and max
+    Histogram        a count of each distinct value, for values with few
+                     distinct values such as the max tile
+    QuantileSketch   approximate quantiles with a bounded relative error,
+                     from counts of logarithmically sized buckets
+
+GameStats puts them together for game records, and collect() feeds a
+stream of records into a GameStats, writing a JSON snapshot of it to a file
+every so often and at the end:
+
+    records = simulate.iter_records(game_kwargs, 1000000, 'greedy')
+    stats = collect(records, GameStats(), 'stats.json', every=10.0)
+
+"""
+
+import os
+import sys
+import math
+import json
+import time
+import collections
+
+
+
+class RunningMean:
+    """
+    Welford's running mean and variance.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._squares = 0.0
+        self.min = None
+        self.max = None
+
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._squares += delta * (value - self.mean)
+
+        if self.min == None or value < self.min:
+            self.min = value
+        if self.max == None or value > self.max:
+            self.max = value
+
+
+    def std(self):
+        if self.count < 2:
+            return 0.0
+
+        return math.sqrt(self._squares / (self.count - 1))
+
+
+    def snapshot(self):
+        return {'count': self.count, 'mean': self.mean, 'std': self.std(),
+                'min': self.min, 'max': self.max}
+
+
+
+class Histogram:
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.count = 0
+
+
+    def add(self, value):
+        self.counts[value] += 1
+        self.count += 1
+
+
+    def snapshot(self):
+        # JSON keys have to be strings
+        return dict((str(value), self.counts[value]) for value in sorted(self.counts))
+
+
+
+class QuantileSketch:
+    """
+    Approximate quantiles of positive values. A value goes in the bucket
+    k = ceil(log(value) / log(gamma)), where gamma = (1 + a) / (1 - a) for
+    a relative accuracy a, and a quantile is read back as the middle of its
+    bucket, which is within a of the true value. Zero and negative values
+    are counted together. The number of buckets only grows with the log of
+    the range of the values, so it stays small.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = collections.Counter()
+        self.zero_count = 0
+        self.count = 0
+
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+        else:
+            self.buckets[int(math.ceil(math.log(value) / self._log_gamma))] += 1
+
+
+    def quantile(self, fraction):
+        if self.count == 0:
+            return None
+
+        rank = fraction * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if rank < seen:
+                return 2 * self.gamma ** k / (self.gamma + 1)
+
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+    def snapshot(self, fractions=(0.1, 0.5, 0.9, 0.99)):
+        return dict(('p%g' % (fraction * 100), self.quantile(fraction)) for fraction in fractions)
+
+
+
+class GameStats:
+    """
+    Streaming statistics of game records: the max tile, the number of
+    moves, the score, the time per move and the merges of each length.
+    """
+
+    def __init__(self):
+        self.games = 0
+        self.max_tiles = Histogram()
+        self.moves = RunningMean()
+        self.move_quantiles = QuantileSketch()
+        self.scores = RunningMean()
+        self.move_seconds = RunningMean()
+        self.move_seconds_quantiles = QuantileSketch()
+        self.merges = {}
+
+
+    def add(self, record):
+        self.games += 1
+        self.max_tiles.add(record.max_tile)
+        self.moves.add(record.moves)
+        self.move_quantiles.add(record.moves)
+        self.scores.add(record.score)
+
+        if record.moves > 0:
+            self.move_seconds.add(record.seconds / record.moves)
+            self.move_seconds_quantiles.add(record.seconds / record.moves)
+
+        for length, count in record.merges.items():
+            self.merges[length] = self.merges.get(length, 0) + count
+
+
+    def snapshot(self):
+        return {
+            'games': self.games,
+            'max_tile': self.max_tiles.snapshot(),
+            'moves': dict(self.moves.snapshot(), **self.move_quantiles.snapshot()),
+            'score': self.scores.snapshot(),
+            'move_seconds': dict(self.move_seconds.snapshot(),
+                                 **self.move_seconds_quantiles.snapshot()),
+            'merges_per_game': dict((str(length), self.merges[length] / float(max(self.games, 1)))
+                                    for length in sorted(self.merges)),
+        }
+
+
+
+def write_snapshot(snapshot, path):
+    """
+    Writes a snapshot as JSON. It is written to a temporary file first, so
+    a reader never sees half a snapshot.
+    """
+
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(snapshot, f, indent=2, sort_keys=True)
+    os.replace(temporary_path, path)
+
+
+
+def collect(records, stats, path=None, every=10.0, clock=time.monotonic):
+    """
+    Adds every record from an iterable to stats. If path is given a
+    snapshot is written to it every every seconds and once at the end.
+    Returns stats.
+    """
+
+    last_snapshot = clock()
+    for record in records:
+        stats.add(record)
+
+        if path != None and clock() - last_snapshot >= every:
+            write_snapshot(stats.snapshot(), path)
+            last_snapshot = clock()
+
+    if path != None:
+        write_snapshot(stats.snapshot(), path)
+
+    return stats
+
+
+
+def report(stats, seconds, out=sys.stdout):
+    snapshot = stats.snapshot()
+    games = snapshot['games']
+    moves = stats.moves.mean * games
+
+    out.write("Played %d games (%d moves) in %.2fs\n" % (games, moves, seconds))
+    if games == 0:
+        out.write("No games, so no statistics\n")
+        return
+
+    out.write("%.1f games/sec, %.1f moves/sec\n" % (games / seconds, moves / seconds))
+
+    out.write("\nMax tile\n")
+    for tile in sorted(stats.max_tiles.counts):
+        count = stats.max_tiles.counts[tile]
+        out.write("%10d %8d %6.1f%%\n" % (tile, count, 100.0 * count / games))
+
+    out.write("\nMoves per game\n")
+    for name in ('min', 'p10', 'p50', 'p90', 'max'):
+        out.write("%10s %8d\n" % (name, snapshot['moves'][name]))
+    out.write("%10s %8.1f\n" % ('mean', snapshot['moves']['mean']))
+
+    out.write("\nMerges per game\n")
+    for length, count in sorted(snapshot['merges_per_game'].items(), key=lambda item: int(item[0])):
+        out.write("%10s %8.1f\n" % ("%s tiles" % length, count))
+
+    out.write("\nTime per move\n")
+    for name in ('p50', 'p90', 'p99'):
+        out.write("%10s %8.1f us\n" % (name, snapshot['move_seconds'][name] * 1e6))
@@ -0,0 +1,295 @@
+"""
+
+Parameter sweeps for py2187
+
+Plays headless games at every point of a grid of configurations (rows,
+cols, seed values, the distribution given to create_seed_distribution and
+the merge rule) and reports how long the games lasted and the tiles they
+made. The games of each point are played across all cores by
+simulate.iter_records and summed up by stats.GameStats.
+
+The result of each point is cached on disk in a JSON file named by a hash
+of its configuration, the number of games, the policy, the random seed,
+py2187.ENGINE_VERSION and the source of the simulate and packed modules,
+which hold the policies and the engine the games are played with. Running
+a sweep again only plays the points that are new or have changed.
+
+    python sweep.py --rows 4 5 6 --seeds 3 9 --seeds 2 3 --distribution 0.75 0.9 \\
+        --rule 3 power --games 500
+
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import itertools
+
+import py2187
+import packed
+import simulate
+import stats
+
+
+DEFAULT_CACHE = '.sweep_cache'
+
+RULES = {
+    'power': py2187.power_merge_lengths,
+}
+
+
+
+def sweep_points(rows, cols, seed_values, distributions, rules):
+    """
+    Returns the configurations of every combination of the parameters, as
+    dicts. If cols is None the boards are square.
+    """
+
+    points = []
+    if cols == None:
+        sizes = [(size, size) for size in rows]
+    else:
+        sizes = list(itertools.product(rows, cols))
+
+    for (row_count, col_count), seeds, distribution, rule in itertools.product(
+            sizes, seed_values, distributions, rules):
+        points.append({
+            'rows': row_count,
+            'cols': col_count,
+            'seeds': list(seeds),
+            'distribution': distribution,
+            'rule': rule,
+        })
+
+    return points
+
+
+
+def parse_rule(rule):
+    """
+    A rule is a merge length or the name of a merge function in RULES.
+    """
+
+    if rule in RULES:
+        return rule
+
+    try:
+        return int(rule)
+    except ValueError:
+        raise argparse.ArgumentTypeError("A rule is a merge length or one of: %s"
+                                         % ', '.join(sorted(RULES)))
+
+
+
+def game_kwargs(config):
+    kwargs = {
+        'rows': config['rows'],
+        'cols': config['cols'],
+        'seeds': py2187.create_seed_distribution(config['seeds'], config['distribution']),
+    }
+
+    if config['rule'] in RULES:
+        kwargs['merge_lengths_func'] = RULES[config['rule']]
+    else:
+        kwargs['merge_length'] = config['rule']
+
+    return kwargs
+
+
+
+# The modules whose source goes into the cache keys
+SOURCE_MODULES = (simulate, packed)
+
+_source_hash = None
+
+
+def source_hash():
+    """
+    Returns a hash of the source of SOURCE_MODULES, so that a change to a
+    policy or to how games are played doesn't use results cached before it.
+    """
+
+    global _source_hash
+
+    if _source_hash == None:
+        digest = hashlib.sha256()
+        for module in SOURCE_MODULES:
+            with open(module.__file__, 'rb') as f:
+                digest.update(f.read())
+        _source_hash = digest.hexdigest()
+
+    return _source_hash
+
+
+
+def point_key(config, games, policy, random_seed):
+    """
+    Returns the cache key of a point, a hash of everything that decides
+    its result.
+    """
+
+    description = {
+        'config': config,
+        'games': games,
+        'policy': policy,
+        'random_seed': random_seed,
+        'engine_version': py2187.ENGINE_VERSION,
+        'source': source_hash(),
+    }
+    text = json.dumps(description, sort_keys=True)
+    return hashlib.sha256(text.encode('ascii')).hexdigest()
+
+
+
+class ResultCache:
+    """
+    A directory of JSON results, one file per key.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE):
+        self.directory = directory
+
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+
+    def get(self, key):
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+
+    def put(self, key, result):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        stats.write_snapshot(result, self.path(key))
+
+
+
+def run_point(config, games, policy='random', workers=None, random_seed=0):
+    """
+    Plays the games of one point and returns a snapshot of their GameStats.
+    """
+
+    records = simulate.iter_records(game_kwargs(config), games, policy, workers, random_seed)
+    return stats.collect(records, stats.GameStats()).snapshot()
+
+
+
+def sweep(points, games, policy='random', workers=None, random_seed=0, cache=None, out=None):
+    """
+    Returns a list of (config, result, cached) for the points, playing
+    only the points that aren't in the cache. Progress is written to out.
+    """
+
+    results = []
+    for i in range(len(points)):
+        config = points[i]
+        key = point_key(config, games, policy, random_seed)
+
+        result = None
+        if cache != None:
+            result = cache.get(key)
+
+        cached = result != None
+        if not cached:
+            if out != None:
+                out.write("[%d/%d] %s\n" % (i + 1, len(points), describe(config)))
+                out.flush()
+
+            start = time.perf_counter()
+            result = {'config': config, 'stats': run_point(config, games, policy, workers,
+                                                           random_seed)}
+            result['seconds'] = time.perf_counter() - start
+
+            if cache != None:
+                cache.put(key, result)
+
+        results.append((config, result, cached))
+
+    return results
+
+
+
+def describe(config):
+    return "%dx%d seeds %s d=%g rule %s" % (config['rows'], config['cols'],
+                                            ','.join(str(seed) for seed in config['seeds']),
+                                            config['distribution'], config['rule'])
+
+
+
+def median_tile(max_tiles):
+    counts = sorted((int(tile), count) for tile, count in max_tiles.items())
+    total = sum(count for tile, count in counts)
+
+    seen = 0
+    for tile, count in counts:
+        seen += count
+        if 2 * seen >= total:
+            return tile
+
+
+
+def report(results, out=sys.stdout):
+    """
+    Writes a table of the survival length and max tile of each point.
+    """
+
+    out.write("%-34s %6s %8s %7s %7s %7s %8s %8s %6s\n"
+              % ('configuration', 'games', 'moves', 'p10', 'p50', 'p90',
+                 'tile p50', 'tile max', 'cached'))
+
+    for config, result, cached in results:
+        snapshot = result['stats']
+        moves = snapshot['moves']
+        max_tiles = snapshot['max_tile']
+
+        # A point with no games has nothing to show
+        if snapshot['games'] == 0:
+            out.write("%-34s %6d %8s %7s %7s %7s %8s %8s %6s\n"
+                      % (describe(config), 0, '-', '-', '-', '-', '-', '-',
+                         'yes' if cached else ''))
+            continue
+
+        out.write("%-34s %6d %8.1f %7.0f %7.0f %7.0f %8d %8d %6s\n"
+                  % (describe(config), snapshot['games'], moves['mean'], moves['p10'],
+                     moves['p50'], moves['p90'], median_tile(max_tiles),
+                     max(int(tile) for tile in max_tiles), 'yes' if cached else ''))
+
+
+
+def main(args):
+    points = sweep_points(args.rows, args.cols, args.seeds or [[3, 9]], args.distribution,
+                          args.rule)
+
+    cache = None
+    if not args.no_cache:
+        cache = ResultCache(args.cache)
+
+    results = sweep(points, args.games, args.policy, args.workers, args.random_seed, cache,
+                    sys.stderr)
+    report(results)
+
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description='Sweep py2187 game configurations.')
+    argparser.add_argument('-r', '--rows', type=int, nargs='+', default=[4])
+    argparser.add_argument('-c', '--cols', type=int, nargs='+')
+    argparser.add_argument('-s', '--seeds', type=int, nargs='+', action='append')
+    argparser.add_argument('-d', '--distribution', type=py2187.probability_arg, nargs='+',
+                           default=[0.9])
+    argparser.add_argument('--rule', type=parse_rule, nargs='+', default=[3])
+    argparser.add_argument('-g', '--games', type=py2187.positive_int, default=100)
+    argparser.add_argument('-p', '--policy', choices=sorted(simulate.POLICIES), default='random')
+    argparser.add_argument('-w', '--workers', type=int)
+    argparser.add_argument('--random-seed', type=int, default=0)
+    argparser.add_argument('--cache', default=DEFAULT_CACHE)
+    argparser.add_argument('--no-cache', action='store_true')
+
+    main(argparser.parse_args())
@@ -0,0 +1,205 @@
+"""
+
+Board symmetries for py2187
+
+A square board looks the same to the game after any of its 8 rotations and
+reflections, and a rectangular board after any of 4 (turning it over either
+way or a half turn). A move made on a turned board is the same as the
+turned move made on the board, so positions that are turned copies of each
+other have the same value, and a cache only needs to hold one of them.
+
+canonical() picks the turned copy of a packed board with the smallest
+packed number and returns the Symmetry that turned it. A move worked out
+for the canonical board is turned back with Symmetry.from_canonical.
+
+The turned copies are made from the board's bytes with a few slices and
+joins: the rows in reverse order, the columns, the columns in reverse
+order, and each of those and the board itself reversed. Read backwards,
+last cell first, the bytes of a turned copy compare in the same order as
+the packed numbers they stand for, and every copy read backwards is
+another of the copies. So the smallest bytes are the smallest packed
+board read backwards.
+
+    symmetries = get_symmetries(6, 6)
+    key, symmetry = symmetries.canonical(engine.pack(board))
+    vector = symmetry.from_canonical(cached_best_move[key])
+
+"""
+
+import struct
+import itertools
+
+import packed
+
+
+# The matrices of the symmetries, acting on [dx, dy]. The first four keep
+# the board's rows as rows and are the symmetries of a rectangle.
+MATRICES = (
+    ((1, 0), (0, 1)),       # as it is
+    ((-1, 0), (0, -1)),     # half turn
+    ((-1, 0), (0, 1)),      # left to right
+    ((1, 0), (0, -1)),      # top to bottom
+    ((0, -1), (1, 0)),      # quarter turn
+    ((0, 1), (-1, 0)),      # three quarter turn
+    ((0, 1), (1, 0)),       # transpose
+    ((0, -1), (-1, 0)),     # other diagonal
+)
+
+
+
+def _apply(matrix, vector):
+    return [matrix[0][0] * vector[0] + matrix[0][1] * vector[1],
+            matrix[1][0] * vector[0] + matrix[1][1] * vector[1]]
+
+
+
+class Symmetry:
+
+    def __init__(self, matrix, rows, cols):
+        self.matrix = matrix
+
+        # The inverse of a rotation or reflection is its transpose
+        self.inverse = ((matrix[0][0], matrix[1][0]), (matrix[0][1], matrix[1][1]))
+
+        # permutation[i] is the cell of the board that goes to cell i of
+        # the turned board. Positions are doubled so the centre is 0.
+        self.permutation = []
+        for y in range(rows):
+            for x in range(cols):
+                dx, dy = _apply(self.inverse, [2 * x - (cols - 1), 2 * y - (rows - 1)])
+                self.permutation.append(((dy + rows - 1) // 2) * cols + (dx + cols - 1) // 2)
+
+        self.rows = rows
+        self.cols = cols
+
+
+    def apply_board(self, board):
+        """
+        Returns the turned copy of a board of lists.
+        """
+
+        cells = [value for row in board for value in row]
+        return [[cells[self.permutation[y * self.cols + x]] for x in range(self.cols)]
+                for y in range(self.rows)]
+
+
+    def to_canonical(self, vector):
+        """
+        Returns the move on the turned board that matches vector on the board.
+        """
+
+        return _apply(self.matrix, vector)
+
+
+    def from_canonical(self, vector):
+        """
+        Returns the move on the board that matches vector on the turned board.
+        """
+
+        return _apply(self.inverse, vector)
+
+
+
+def _turns(cells, get_rows, get_cols, join):
+    # Returns the turned copies of the cells of a board, each read backwards
+    flipped = join(get_rows(cells)[::-1])
+    if get_cols == None:
+        return (cells, cells[::-1], flipped, flipped[::-1])
+
+    cols = get_cols(cells)
+    transposed = join(cols)
+    other = join(cols[::-1])
+    return (cells, cells[::-1], flipped, flipped[::-1],
+            transposed, transposed[::-1], other, other[::-1])
+
+
+
+class BoardSymmetries:
+    """
+    The symmetries of a rows x cols board: 8 if it is square, 4 if not.
+    """
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+
+        if rows == cols:
+            matrices = MATRICES
+        else:
+            matrices = MATRICES[:4]
+        self.symmetries = [Symmetry(matrix, rows, cols) for matrix in matrices]
+
+        row_slices = [slice(y * cols, (y + 1) * cols) for y in range(rows)]
+        col_slices = [slice(x, None, cols) for x in range(cols)]
+        self._get_rows = struct.Struct('%ds' % cols * rows).unpack
+        self._get_cols = None
+        if rows == cols:
+            self._get_cols = packed._tuple_getter(col_slices)
+
+        # Find the symmetry of each turned copy by turning the cell numbers
+        cell_numbers = tuple(range(self.size))
+        turns = _turns(cell_numbers,
+                       lambda cells: tuple(cells[s] for s in row_slices),
+                       None if rows != cols else lambda cells: tuple(cells[s] for s in col_slices),
+                       lambda parts: tuple(itertools.chain(*parts)))
+
+        permutations = [symmetry.permutation for symmetry in self.symmetries]
+        self._turn_symmetries = [self.symmetries[permutations.index(list(reversed(turn)))]
+                                 for turn in turns]
+
+
+    def canonical(self, packed_board):
+        """
+        Returns (canonical packed board, Symmetry) for a packed board,
+        where the canonical board is the turned copy with the smallest
+        packed number and the Symmetry turns the board into it.
+        """
+
+        turns = _turns(packed_board.to_bytes(self.size, 'little'),
+                       self._get_rows, self._get_cols, b''.join)
+        smallest = min(turns)
+
+        return (int.from_bytes(smallest, 'big'), self._turn_symmetries[turns.index(smallest)])
+
+
+    def canonical_key(self, packed_board):
+        """
+        Returns just the canonical packed board, for use as a cache key.
+        """
+
+        turns = _turns(packed_board.to_bytes(self.size, 'little'),
+                       self._get_rows, self._get_cols, b''.join)
+        return int.from_bytes(min(turns), 'big')
+
+
+
+_board_symmetries = {}
+
+
+def get_symmetries(rows, cols):
+    """
+    Returns the shared BoardSymmetries of a board size.
+    """
+
+    symmetries = _board_symmetries.get((rows, cols))
+    if symmetries == None:
+        symmetries = BoardSymmetries(rows, cols)
+        _board_symmetries[(rows, cols)] = symmetries
+
+    return symmetries
+
+
+
+def canonical(game):
+    """
+    Returns (canonical packed board, Symmetry) for a Game or PackedGame.
+    The board is packed with the shared engine of the game's merge rule.
+    """
+
+    if isinstance(game, packed.PackedGame):
+        return get_symmetries(game.rows, game.cols).canonical(game.board)
+
+    board = game.board
+    engine = packed.engine_for_game(game)
+    return get_symmetries(len(board), len(board[0])).canonical(engine.pack(board))
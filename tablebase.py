@@ -0,0 +1,422 @@
+"""
+
+An exhaustive tablebase for small py2187 boards
+
+solve() finds every position that can be reached in a game with a given
+configuration and works out the value of each by retrograde analysis. Every
+turn adds a seed tile and merges never change the total of the tiles, so the
+total goes up on every turn. The positions are therefore solved from the
+highest total down, and each position's successors are always solved first.
+The value of a position is the score still to come under the best play,
+where the score is the sum of the tiles made by merges as in Game.score.
+If a target tile is given, the chance of making it under the best play for
+that is worked out as well.
+
+Positions are handled a layer (one tile total) at a time in NumPy arrays,
+with the moves made by the batched engine.
+
+The table is saved in a directory of NumPy files that are memory mapped
+when they are opened. A board's key packs the engine code of each cell
+into a 64 bit number, and its index in the table is the rank of its key
+among the sorted keys, so the index is a perfect hash of the reachable
+boards. A lookup is a binary search that only touches a few pages of the
+key file.
+
+    python tablebase.py solve 3x3.tb --rows 3 --cols 3 --basic 3
+    python tablebase.py lookup 3x3.tb 3 . . . 9 . . . .
+
+"""
+
+import os
+import sys
+import json
+
+import numpy as np
+
+import py2187
+import packed
+import batched
+
+
+MOVES = (py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE)
+
+# The merge functions that can be named in a tablebase
+MERGE_FUNCTIONS = {
+    'power': py2187.power_merge_lengths,
+}
+
+NO_MOVE = -1
+
+# The batched engine's index for each of MOVES
+_BATCHED = (batched.UP, batched.DOWN, batched.LEFT, batched.RIGHT)
+
+
+
+def _decode(keys, size, bits):
+    # Turns an array of keys into an (N, size) array of cell codes
+    shifts = np.arange(size, dtype=np.uint64) * np.uint64(bits)
+    mask = np.uint64((1 << bits) - 1)
+    return ((keys[:, None] >> shifts) & mask).astype(np.uint8)
+
+
+
+def _encode(codes, bits):
+    shifts = np.arange(codes.shape[1], dtype=np.uint64) * np.uint64(bits)
+    return (codes.astype(np.uint64) << shifts).sum(axis=1, dtype=np.uint64)
+
+
+
+class _Layers:
+    # The positions found so far, grouped by tile total
+
+    def __init__(self):
+        self.pending = {}
+
+
+    def add(self, total, keys):
+        if len(keys) > 0:
+            self.pending.setdefault(total, []).append(np.unique(keys))
+
+
+    def pop(self):
+        total = min(self.pending)
+        return (total, np.unique(np.concatenate(self.pending.pop(total))))
+
+
+
+def solve(rows, cols, seeds, merge_length=3, merge_lengths_func=None, target=None,
+          engine=None):
+    """
+    Solves every reachable position. Returns (keys, scores, moves, wins)
+    as arrays sorted by key, where a key holds each cell's code in engine
+    in bits_per_cell(rows, cols) bits, the first cell lowest. scores is the
+    score still to come from each position under the best play, moves the
+    index into MOVES of the best move or NO_MOVE, and wins the chance of
+    making the target tile (None if there is no target).
+
+    engine is a packed.PackedEngine for the merge rule. By default a new
+    one is made rather than using the shared engine, whose codes other
+    games may have used up so that they don't fit in the key bits.
+    """
+
+    if engine == None:
+        engine = packed.PackedEngine(py2187.get_merge_rule(merge_lengths_func, merge_length))
+    size = rows * cols
+    bits = bits_per_cell(rows, cols)
+
+    seed_codes = []
+    for value, probability in py2187.seed_probabilities(seeds):
+        if value == None:
+            raise ValueError("The seed probabilities must add up to 1 for a tablebase.")
+        seed_codes.append((engine.code(value), value, probability))
+
+    def check_codes():
+        if len(engine.values) > (1 << bits):
+            raise ValueError("Too many tile values for %d bit cells." % bits)
+
+    def after_boards(codes):
+        # Returns a list of (after codes, moved, points) for each move
+        boards = codes.reshape(len(codes), rows, cols)
+        moves = []
+        for direction in range(len(MOVES)):
+            after, points = batched.move_codes(engine, boards, _BATCHED[direction], True)
+            after = after.reshape(len(codes), size)
+            moves.append((after, (after != codes).any(axis=1), points))
+        check_codes()
+        return moves
+
+    def spawns(after):
+        # Yields (cell, empty, code, value, probability) for every seed
+        # tile that can be added to each board
+        for cell in range(size):
+            empty = after[:, cell] == 0
+            for code, value, probability in seed_codes:
+                yield (cell, empty, np.uint64(code << (bits * cell)), value, probability)
+
+    # Forward, from the lowest tile total up, to find every position
+    layers = _Layers()
+    empty_board = np.zeros((1, size), dtype=np.uint8)
+    for cell, empty, code_bits, value, probability in spawns(empty_board):
+        first = _decode(np.array([code_bits], dtype=np.uint64), size, bits)
+        for cell2, empty2, code_bits2, value2, probability2 in spawns(first):
+            if empty2[0]:
+                layers.add(value + value2, np.array([code_bits + code_bits2], dtype=np.uint64))
+
+    solved_layers = []
+    while len(layers.pending) > 0:
+        total, keys = layers.pop()
+        solved_layers.append((total, keys))
+
+        afters = np.unique(np.concatenate([_encode(after[moved], bits)
+                                           for after, moved, points in after_boards(_decode(keys, size, bits))]))
+        after_codes = _decode(afters, size, bits)
+        for cell, empty, code_bits, value, probability in spawns(after_codes):
+            layers.add(total + value, afters[empty] + code_bits)
+
+    # Backward, from the highest tile total down, to solve them
+    if target != None:
+        target_code = engine.code(target)
+
+    layer_index = dict((total, i) for i, (total, keys) in enumerate(solved_layers))
+    scores = [None] * len(solved_layers)
+    moves = [None] * len(solved_layers)
+    wins = [None] * len(solved_layers)
+
+    for i in range(len(solved_layers) - 1, -1, -1):
+        total, keys = solved_layers[i]
+        codes = _decode(keys, size, bits)
+
+        best_scores = np.zeros(len(keys), dtype=np.float64)
+        best_moves = np.full(len(keys), NO_MOVE, dtype=np.int8)
+        best_wins = np.zeros(len(keys), dtype=np.float64)
+
+        for direction, (after, moved, points) in enumerate(after_boards(codes)):
+            after = after[moved]
+            after_keys = _encode(after, bits)
+            empty_count = (after == 0).sum(axis=1)
+
+            chance_scores = np.zeros(len(after), dtype=np.float64)
+            chance_wins = np.zeros(len(after), dtype=np.float64)
+            for cell, empty, code_bits, value, probability in spawns(after):
+                if not empty.any():
+                    continue
+
+                j = layer_index[total + value]
+                child_keys = solved_layers[j][1]
+                children = np.searchsorted(child_keys, after_keys[empty] + code_bits)
+                chance_scores[empty] += probability * scores[j][children]
+                if target != None:
+                    chance_wins[empty] += probability * wins[j][children]
+
+            move_scores = points[moved] + chance_scores / empty_count
+            move_wins = chance_wins / empty_count
+
+            rows_moved = np.nonzero(moved)[0]
+            better = (best_moves[rows_moved] == NO_MOVE) | (move_scores > best_scores[rows_moved])
+            best_scores[rows_moved[better]] = move_scores[better]
+            best_moves[rows_moved[better]] = direction
+            best_wins[rows_moved] = np.maximum(best_wins[rows_moved], move_wins)
+
+        if target != None:
+            best_wins[(codes == target_code).any(axis=1)] = 1.0
+
+        scores[i] = best_scores
+        moves[i] = best_moves
+        wins[i] = best_wins
+
+    keys = np.concatenate([keys for total, keys in solved_layers])
+    order = np.argsort(keys)
+    keys = keys[order]
+    scores = np.concatenate(scores)[order]
+    moves = np.concatenate(moves)[order]
+    if target != None:
+        wins = np.concatenate(wins)[order]
+    else:
+        wins = None
+
+    return (keys, scores, moves, wins)
+
+
+
+def bits_per_cell(rows, cols):
+    """
+    The bits each cell's code gets in a key, so the key fits in 64 bits.
+    """
+
+    bits = 64 // (rows * cols)
+    if bits == 0:
+        raise ValueError("The board is too big for 64 bit keys.")
+
+    return min(bits, packed.CELL_BITS)
+
+
+
+def _game_arguments(game_kwargs):
+    # (rows, cols, seeds, merge_length, merge_lengths_func) of a game,
+    # with the defaults of py2187.Game
+    return (game_kwargs.get('rows', 6), game_kwargs.get('cols', 6),
+            game_kwargs.get('seeds', ((3,0.9),(9,0.1))),
+            game_kwargs.get('merge_length', 3), game_kwargs.get('merge_lengths_func'))
+
+
+
+def _config(rows, cols, seeds, merge_length, merge_lengths_func, target):
+    if merge_lengths_func == None:
+        merge_function = None
+    else:
+        names = [name for name, function in MERGE_FUNCTIONS.items()
+                 if function is merge_lengths_func]
+        if len(names) == 0:
+            raise ValueError("The merge function can't be saved in a tablebase.")
+        merge_function = names[0]
+        merge_length = None
+
+    return {
+        'rows': rows,
+        'cols': cols,
+        'seeds': [list(seed) for seed in seeds],
+        'merge_length': merge_length,
+        'merge_function': merge_function,
+        'target': target,
+    }
+
+
+
+def build(path, rows, cols, seeds, merge_length=3, merge_lengths_func=None, target=None):
+    """
+    Solves a configuration and saves the tablebase in the directory path.
+    Returns the number of positions.
+    """
+
+    config = _config(rows, cols, seeds, merge_length, merge_lengths_func, target)
+    engine = packed.PackedEngine(py2187.get_merge_rule(merge_lengths_func, merge_length))
+    keys, scores, moves, wins = solve(rows, cols, seeds, merge_length, merge_lengths_func, target,
+                                      engine)
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    np.save(os.path.join(path, 'keys.npy'), keys)
+    np.save(os.path.join(path, 'scores.npy'), scores)
+    np.save(os.path.join(path, 'moves.npy'), moves)
+    if wins is not None:
+        np.save(os.path.join(path, 'wins.npy'), wins)
+
+    # The code of each tile value, which is its digit in the keys
+    config['values'] = engine.values
+    config['bits'] = bits_per_cell(rows, cols)
+    config['positions'] = len(keys)
+    with open(os.path.join(path, 'config.json'), 'w') as f:
+        json.dump(config, f, indent=2, sort_keys=True)
+
+    return len(keys)
+
+
+
+class Tablebase:
+    """
+    A saved tablebase. The arrays are memory mapped, so opening a
+    tablebase and looking up boards only reads the pages that are used.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'config.json')) as f:
+            self.config = json.load(f)
+
+        self.rows = self.config['rows']
+        self.cols = self.config['cols']
+        self.bits = self.config['bits']
+        self.codes = dict((value, code) for code, value in enumerate(self.config['values']))
+
+        self.keys = np.load(os.path.join(path, 'keys.npy'), mmap_mode='r')
+        self.scores = np.load(os.path.join(path, 'scores.npy'), mmap_mode='r')
+        self.moves = np.load(os.path.join(path, 'moves.npy'), mmap_mode='r')
+        self.wins = None
+        if self.config['target'] != None:
+            self.wins = np.load(os.path.join(path, 'wins.npy'), mmap_mode='r')
+
+
+    def __len__(self):
+        return len(self.keys)
+
+
+    def check_game(self, game_kwargs):
+        """
+        Raises ValueError if the tablebase wasn't solved for games made
+        with game_kwargs.
+        """
+
+        config = _config(*(_game_arguments(game_kwargs) + (None,)))
+        for name in ('rows', 'cols', 'seeds', 'merge_length', 'merge_function'):
+            if config[name] != self.config[name]:
+                raise ValueError("The tablebase was solved for %s %s, not %s."
+                                 % (name, self.config[name], config[name]))
+
+
+    def index(self, board):
+        """
+        Returns the index of a board in the table, or None if the board
+        can't be reached.
+        """
+
+        if len(board) != self.rows or len(board[0]) != self.cols:
+            return None
+
+        key = 0
+        shift = 0
+        for row in board:
+            for value in row:
+                code = self.codes.get(value)
+                if code == None:
+                    return None
+                key |= code << shift
+                shift += self.bits
+        index = int(np.searchsorted(self.keys, np.uint64(key)))
+        if index == len(self.keys) or int(self.keys[index]) != key:
+            return None
+
+        return index
+
+
+    def lookup(self, board):
+        """
+        Returns (expected score to come, best move vector or None, chance of
+        making the target or None) for a board, or None if the board can't
+        be reached.
+        """
+
+        index = self.index(board)
+        if index == None:
+            return None
+
+        move = int(self.moves[index])
+        vector = None
+        if move != NO_MOVE:
+            vector = MOVES[move]
+
+        win = None
+        if self.wins is not None:
+            win = float(self.wins[index])
+
+        return (float(self.scores[index]), vector, win)
+
+
+    def best_move(self, board):
+        result = self.lookup(board)
+        if result == None:
+            return None
+
+        return result[1]
+
+
+
+def main(args):
+    if args.command == 'solve':
+        game_kwargs = py2187.game_kwargs_from_args(args)
+        count = build(args.path, *(_game_arguments(game_kwargs) + (args.target,)))
+        sys.stdout.write("Solved %d positions\n" % count)
+
+    else:
+        tablebase = Tablebase(args.path)
+        cells = [None if cell == '.' else int(cell) for cell in args.cells]
+        board = [cells[y * tablebase.cols:(y + 1) * tablebase.cols] for y in range(tablebase.rows)]
+
+        result = tablebase.lookup(board)
+        if result == None:
+            sys.stdout.write("Not a reachable position\n")
+        else:
+            score, vector, win = result
+            sys.stdout.write("Expected score to come %.2f, best move %s\n" % (score, vector))
+            if win != None:
+                sys.stdout.write("Chance of making %d: %.4f\n" % (tablebase.config['target'], win))
+
+
+
+if __name__ == "__main__":
+    argparser = py2187.create_argparser('Build or query a py2187 tablebase.')
+    argparser.add_argument('command', choices=['solve', 'lookup'])
+    argparser.add_argument('path')
+    argparser.add_argument('cells', nargs='*')
+    argparser.add_argument('-t', '--target', type=int)
+
+    main(argparser.parse_args())
@@ -0,0 +1,157 @@
+'''
+unit test for batched.py
+'''
+
+import random
+import unittest
+
+import numpy as np
+
+import py2187
+import packed
+import batched
+
+
+N = None
+
+
+class Test(unittest.TestCase):
+
+    def check_same_as_make_move(self, merge_lengths_func, merge_length, values, rows, cols):
+        boards = [[[random.choice(values) for x in range(cols)] for y in range(rows)]
+                  for i in range(300)]
+        directions = np.array([random.randrange(4) for board in boards])
+
+        array = np.array([batched.board_to_array(board) for board in boards])
+        new_array, moved = batched.make_moves(array, directions, merge_lengths_func, merge_length)
+
+        if merge_lengths_func == None:
+            merge_lengths_func = lambda i: [merge_length]
+
+        for i in range(len(boards)):
+            expected_board, expected_moved = py2187.make_move(
+                boards[i], batched.DIRECTIONS[directions[i]], merge_lengths_func)
+
+            self.assertEqual(batched.array_to_board(new_array[i]), expected_board)
+            self.assertEqual(moved[i], expected_moved)
+
+
+    def test_merge_length_three(self):
+        random.seed(1)
+        self.check_same_as_make_move(None, 3, [N, N, 3, 3, 9, 27], 6, 6)
+
+
+    def test_merge_length_two(self):
+        random.seed(2)
+        self.check_same_as_make_move(None, 2, [N, 2, 2, 4, 8], 4, 5)
+
+
+    def test_power_merge_lengths(self):
+        random.seed(3)
+        self.check_same_as_make_move(py2187.power_merge_lengths, 2,
+                                     [N, N, 2, 3, 4, 4, 9, 16], 5, 7)
+
+
+    def test_long_lines(self):
+        random.seed(4)
+        self.check_same_as_make_move(None, 2, [N, N, 2, 2, 4, 8, 16], 3, 11)
+
+
+    def test_move_lines(self):
+        engine = packed.PackedEngine(py2187.get_merge_rule(None, 2))
+        table = engine.toward_start
+        lines = np.array([[engine.code(value) for value in line]
+                          for line in [[2, 2, 4], [N, 4, 4], [2, 2, 4], [N, N, N]]],
+                         dtype=np.uint8)
+
+        new_lines, points = batched.move_lines(lines, table, return_points=True)
+
+        self.assertEqual([[engine.values[code] for code in line] for line in new_lines.tolist()],
+                         [[4, 4, N], [8, N, N], [4, 4, N], [N, N, N]])
+        self.assertEqual(points.tolist(), [4, 8, 4, 0])
+
+        # Lines moved through the arrays are not added to the table itself
+        self.assertEqual(len(table), 0)
+
+        arrays = table.line_arrays[3]
+        arrays.max_lines = 3
+        batched.move_lines(lines[::-1] + 1, table)
+        self.assertTrue(len(arrays.keys) <= 3)
+        self.assertEqual(batched.move_lines(lines, table).tolist(), new_lines.tolist())
+
+
+    def test_shared_direction(self):
+        boards = np.array([
+                           [[2, 2], [0, 4]],
+                           [[0, 0], [0, 2]],
+                          ])
+
+        new_boards, moved = batched.make_moves(boards, batched.LEFT)
+
+        self.assertEqual(new_boards.tolist(), [[[4, 0], [4, 0]], [[0, 0], [2, 0]]])
+        self.assertEqual(moved.tolist(), [True, True])
+
+        new_boards, moved = batched.make_moves(new_boards, batched.LEFT)
+        self.assertEqual(moved.tolist(), [False, False])
+
+
+    def test_bad_directions(self):
+        boards = np.zeros((2, 3, 3), dtype=np.int64)
+
+        self.assertRaises(ValueError, batched.make_moves, boards, [0])
+        self.assertRaises(ValueError, batched.make_moves, boards, [0, 4])
+
+
+    def test_add_seed_tiles(self):
+        rng = np.random.default_rng(1)
+        boards = np.zeros((500, 3, 3), dtype=np.int64)
+        boards[0] = 2
+        boards[1, :, :] = 2
+        boards[1, 2, 2] = 0
+
+        batched.add_seed_tiles(boards, ((3, 0.9), (9, 0.1)), rng)
+
+        # a full board is left alone and a board with one gap has it filled
+        self.assertTrue((boards[0] == 2).all())
+        self.assertTrue(boards[1, 2, 2] in (3, 9))
+
+        tiles = boards[2:]
+        self.assertTrue(((tiles != 0).sum(axis=(1, 2)) == 1).all())
+
+        nines = (tiles == 9).sum()
+        self.assertTrue(20 < nines < 80)
+
+
+    def test_add_seed_tiles_single_seed(self):
+        boards = np.zeros((10, 4, 4), dtype=np.int64)
+
+        batched.add_seed_tiles(boards, ((7, 1),))
+        batched.add_seed_tiles(boards, ((7, 1),))
+
+        self.assertTrue(((boards == 7).sum(axis=(1, 2)) == 2).all())
+
+
+
+    def test_seed_indexes(self):
+        # Each number picks the seed whose range [low, high) it falls in
+        thresholds = np.cumsum([0.25, 0.25, 0.5])
+        uniforms = np.array([0.0, 0.2, 0.25, 0.49, 0.5, 0.75, 0.999])
+        self.assertEqual(batched.seed_indexes(thresholds, uniforms).tolist(),
+                         [0, 0, 1, 1, 2, 2, 2])
+
+        # A total that falls short of 1 by rounding still picks the last seed
+        self.assertEqual(batched.seed_indexes(np.array([0.3, 0.9999999]), np.array([0.99999999])),
+                         [1])
+
+        # add_seed_tiles picks the seed above a threshold it lands on
+        class FixedRandom:
+            def random(self, shape):
+                return np.full(shape, 0.5)
+
+        boards = np.zeros((1, 1, 1), dtype=np.int64)
+        batched.add_seed_tiles(boards, ((2, 0.5), (4, 0.5)), FixedRandom())
+        self.assertEqual(boards[0, 0, 0], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
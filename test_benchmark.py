@@ -0,0 +1,79 @@
+'''
+unit test for benchmark.py
+'''
+
+import io
+import unittest
+
+import benchmark
+
+
+class Test(unittest.TestCase):
+
+    def test_run(self):
+        results = benchmark.run(sizes=[4], rules=['merge2'], min_time=0.001, rounds=3)
+
+        names = sorted(results['timings'])
+        self.assertEqual(len(names), 9)
+        self.assertEqual(sorted(results['spreads']), names)
+        self.assertTrue(all(spread >= 0 for spread in results['spreads'].values()))
+        self.assertTrue('make_move_left/merge2/4x4' in names)
+        self.assertTrue('game_move/merge2/4x4' in names)
+        self.assertTrue('packed_move/merge2/4x4' in names)
+        self.assertTrue(all(seconds > 0 for seconds in results['timings'].values()))
+
+        out = io.StringIO()
+        benchmark.report(results, results, out)
+        self.assertEqual(len(out.getvalue().splitlines()), 9)
+
+
+    def test_half_full_game(self):
+        game = benchmark.half_full_game(16, 'merge3')
+        empty = len(game.get_empty_cells())
+        self.assertTrue(64 < empty < 192)
+
+
+    def test_compare(self):
+        baseline = {'timings': {'a': 1.0, 'b': 2.0, 'c': 1.0}}
+        results = {'timings': {'a': 1.2, 'b': 3.0, 'c': 0.5, 'd': 9.0}}
+
+        self.assertEqual(benchmark.compare(results, baseline, 0.25), [('b', 2.0, 3.0, 1.5)])
+        self.assertEqual(benchmark.compare(results, baseline, 0.1),
+                         [('a', 1.0, 1.2, 1.2), ('b', 2.0, 3.0, 1.5)])
+
+        # Noisy timings are allowed their spread
+        baseline['spreads'] = {'b': 0.1}
+        results['spreads'] = {'b': 0.05}
+        results['timings']['b'] = 2.7
+        self.assertEqual(benchmark.compare(results, baseline, 0.25), [])
+        results['timings']['b'] = 2.9
+        self.assertEqual(benchmark.compare(results, baseline, 0.25), [('b', 2.0, 2.9, 1.45)])
+
+        # but only up to a limit, however noisy they are
+        baseline['spreads'] = {'b': 3.0}
+        results['timings']['b'] = 2.8
+        self.assertEqual(benchmark.compare(results, baseline, 0.25), [])
+        results['timings']['b'] = 3.0
+        self.assertEqual(benchmark.compare(results, baseline, 0.25), [('b', 2.0, 3.0, 1.5)])
+
+        # Timings under a microsecond need to be 75% slower
+        baseline = {'timings': {'a': 2e-7}}
+        self.assertEqual(benchmark.compare({'timings': {'a': 3.4e-7}}, baseline), [])
+        self.assertEqual(len(benchmark.compare({'timings': {'a': 3.6e-7}}, baseline)), 1)
+
+
+    def test_spread(self):
+        # One wild round doesn't widen the spread much
+        self.assertEqual(benchmark.spread([1.0, 1.0, 1.0, 1.0, 10.0]), 0.0)
+        self.assertEqual(benchmark.spread([1.0, 2.0, 3.0, 4.0, 5.0]), 2.0 / 3.0)
+        self.assertEqual(benchmark.spread([1.0]), 0.0)
+
+
+    def test_median(self):
+        self.assertEqual(benchmark.median([3, 1, 2]), 2)
+        self.assertEqual(benchmark.median([4, 1, 2, 3]), 2.5)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
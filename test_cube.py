@@ -0,0 +1,117 @@
+'''
+unit test for cube.py
+'''
+
+import random
+import unittest
+
+import numpy as np
+
+import py2187
+import cube
+
+
+N = None
+
+
+def reference_move(board, vector, merge_rule):
+    # Moves each line of a nested list board with py2187.make_move
+    values = np.array(board, dtype=object)
+    axis, toward_end = cube.vector_axis(vector)
+    lines = np.moveaxis(values, axis, -1)
+    new_lines = np.empty_like(lines)
+
+    if toward_end:
+        line_vector = py2187.RIGHT_MOVE
+    else:
+        line_vector = py2187.LEFT_MOVE
+
+    merges = []
+    for index in np.ndindex(lines.shape[:-1]):
+        new_board, moved = py2187.make_move([list(lines[index])], line_vector, merge_rule,
+                                            merges=merges)
+        new_lines[index] = new_board[0]
+
+    return (np.moveaxis(new_lines, -1, axis).tolist(), sum(merges))
+
+
+
+class Test(unittest.TestCase):
+
+    def test_same_as_make_move(self):
+        rng = random.Random(1)
+        rules = [(None, 2), (None, 3), (py2187.power_merge_lengths, None)]
+
+        for i in range(100):
+            shape = tuple(rng.randint(1, 4) for k in range(rng.randint(1, 4)))
+            merge_lengths_func, merge_length = rng.choice(rules)
+            merge_rule = py2187.get_merge_rule(merge_lengths_func, merge_length)
+
+            game = cube.CubeGame(shape, merge_length=merge_length,
+                                 merge_lengths_func=merge_lengths_func)
+            values = [rng.choice([N, N, 2, 2, 3, 4, 9]) for k in range(game.codes.size)]
+            board = np.array(values, dtype=object).reshape(shape).tolist()
+
+            for vector in game.moves:
+                game.set_board(board)
+                game.score = 0
+                game.make_move(vector)
+
+                new_board, points = reference_move(board, vector, merge_rule)
+                self.assertEqual(game.get_board(), new_board)
+                self.assertEqual(game.moved, new_board != board)
+                self.assertEqual(game.score, points)
+
+
+    def test_square_moves(self):
+        board = [[2, 2, N], [N, 4, 4], [2, N, 2]]
+        game = cube.CubeGame((3, 3), merge_length=2)
+        merge_rule = py2187.get_merge_rule(None, 2)
+
+        for vector in (py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE):
+            game.set_board(board)
+            game.make_move(vector)
+            self.assertEqual(game.get_board(), py2187.make_move(board, vector, merge_rule)[0])
+
+
+    def test_cube_moves(self):
+        game = cube.CubeGame((2, 2, 2), merge_length=2)
+        game.set_cell((0, 1, 1), 2)
+        game.set_cell((1, 1, 1), 2)
+
+        game.make_move(cube.FRONT_MOVE)
+        self.assertTrue(game.moved)
+        self.assertEqual(game.score, 4)
+        self.assertEqual(game.get_board(), [[[N, N], [N, 4]], [[N, N], [N, N]]])
+
+        game.make_move(cube.UP_MOVE)
+        game.make_move(cube.LEFT_MOVE)
+        self.assertEqual(game.get_board(), [[[4, N], [N, N]], [[N, N], [N, N]]])
+
+        game.make_move(cube.FRONT_MOVE)
+        self.assertFalse(game.moved)
+
+        self.assertRaises(ValueError, game.make_move, [1, 1, 0])
+        self.assertRaises(ValueError, game.make_move, [1, 0])
+
+
+    def test_game(self):
+        game = cube.CubeGame((3, 3, 3), seeds=((2,0.9),(4,0.1)), merge_length=2, random_seed=3)
+        game.initialise()
+        self.assertEqual(len(game.get_empty_cells()), 25)
+
+        turns = 0
+        while game.valid_move_exists() and turns < 5000:
+            game.make_move(game.moves[game.rng.randrange(len(game.moves))])
+            if game.moved:
+                game.add_seed_tile()
+                turns += 1
+
+        self.assertFalse(game.valid_move_exists())
+        self.assertEqual(game.get_empty_cells(), [])
+        self.assertTrue(game.score > 0)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
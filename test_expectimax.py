@@ -0,0 +1,126 @@
+'''
+unit test for expectimax.py
+'''
+
+import time
+import unittest
+
+import py2187
+import packed
+import expectimax
+
+
+N = None
+
+
+class Test(unittest.TestCase):
+
+    def test_takes_the_only_move(self):
+        game = py2187.Game(rows=2, cols=2, seeds=((2, 0.9), (4, 0.1)), merge_length=2)
+        game.board = [
+                      [2, 4],
+                      [N, 8],
+                     ]
+
+        ai = expectimax.ExpectimaxAI(game, time_budget=0.01)
+        self.assertEqual(ai.best_move(game), py2187.DOWN_MOVE)
+
+
+    def test_no_move(self):
+        game = py2187.Game(rows=2, cols=2, merge_length=2)
+        game.board = [
+                      [2, 4],
+                      [4, 2],
+                     ]
+
+        ai = expectimax.ExpectimaxAI(game, time_budget=0.01)
+        self.assertEqual(ai.best_move(game), None)
+
+
+    def test_avoids_losing(self):
+        # Moving left or right leaves a full board with no merges whatever
+        # seed arrives; moving up or down merges the threes.
+        game = packed.PackedGame(rows=3, cols=3, seeds=((2, 1),), merge_length=3)
+        game.set_board([
+                        [3,  9,  27],
+                        [3,  81, 243],
+                        [3,  N,  729],
+                       ])
+
+        ai = expectimax.ExpectimaxAI(game, time_budget=0.05)
+        self.assertTrue(ai.best_move(game) in (py2187.UP_MOVE, py2187.DOWN_MOVE))
+
+
+    def test_seeds_are_honoured(self):
+        game = packed.PackedGame(seeds=py2187.create_seed_distribution([2, 3, 4], 0.5),
+                                 merge_lengths_func=py2187.power_merge_lengths)
+        ai = expectimax.ExpectimaxAI(game)
+
+        seeds = [(ai.engine.values[code], probability) for code, probability in ai.seeds]
+        self.assertEqual(seeds, [(3, 0.25), (4, 0.25), (2, 0.5)])
+
+
+    def test_table_is_bounded(self):
+        game = packed.PackedGame(rows=4, cols=4, seeds=((2, 0.9), (4, 0.1)), merge_length=2)
+        game.set_board([
+                        [2, N, N, N],
+                        [N, 4, N, N],
+                        [N, N, N, N],
+                        [N, N, 2, N],
+                       ])
+
+        ai = expectimax.ExpectimaxAI(game, time_budget=0.2, table_size=50)
+        ai.best_move(game)
+
+        self.assertTrue(len(ai.table) <= 50)
+
+
+    def test_time_budget(self):
+        game = packed.PackedGame(rows=6, cols=6, merge_length=3)
+        game.initialise()
+
+        ai = expectimax.ExpectimaxAI(game, time_budget=0.05)
+        start = time.perf_counter()
+        ai.best_move(game)
+        self.assertTrue(time.perf_counter() - start < 0.5)
+        self.assertTrue(ai.depth >= 1)
+
+
+    def test_time_budget_on_a_big_board(self):
+        # Not even the first depth finishes in the budget on a board this size
+        game = packed.PackedGame(rows=20, cols=20, merge_length=2, seeds=((2, 0.9), (4, 0.1)))
+        game.set_board([[[N, 2, 4][(x * 7 + y * 3) % 3] for x in range(20)]
+                         for y in range(20)])
+
+        ai = expectimax.ExpectimaxAI(game, time_budget=0.02)
+        for i in range(3):
+            start = time.perf_counter()
+            vector = ai.best_move(game)
+            self.assertTrue(time.perf_counter() - start < 0.05)
+            self.assertTrue(vector != None)
+
+
+    def test_table_keeps_cut_off_values_apart(self):
+        game = packed.PackedGame(rows=3, cols=3, seeds=((2, 0.9), (4, 0.1)), merge_length=2)
+        game.set_board([
+                        [2, N, N],
+                        [N, 4, N],
+                        [N, N, 2],
+                       ])
+
+        def value(ai, probability):
+            ai._deadline = time.perf_counter() + 60
+            return ai._max_value(game.board, 2, probability)
+
+        ai = expectimax.ExpectimaxAI(game, min_probability=0.01)
+        full_value = value(expectimax.ExpectimaxAI(game, min_probability=0.01), 1.0)
+
+        # On an unlikely path the search is cut off, and that value isn't
+        # used for a likely path
+        self.assertNotEqual(value(ai, 0.05), full_value)
+        self.assertEqual(value(ai, 1.0), full_value)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
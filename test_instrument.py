@@ -0,0 +1,102 @@
+'''
+unit test for instrument.py
+'''
+
+import io
+import unittest
+
+import py2187
+import topology
+import instrument
+
+
+class Test(unittest.TestCase):
+
+    def test_profiler(self):
+        make_move = py2187.Game.make_move
+        valid_move_exists = py2187.Game.valid_move_exists
+
+        profiler = instrument.Profiler()
+        profiler.enable()
+        try:
+            self.assertFalse(py2187.Game.make_move is make_move)
+
+            # A new merge rule, so its first lookups are misses
+            game = py2187.Game(rows=4, cols=4, merge_lengths_func=lambda value: [2],
+                               random_seed=1)
+            game.initialise()
+            moves = [py2187.UP_MOVE, py2187.LEFT_MOVE, py2187.DOWN_MOVE, py2187.RIGHT_MOVE]
+            for i in range(10):
+                if game.valid_move_exists():
+                    game.make_move(moves[i % 4])
+                    if game.moved:
+                        game.add_seed_tile()
+        finally:
+            profiler.disable()
+
+        self.assertTrue(py2187.Game.make_move is make_move)
+        self.assertTrue(py2187.Game.valid_move_exists is valid_move_exists)
+
+        self.assertEqual(profiler.timings['make_move'].count, 10)
+        self.assertEqual(profiler.timings['valid_move_exists'].count, 10)
+        self.assertTrue(profiler.timings['add_seed_tile'].count >= 2)
+        self.assertEqual(profiler.timings['draw'].count, 0)
+        self.assertFalse('merge_rule' in profiler.timings)
+
+        times = profiler.timings['make_move']
+        self.assertTrue(0 < times.max <= times.total)
+        self.assertEqual(times.quantiles.count, 10)
+        self.assertTrue(times.quantiles.quantile(0.5) <= times.max * 1.01)
+        self.assertTrue(profiler.merge_rule_misses > 0)
+
+        out = io.StringIO()
+        profiler.report(out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("Profiled"))
+        self.assertTrue("p99 us" in lines[2])
+        self.assertTrue(any(line.startswith("make_move ") for line in lines))
+        self.assertFalse(any(line.startswith("draw ") for line in lines))
+
+
+    def test_game_class(self):
+        make_move = topology.TopologyGame.make_move
+
+        profiler = instrument.Profiler(instrument.game_targets(topology.TopologyGame))
+        profiler.enable()
+        try:
+            game = topology.TopologyGame(topology.MazeTopology(4, 4, holes=[(0, 0)]),
+                                         random_seed=2)
+            game.initialise()
+            for vector in [py2187.UP_MOVE, py2187.LEFT_MOVE, py2187.DOWN_MOVE]:
+                if game.valid_move_exists():
+                    game.make_move(vector)
+        finally:
+            profiler.disable()
+
+        self.assertTrue(topology.TopologyGame.make_move is make_move)
+        self.assertEqual(profiler.timings['make_move'].count, 3)
+        self.assertEqual(profiler.timings['valid_move_exists'].count, 3)
+        self.assertEqual(profiler.timings['draw'].count, 0)
+
+
+    def test_inherited_method(self):
+        class SubGame(py2187.Game):
+            pass
+
+        profiler = instrument.Profiler(instrument.game_targets(SubGame))
+        profiler.enable()
+        try:
+            self.assertTrue('make_move' in SubGame.__dict__)
+            game = SubGame(rows=3, cols=3, random_seed=3)
+            game.initialise()
+            game.make_move(py2187.LEFT_MOVE)
+        finally:
+            profiler.disable()
+
+        self.assertFalse('make_move' in SubGame.__dict__)
+        self.assertEqual(profiler.timings['make_move'].count, 1)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
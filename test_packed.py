@@ -0,0 +1,166 @@
+'''
+unit test for packed.py
+'''
+
+import gc
+import random
+import weakref
+import unittest
+
+import py2187
+import packed
+
+
+N = None
+
+MOVES = [py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE]
+
+
+def random_board(rows, cols, values):
+    return [[random.choice(values) for x in range(cols)] for y in range(rows)]
+
+
+class Test(unittest.TestCase):
+
+    def check_same_as_make_move(self, engine, merge_lengths_func, values, rows, cols):
+        for i in range(200):
+            board = random_board(rows, cols, values)
+            for vector in MOVES:
+                expected_board, expected_moved = py2187.make_move(
+                    py2187.copy_board(board), vector, merge_lengths_func)
+
+                new_packed, moved = engine.make_move(engine.pack(board), rows, cols, vector)
+
+                self.assertEqual(engine.unpack(new_packed, rows, cols), expected_board)
+                self.assertEqual(moved, expected_moved)
+
+
+    def test_merge_length_three(self):
+        random.seed(1)
+        engine = packed.get_engine(merge_length=3)
+        self.check_same_as_make_move(engine, lambda i: [3], [N, N, 3, 3, 9, 27], 6, 6)
+
+
+    def test_merge_length_two(self):
+        random.seed(2)
+        engine = packed.get_engine(merge_length=2)
+        self.check_same_as_make_move(engine, lambda i: [2], [N, 2, 2, 4, 8], 4, 5)
+
+
+    def test_power_merge_lengths(self):
+        random.seed(3)
+        engine = packed.get_engine(py2187.power_merge_lengths)
+        self.check_same_as_make_move(engine, py2187.power_merge_lengths,
+                                     [N, N, 2, 3, 4, 4, 9, 16], 5, 7)
+
+
+    def test_tables_are_bounded(self):
+        random.seed(4)
+        engine = packed.PackedEngine(py2187.get_merge_rule(None, 3))
+        engine.toward_start.max_lines = 20
+        engine.toward_end.max_lines = 20
+        self.check_same_as_make_move(engine, lambda i: [3], [N, N, 3, 3, 9, 27], 6, 6)
+
+        for table in (engine.toward_start, engine.toward_end):
+            self.assertTrue(0 < len(table) <= 20)
+            self.assertTrue(len(table.points) <= 20)
+
+        board = [[3, 3, 3, 9, 9, 9]] * 6
+        for i in range(30):
+            self.assertEqual(engine.merges(engine.pack(board), 6, 6, py2187.LEFT_MOVE),
+                             (6 * 36, [3] * 12))
+            engine.make_move(engine.pack(random_board(6, 6, [N, 3, 9])), 6, 6, py2187.LEFT_MOVE)
+
+
+    def test_engines_are_shared(self):
+        self.assertTrue(packed.get_engine(merge_length=3) is packed.get_engine(merge_length=3))
+        self.assertTrue(packed.get_engine(py2187.power_merge_lengths) is
+                        packed.get_engine(py2187.power_merge_lengths))
+        self.assertFalse(packed.get_engine(merge_length=3) is packed.get_engine(merge_length=2))
+
+
+    def test_caches_are_bounded(self):
+        funcs = [lambda value: [2] for i in range(100)]
+        refs = [weakref.ref(func) for func in funcs]
+        for func in funcs:
+            engine = packed.get_engine(func)
+
+        self.assertTrue(len(packed._engines) <= packed.MAX_ENGINES)
+        self.assertTrue(len(py2187._merge_rules) <= py2187.MAX_MERGE_RULES)
+        self.assertTrue(packed.get_engine(funcs[-1]) is engine)
+
+        # The functions that were dropped from the caches can be freed
+        del funcs, func, engine
+        gc.collect()
+        self.assertTrue(sum(1 for ref in refs if ref() != None) <= py2187.MAX_MERGE_RULES)
+
+
+    def test_pack_unpack(self):
+        engine = packed.get_engine(merge_length=3)
+        board = [
+                 [3, N, N],
+                 [N, 9, N],
+                 [N, N, 27],
+                 [N, N, N],
+                ]
+
+        self.assertEqual(engine.unpack(engine.pack(board), 4, 3), board)
+        self.assertEqual(engine.pack([[N, N], [N, N]]), 0)
+
+
+    def test_game(self):
+        game = packed.PackedGame(rows=5, cols=5, seeds=((3,1),), merge_length=3)
+
+        board = [
+                 [3, N, N, N, N],
+                 [3, N, N, N, N],
+                 [3, N, N, N, N],
+                 [9, N, N, N, N],
+                 [9, N, N, N, N],
+                ]
+
+        expected_board = [
+                 [N, N, N, N, N],
+                 [N, N, N, N, N],
+                 [9, N, N, N, N],
+                 [9, N, N, N, N],
+                 [9, N, N, N, N],
+                ]
+
+        game.set_board(board)
+        game.make_move([0, 1])
+        self.assertTrue(game.moved)
+        self.assertEqual(game.get_board(), expected_board)
+
+        game.make_move([-1, 0])
+        self.assertFalse(game.moved)
+
+
+    def test_seeds(self):
+        game = packed.PackedGame(seeds=((7, 1),))
+        game.initialise()
+
+        tile_count = 0
+        for row in game.get_board():
+            tile_count += row.count(7)
+
+        self.assertEqual(tile_count, 2)
+
+
+    def test_valid_move_exists(self):
+        game = packed.PackedGame(rows=2, cols=2, merge_length=2)
+
+        game.set_board([[2, 4], [4, 2]])
+        self.assertFalse(game.valid_move_exists())
+
+        game.set_board([[2, 4], [2, 8]])
+        self.assertTrue(game.valid_move_exists())
+
+        game.set_board([[2, 4], [N, 8]])
+        self.assertTrue(game.valid_move_exists())
+
+
+
+if __name__ == "__main__":
+    unittest.main()
+
@@ -3,13 +3,48 @@ unit test for py2187.py
 @author: Alan M Jackson 
 '''
 
+import random
 import unittest
+import unittest.mock
+
+import numpy as np
 
 import py2187
 
 
 N = None
 
+
+class StubWindow:
+    # Stands in for a curses window and logs what is drawn on it
+
+    def __init__(self, log, position=None):
+        self.log = log
+        self.position = position
+
+    def derwin(self, rows, cols, y, x):
+        self.log.append(('derwin', (y, x)))
+        return StubWindow(self.log, (y, x))
+
+    def addstr(self, y, x, text):
+        self.log.append(('addstr', self.position, text.strip()))
+
+    def box(self):
+        self.log.append(('box', self.position))
+
+    def noutrefresh(self):
+        self.log.append(('noutrefresh', self.position))
+
+    def attrset(self, attr):
+        pass
+
+    def border(self, *sides):
+        pass
+
+    def erase(self):
+        pass
+
+
 class Test(unittest.TestCase):
     
     def test_multiple_combinations(self):
@@ -215,6 +250,95 @@ class Test(unittest.TestCase):
 
 
 
+    def test_power_merge_lengths_exact(self):
+        # math.log(243, 3) is 4.999999999999999
+        self.assertEqual(py2187.power_merge_lengths(3**5), [3])
+        self.assertEqual(py2187.power_merge_lengths(5**3), [5])
+        self.assertEqual(py2187.power_merge_lengths(2**30), [2, 4, 8])
+        self.assertEqual(py2187.power_merge_lengths(6**7), [6])
+        self.assertEqual(py2187.power_merge_lengths(1), [])
+
+
+    def test_merge_rule(self):
+        calls = []
+
+        def merge_lengths_func(cell_value):
+            calls.append(cell_value)
+            return [2, 4, 3]
+
+        merge_rule = py2187.MergeRule(merge_lengths_func)
+
+        self.assertEqual(merge_rule.longest_first(8), (4, 3, 2))
+        self.assertEqual(merge_rule.longest_first(8), (4, 3, 2))
+        self.assertEqual(merge_rule.shortest(8), 2)
+        self.assertEqual(merge_rule(8), [2, 3, 4])
+        self.assertEqual(calls, [8])
+
+        merge_rule = py2187.MergeRule(py2187.power_merge_lengths)
+        self.assertEqual(merge_rule.shortest(13), float('inf'))
+
+        self.assertTrue(py2187.get_merge_rule(py2187.power_merge_lengths) is
+                        py2187.get_merge_rule(py2187.power_merge_lengths))
+        self.assertTrue(py2187.get_merge_rule(merge_rule) is merge_rule)
+        self.assertEqual(py2187.get_merge_rule(merge_length=3)(9), [3])
+
+
+    def test_make_move_with_merge_rule(self):
+        board = [
+                 [N, 4, 4, 4, 4],
+                 [2, 2, N, 3, 3],
+                ]
+
+        expected_board = [
+                 [16, N, N, N, N],
+                 [4,  3, 3, N, N],
+                ]
+
+        merge_rule = py2187.MergeRule(py2187.power_merge_lengths)
+        shifted_board, shifted = py2187.make_move(board, py2187.LEFT_MOVE, merge_rule)
+        self.assertEqual(shifted_board, expected_board)
+
+
+    def test_same_as_reference_make_move(self):
+        random.seed(7)
+        rules = [
+                 (None,                       [2, 2, 4]),
+                 (lambda i: [3],              [3, 3, 9]),
+                 (lambda i: [2, 3],           [2, 2, 2, 4]),
+                 (py2187.power_merge_lengths, [2, 2, 3, 4, 4, 9, 16]),
+                ]
+        moves = [py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE]
+
+        sizes = [(random.randint(1, 10), random.randint(1, 10)) for i in range(500)]
+        sizes += [(40, 40), (100, 100)]
+
+        for rows, cols in sizes:
+            merge_lengths_func, values = random.choice(rules)
+            density = random.random()
+            board = [[random.choice(values) if random.random() < density else None
+                      for x in range(cols)] for y in range(rows)]
+            vector = random.choice(moves)
+
+            self.assertEqual(py2187.make_move(board, vector, merge_lengths_func),
+                             py2187.make_move_reference(board, vector, merge_lengths_func))
+
+
+    def test_move_tiles(self):
+        merge_rule = py2187.MergeRule(py2187.power_merge_lengths)
+
+        # The 4s in front merge in twos before the ones behind catch up
+        new_tiles, moved = py2187.move_tiles([(0, 4), (1, 4), (3, 4), (4, 4)], 5, merge_rule)
+        self.assertEqual(new_tiles, [(0, 8), (1, 8)])
+        self.assertTrue(moved)
+
+        new_tiles, moved = py2187.move_tiles([(0, 4), (1, 4), (2, 4), (3, 4)], 5, merge_rule)
+        self.assertEqual(new_tiles, [(0, 16)])
+
+        new_tiles, moved = py2187.move_tiles([(0, 2), (1, 3)], 2, merge_rule)
+        self.assertEqual(new_tiles, [(0, 2), (1, 3)])
+        self.assertFalse(moved)
+
+
     def test_powers_of_two_and_three_game_horiz(self):
 
         merge_lengths_func = py2187.power_merge_lengths
@@ -345,6 +469,310 @@ class Test(unittest.TestCase):
         self.assertTrue(game.board == expected_board)
 
 
+    def test_game_over_counts(self):
+        random.seed(4)
+        games = [
+                 py2187.Game(rows=4, cols=4, seeds=((2,0.9),(4,0.1)), merge_length=2, debug=True),
+                 py2187.Game(rows=3, cols=5, merge_length=3, debug=True),
+                 py2187.Game(rows=5, cols=5, seeds=((2,0.6),(3,0.3),(4,0.1)), 
+                             merge_lengths_func=py2187.power_merge_lengths, debug=True),
+                ]
+        moves = [py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE]
+
+        for game in games:
+            for i in range(5):
+                game.board = [[None for x in range(len(game.board[0]))] for y in range(len(game.board))]
+                game.initialise()
+
+                # valid_move_exists raises if the counts are wrong
+                while game.valid_move_exists():
+                    game.make_move(random.choice(moves))
+                    if game.moved:
+                        game.add_seed_tile()
+
+
+    def test_game_over(self):
+        game = py2187.Game(rows=2, cols=3, merge_length=3, debug=True)
+
+        game.board = [
+                      [3, 9, 3],
+                      [9, 3, 9],
+                     ]
+        self.assertFalse(game.valid_move_exists())
+
+        game.set_cell(1, 0, 3)
+        self.assertFalse(game.valid_move_exists())
+
+        game.set_cell(1, 2, 3)
+        self.assertTrue(game.valid_move_exists())
+
+        game.set_cell(0, 1, None)
+        self.assertTrue(game.valid_move_exists())
+
+        game.board = [[None, None, None], [None, None, None]]
+        self.assertFalse(game.valid_move_exists())
+
+
+    def test_seed_probabilities(self):
+        self.assertEqual(py2187.seed_probabilities(((3, 0.9), (9, 0.1))),
+                         [(9, 0.1), (3, 0.9)])
+
+        # add_seed_tile always picks the least likely seed if it covers
+        # the whole range
+        self.assertEqual(py2187.seed_probabilities(((2, 60), (3, 30), (4, 10))), [(4, 1.0)])
+
+        self.assertEqual(py2187.seed_probabilities(((5, 0.5),)), [(5, 0.5), (None, 0.5)])
+
+
+    def test_alias_table(self):
+        rng = random.Random(1)
+        for seeds in (((3, 0.9), (9, 0.1)), ((2, 0.6), (3, 0.3), (4, 0.1)), ((5, 0.5),)):
+            table = py2187.AliasTable(seeds)
+            counts = {}
+            for i in range(20000):
+                value = table.sample(rng)
+                counts[value] = counts.get(value, 0) + 1
+
+            for value, probability in py2187.seed_probabilities(seeds):
+                self.assertAlmostEqual(counts.get(value, 0) / 20000.0, probability, delta=0.02)
+
+
+    def test_free_cells(self):
+        random.seed(2)
+        game = py2187.Game(rows=6, cols=7, merge_length=2, debug=True)
+        for i in range(200):
+            y = random.randrange(6)
+            x = random.randrange(7)
+            game.set_cell(y, x, random.choice([None, 3, 3, 9]))
+
+            # valid_move_exists checks the free cells and merge counts
+            game.valid_move_exists()
+            self.assertEqual(sorted(game.get_empty_cells()), py2187.get_empty_cells(game.board))
+
+        game.board = [[None for x in range(7)] for y in range(6)]
+        for i in range(42):
+            game.add_seed_tile()
+        self.assertEqual(game.get_empty_cells(), [])
+
+
+    def test_undo_redo(self):
+        random.seed(3)
+        game = py2187.Game(rows=4, cols=4, seeds=((2,0.9),(4,0.1)), merge_length=2, debug=True)
+        game.initialise()
+        self.assertFalse(game.can_undo())
+
+        boards = [py2187.copy_board(game.board)]
+        moves = [py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE]
+        while len(boards) < 20 and game.valid_move_exists():
+            game.make_move(random.choice(moves))
+            if game.moved:
+                game.add_seed_tile()
+                boards.append(py2187.copy_board(game.board))
+
+        for board in reversed(boards[:-1]):
+            self.assertTrue(game.undo())
+            self.assertEqual(game.board, board)
+            game.valid_move_exists()
+        self.assertFalse(game.undo())
+
+        for board in boards[1:]:
+            self.assertTrue(game.redo())
+            self.assertEqual(game.board, board)
+        self.assertFalse(game.redo())
+
+        # A new move drops the moves that were undone
+        game.undo()
+        game.undo()
+        self.assertTrue(game.can_redo())
+        before = py2187.copy_board(game.board)
+        for vector in moves:
+            game.make_move(vector)
+            if game.moved:
+                break
+        self.assertTrue(game.moved)
+        self.assertFalse(game.can_redo())
+        self.assertFalse(game.redo())
+        self.assertTrue(game.undo())
+        self.assertEqual(game.board, before)
+
+        # Setting the board drops all of the history
+        game.board = py2187.copy_board(game.board)
+        self.assertFalse(game.can_undo())
+        self.assertFalse(game.can_redo())
+
+
+    def test_hash_key(self):
+        random.seed(4)
+        game = py2187.Game(rows=4, cols=5, seeds=((2,0.9),(4,0.1)), merge_length=2)
+        self.assertEqual(game.hash_key(), 0)
+        game.initialise()
+
+        keys = {}
+        moves = [py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE]
+        while game.valid_move_exists():
+            game.make_move(random.choice(moves))
+            if game.moved:
+                game.add_seed_tile()
+            self.assertEqual(game.hash_key(), py2187.zobrist_hash(game.board))
+            keys.setdefault(game.hash_key(), set()).add(str(game.board))
+
+        # No two different boards got the same key
+        self.assertTrue(all(len(boards) == 1 for boards in keys.values()))
+
+        game.undo()
+        self.assertEqual(game.hash_key(), py2187.zobrist_hash(game.board))
+
+        other = py2187.Game(rows=4, cols=5)
+        other.board = py2187.copy_board(game.board)
+        self.assertEqual(other.hash_key(), game.hash_key())
+
+        # The keys are the same in every process
+        self.assertEqual(py2187.zobrist_key(0, 0, 3), 13986421876627754843)
+
+        # numpy integers have the same keys as ints, whichever comes first
+        self.assertEqual(py2187.zobrist_key(7, 7, np.int64(81)), py2187.zobrist_key(7, 7, 81))
+        self.assertEqual(py2187.zobrist_key(0, 0, np.int64(3)), 13986421876627754843)
+
+        for value in range(py2187.MAX_ZOBRIST_KEYS + 10):
+            py2187.zobrist_key(9, 9, value)
+        self.assertEqual(len(py2187._zobrist_keys), py2187.MAX_ZOBRIST_KEYS)
+        self.assertEqual(py2187.zobrist_key(0, 0, 3), 13986421876627754843)
+
+
+    def test_history_limit(self):
+        game = py2187.Game(rows=1, cols=4, merge_length=2, history_cells=6)
+        game.board = [[2, None, None, None]]
+
+        for vector in (py2187.RIGHT_MOVE, py2187.LEFT_MOVE) * 3:
+            game.make_move(vector)
+        self.assertEqual(game.board, [[2, None, None, None]])
+
+        # Each move changes two cells, so only three are kept
+        for i in range(3):
+            self.assertTrue(game.undo())
+        self.assertEqual(game.board, [[None, None, None, 2]])
+        self.assertFalse(game.undo())
+
+        game.redo()
+        game.make_move(py2187.DOWN_MOVE)
+        self.assertFalse(game.moved)
+        self.assertTrue(game.can_redo())
+        game.make_move(py2187.RIGHT_MOVE)
+        self.assertFalse(game.can_redo())
+
+
+    def test_animation_plan(self):
+        scheduler = py2187.AnimationScheduler(budget=0.3, frame_delay=.03, min_frame_delay=.01)
+
+        # A short move animates at full speed
+        self.assertEqual(scheduler.plan(2, 1, 0), (3, .03))
+        self.assertEqual(scheduler.plan(1, 0, 1), (3, .03))
+
+        # A long one drops steps to fit in the budget
+        steps, delay = scheduler.plan(20, 1, 0)
+        self.assertEqual(steps, 1)
+        self.assertAlmostEqual(20 * steps * delay, 0.3)
+
+        steps, delay = scheduler.plan(200, 0, 1)
+        self.assertEqual(steps, 1)
+        self.assertLessEqual(200 * steps * delay, 0.3)
+
+
+
+    def test_renderer_only_draws_changes(self):
+        log = []
+        board_scr = StubWindow(log)
+        renderer = py2187.BoardRenderer(board_scr, 2, 3)
+        cells = dict((renderer.cell_scrs[y][x].position, (y, x))
+                     for y in range(2) for x in range(3))
+        del log[:]
+
+        def painted():
+            # The cells written to since the last call
+            written = sorted(cells[entry[1]] for entry in log if entry[0] == 'addstr')
+            del log[:]
+            return written
+
+        with unittest.mock.patch('curses.color_pair', lambda pair: pair), \
+             unittest.mock.patch('curses.doupdate') as doupdate:
+
+            board = [[2, N, 4], [N, N, 8]]
+            renderer.draw(board)
+            self.assertTrue(('box', None) in log)
+            self.assertEqual(len(painted()), 6)
+
+            renderer.draw(board)
+            self.assertEqual(log, [])
+
+            board[0][1] = 2
+            board[1][2] = N
+            renderer.draw(board)
+            self.assertEqual(painted(), [(0, 1), (1, 2)])
+
+            renderer.touch([(1, 0)])
+            renderer.draw(board)
+            self.assertEqual(painted(), [(1, 0)])
+
+            renderer.invalidate()
+            renderer.draw(board)
+            self.assertTrue(('box', None) in log)
+            self.assertEqual(len(painted()), 6)
+
+            # Every draw is sent to the terminal in one update
+            self.assertEqual(doupdate.call_count, 5)
+
+
+    def test_animation_reuses_windows(self):
+        log = []
+        board_scr = StubWindow(log)
+        renderer = py2187.BoardRenderer(board_scr, 2, 3)
+        del log[:]
+
+        def animate():
+            frames = [[[0, 0, 2, renderer.cell_scrs[0][0]], [1, 0, 4, renderer.cell_scrs[1][0]]]]
+            with unittest.mock.patch('curses.color_pair', lambda pair: pair), \
+                 unittest.mock.patch('curses.doupdate'):
+                self.assertTrue(py2187.animate_cells(frames, 0, 1, board_scr, 3, 0))
+
+            made = [entry[1] for entry in log if entry[0] == 'derwin']
+            del log[:]
+            return made
+
+        # The windows between cells are made once, and the cells the tiles
+        # end up in are the renderer's
+        made = animate()
+        self.assertEqual(len(made), 4)
+        self.assertEqual(len(set(made)), 4)
+        self.assertFalse(any(window.position in made
+                             for row in renderer.cell_scrs for window in row))
+        self.assertEqual(animate(), [])
+
+
+    def test_animation_run(self):
+        scheduler = py2187.AnimationScheduler(budget=0.3, frame_delay=.03, min_frame_delay=.01)
+        calls = []
+
+        def animate_cells(cells_to_animate, dy, dx, board_scr, steps, delay):
+            calls.append((len(cells_to_animate), steps, delay))
+            return len(calls) < 3
+
+        slide = [[0, 0, 2, None]]
+        with unittest.mock.patch('py2187.animate_cells', animate_cells):
+            # A short move plays every frame at full speed, and moves with
+            # nothing to animate are skipped
+            self.assertTrue(scheduler.run([[slide], [[]], [slide, slide]], 1, 0, None))
+            self.assertEqual(calls, [(1, 3, .03), (2, 3, .03)])
+
+            # A long one drops frames to stay in the budget, and stops when
+            # a key is pressed
+            del calls[:]
+            self.assertFalse(scheduler.run([[slide] * 10] * 5, 1, 0, None))
+            self.assertEqual(len(calls), 3)
+            count, steps, delay = calls[0]
+            self.assertTrue(steps < py2187.animation_steps(1, 0))
+            self.assertLessEqual(50 * steps * delay, 0.3 + 1e-9)
+
+
 
 def print_board(board, msg="board"):
     print(msg)
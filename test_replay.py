@@ -0,0 +1,175 @@
+'''
+unit test for replay.py
+'''
+
+import io
+import os
+import random
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+import py2187
+import replay
+
+
+MOVES = [py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE]
+
+# Runs py2187.py as a script with curses.wrapper swapped for a function
+# that records a game the way main() does
+RECORD_SCRIPT = '''
+import sys, curses, random, runpy
+
+def wrapper(main):
+    script = main.__globals__
+    game = script['Game'](**script['game_kwargs_from_args'](script['_args']))
+
+    import replay
+    recorder = replay.GameRecorder(game)
+    recorder.initialise()
+    rng = random.Random(1)
+    while game.valid_move_exists():
+        recorder.make_move(rng.choice([[0, -1], [0, 1], [-1, 0], [1, 0]]))
+        if game.moved:
+            recorder.add_seed_tile()
+
+    with open(sys.argv[-1] + '/game.log', 'wb') as out:
+        recorder.save(out)
+
+curses.wrapper = wrapper
+runpy.run_path('py2187.py', run_name='__main__')
+'''
+
+
+def play_recorded_game(game, rng, undo=False):
+    recorder = replay.GameRecorder(game)
+    recorder.initialise()
+
+    while game.valid_move_exists():
+        recorder.make_move(rng.choice(MOVES))
+        if game.moved:
+            recorder.add_seed_tile()
+
+        if undo and rng.random() < 0.1:
+            recorder.undo()
+            if rng.random() < 0.5:
+                recorder.redo()
+
+    return recorder
+
+
+
+class Test(unittest.TestCase):
+
+    def test_same_seed_same_game(self):
+        games = [py2187.Game(rows=4, cols=4, merge_length=2, random_seed=7) for i in range(2)]
+        for game in games:
+            play_recorded_game(game, random.Random(1))
+
+        self.assertEqual(games[0].board, games[1].board)
+        self.assertEqual(games[0].score, games[1].score)
+
+
+    def test_score(self):
+        game = py2187.Game(rows=1, cols=4, merge_length=2)
+        game.board = [[2, 2, 4, 4]]
+        game.make_move(py2187.LEFT_MOVE)
+        self.assertEqual(game.score, 12)
+
+        game.undo()
+        self.assertEqual(game.score, 0)
+        game.redo()
+        self.assertEqual(game.score, 12)
+
+
+    def test_moves_are_packed(self):
+        log = replay.GameLog({}, 0)
+        moves = [random.choice(MOVES) for i in range(11)]
+        for vector in moves:
+            log.add_move(vector)
+
+        self.assertEqual(len(log.moves), 3)
+        self.assertEqual(list(log.iter_moves()), moves)
+
+
+    def test_replay(self):
+        rng = random.Random(3)
+        games = [
+                 py2187.Game(rows=4, cols=4, seeds=((2,0.9),(4,0.1)), merge_length=2),
+                 py2187.Game(rows=3, cols=5, merge_length=3),
+                 py2187.Game(rows=5, cols=5, seeds=((2,0.6),(3,0.3),(4,0.1)),
+                             merge_lengths_func=py2187.power_merge_lengths),
+                ]
+
+        stream = io.BytesIO()
+        for game in games:
+            play_recorded_game(game, rng, undo=True).save(stream)
+
+        stream.seek(0)
+        logs = []
+        while True:
+            log = replay.read_log(stream)
+            if log == None:
+                break
+            logs.append(log)
+
+        self.assertEqual(len(logs), len(games))
+        for game, log in zip(games, logs):
+            self.assertTrue(replay.verify(log))
+            self.assertEqual(replay.replay(log).board, game.board)
+
+        logs[0].score += 1
+        self.assertFalse(replay.verify(logs[0]))
+
+
+    def test_bad_logs(self):
+        game = py2187.Game(rows=3, cols=3, merge_length=2)
+        data = play_recorded_game(game, random.Random(5)).finish().to_bytes()
+
+        self.assertRaises(replay.LogError, replay.read_log, io.BytesIO(data[:-3]))
+        self.assertRaises(replay.LogError, replay.read_log, io.BytesIO(b'2048' + data[4:]))
+
+        game = py2187.Game(rows=3, cols=3, merge_lengths_func=lambda value: [2])
+        self.assertRaises(ValueError, replay.GameRecorder, game)
+
+
+    def test_record_from_script(self):
+        # The script's merge function has to be the one replay knows
+        directory = tempfile.mkdtemp()
+        try:
+            subprocess.check_call([sys.executable, '-c', RECORD_SCRIPT, '-b', '3', '-m',
+                                   '--record', directory],
+                                  cwd=os.path.dirname(os.path.abspath(py2187.__file__)))
+
+            with open(os.path.join(directory, 'game.log'), 'rb') as f:
+                log = replay.read_log(f)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(log.config['merge_function'], 'power')
+        self.assertTrue(replay.verify(log))
+
+
+    def test_iter_logs(self):
+        directory = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(directory, 'more'))
+            rng = random.Random(6)
+            for i, path in enumerate(['a.log', 'b.log', os.path.join('more', 'c.log')]):
+                with open(os.path.join(directory, path), 'wb') as out:
+                    for j in range(i + 1):
+                        game = py2187.Game(rows=3, cols=3, merge_length=2)
+                        play_recorded_game(game, rng).save(out)
+
+            logs = list(replay.iter_logs(directory))
+            self.assertEqual(len(logs), 6)
+            self.assertTrue(all(replay.verify(log) for path, log in logs))
+        finally:
+            shutil.rmtree(directory)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+'''
+unit test for server.py
+'''
+
+import io
+import os
+import asyncio
+import argparse
+import tempfile
+import unittest
+
+import server
+
+
+def apply_reply(board, reply):
+    for y, x, value in server.parse_cells(reply.split()[4:]):
+        board[y][x] = value
+
+
+
+class Test(unittest.TestCase):
+
+    def test_moves_send_changed_cells(self):
+        game_server = server.GameServer({'rows': 4, 'cols': 4, 'merge_length': 2,
+                                         'seeds': ((2,0.9),(4,0.1))})
+
+        reply = game_server.handle_line(1, "NEW 5")
+        words = reply.split()
+        self.assertEqual(words[0], 'BOARD')
+        session_id = words[1]
+        game = game_server.sessions[int(session_id)].game
+
+        board = [[None for x in range(4)] for y in range(4)]
+        apply_reply(board, reply)
+        self.assertEqual(board, game.board)
+
+        moves = 0
+        for i in range(200):
+            reply = game_server.handle_line(1, "MOVE %s %s" % (session_id, "ULDR"[i % 4]))
+            words = reply.split()
+            if words[0] == 'MOVED':
+                moves += 1
+                self.assertEqual(int(words[2]), game.score)
+                apply_reply(board, reply)
+                self.assertEqual(board, game.board)
+            else:
+                self.assertEqual(reply, "SAME %s" % session_id)
+
+        self.assertEqual(game_server.moves, moves)
+
+
+    def test_same_seed_same_game(self):
+        game_server = server.GameServer({'rows': 4, 'cols': 4, 'merge_length': 2})
+        self.assertEqual(game_server.handle_line(1, "NEW 3").split()[2:],
+                         game_server.handle_line(1, "NEW 3").split()[2:])
+
+
+    def test_sessions_are_isolated(self):
+        game_server = server.GameServer({'rows': 3, 'cols': 3, 'merge_length': 2})
+        session_id = game_server.handle_line(1, "NEW").split()[1]
+
+        self.assertEqual(game_server.handle_line(2, "MOVE %s U" % session_id),
+                         "ERR no session %s" % session_id)
+        self.assertEqual(game_server.handle_line(2, "CLOSE %s" % session_id),
+                         "ERR no session %s" % session_id)
+
+        game_server.handle_line(2, "NEW")
+        game_server.close_connection(2)
+        self.assertEqual(list(game_server.sessions), [int(session_id)])
+
+        self.assertEqual(game_server.handle_line(1, "CLOSE %s" % session_id),
+                         "CLOSED %s" % session_id)
+        self.assertEqual(len(game_server.sessions), 0)
+
+
+    def test_errors(self):
+        game_server = server.GameServer({'rows': 3, 'cols': 3}, max_sessions=1)
+        session_id = game_server.handle_line(1, "NEW").split()[1]
+
+        self.assertEqual(game_server.handle_line(1, ""), "ERR empty request")
+        self.assertEqual(game_server.handle_line(1, "JUMP"), "ERR unknown command JUMP")
+        self.assertEqual(game_server.handle_line(1, "MOVE %s X" % session_id),
+                         "ERR bad direction X")
+        self.assertEqual(game_server.handle_line(1, "MOVE %s" % session_id),
+                         "ERR MOVE takes 2 arguments")
+        self.assertEqual(game_server.handle_line(1, "BOARD abc"), "ERR no session abc")
+        self.assertEqual(game_server.handle_line(1, "NEW"), "ERR server full")
+
+
+    def test_evict_idle(self):
+        game_server = server.GameServer({'rows': 3, 'cols': 3}, idle_timeout=10)
+        first = int(game_server.handle_line(1, "NEW").split()[1])
+        second = int(game_server.handle_line(1, "NEW").split()[1])
+        game_server.sessions[first].last_used -= 20
+
+        self.assertEqual(game_server.evict_idle(), 1)
+        self.assertEqual(list(game_server.sessions), [second])
+
+
+    def test_non_ascii_request(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'server.sock')
+        game_server = server.GameServer({'rows': 3, 'cols': 3})
+
+        async def run():
+            serving = asyncio.ensure_future(game_server.serve(path=path))
+            while not os.path.exists(path):
+                await asyncio.sleep(0.01)
+
+            reader, writer = await server.open_connection(path=path)
+            writer.write("J\u00c9\n".encode('utf-8') + b"NEW\n")
+            replies = [await reader.readline(), await reader.readline()]
+
+            writer.close()
+            serving.cancel()
+            return replies
+
+        try:
+            replies = asyncio.run(run())
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rmdir(directory)
+
+        self.assertEqual(replies[0], b"ERR unknown command J\\ufffd\\ufffd\n")
+
+        # The connection still works after the error
+        self.assertTrue(replies[1].startswith(b"BOARD "))
+
+
+    def test_load_test(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'server.sock')
+        game_server = server.GameServer({'rows': 3, 'cols': 3, 'merge_length': 2,
+                                         'seeds': ((2,0.9),(4,0.1))})
+        args = argparse.Namespace(host=None, port=None, path=path, sessions=20,
+                                  connections=3, seconds=0.3)
+
+        async def run():
+            serving = asyncio.ensure_future(game_server.serve(path=path))
+            while not os.path.exists(path):
+                await asyncio.sleep(0.01)
+
+            counts = await server.load_test(args, io.StringIO())
+
+            # Sessions close with their connections
+            await asyncio.sleep(0.05)
+            serving.cancel()
+            return counts
+
+        try:
+            counts = asyncio.run(run())
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rmdir(directory)
+
+        self.assertTrue(counts['moves'] > 0)
+        self.assertTrue(counts['games'] > 0)
+        self.assertEqual(game_server.moves, counts['moves'])
+        self.assertEqual(len(game_server.sessions), 0)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
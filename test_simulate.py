@@ -0,0 +1,108 @@
+'''
+unit test for simulate.py
+'''
+
+import random
+import unittest
+
+import py2187
+import packed
+import simulate
+
+
+N = None
+
+
+class Test(unittest.TestCase):
+
+    def test_policies_choose_moves_that_move(self):
+        game = packed.PackedGame(rows=3, cols=3, merge_length=2)
+        game.set_board([
+                        [2, N, N],
+                        [4, N, N],
+                        [2, N, N],
+                       ])
+
+        for name, policy in simulate.POLICIES.items():
+            self.assertTrue(policy(game) in (py2187.UP_MOVE, py2187.RIGHT_MOVE))
+
+
+    def test_greedy_takes_the_merge(self):
+        game = packed.PackedGame(rows=3, cols=3, merge_length=2)
+        game.set_board([
+                        [2, N, N],
+                        [2, N, N],
+                        [4, 8, N],
+                       ])
+
+        self.assertTrue(simulate.greedy_policy(game) in (py2187.UP_MOVE, py2187.DOWN_MOVE))
+
+
+    def test_corner_prefers_down(self):
+        game = packed.PackedGame(rows=3, cols=3, merge_length=2)
+        game.set_board([
+                        [N, 2, N],
+                        [N, N, N],
+                        [N, N, N],
+                       ])
+
+        self.assertEqual(simulate.corner_policy(game), py2187.DOWN_MOVE)
+
+
+    def test_records_are_repeatable(self):
+        game_kwargs = {'rows': 3, 'cols': 3, 'merge_length': 2, 'seeds': ((2, 0.9), (4, 0.1))}
+
+        def play(workers):
+            return [record[:-1] for record in
+                    simulate.iter_records(game_kwargs, 6, 'random', workers=workers, seed=5)]
+
+        results = play(1)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(results, play(2))
+
+
+    def test_play_game_leaves_global_random_alone(self):
+        game_kwargs = {'rows': 3, 'cols': 3, 'merge_length': 2, 'seeds': ((2, 0.9), (4, 0.1))}
+
+        random.seed(1)
+        state = random.getstate()
+        record = simulate.play_game(game_kwargs, simulate.random_policy, 8)
+        self.assertEqual(random.getstate(), state)
+
+        # Everything but the time is the same when the game is played again
+        again = simulate.play_game(game_kwargs, simulate.random_policy, 8)
+        self.assertEqual(again[:-1], record[:-1])
+
+
+    def test_records(self):
+        # With only 2 seeds the tiles add up to twice the seeds played
+        game_kwargs = {'rows': 3, 'cols': 3, 'merge_length': 2, 'seeds': ((2, 1),)}
+        records = list(simulate.iter_records(game_kwargs, 5, 'greedy', workers=1, seed=2))
+        self.assertEqual(len(records), 5)
+
+        for record in records:
+            self.assertEqual(list(record.merges), [2])
+            self.assertEqual(record.moves + 2 - record.merges[2], 9)
+            self.assertTrue(record.score >= record.max_tile)
+            self.assertTrue(record.seconds > 0)
+
+
+    def test_game_kwargs_from_args(self):
+        argparser = py2187.create_argparser()
+
+        args = argparser.parse_args(['--basic', '3', '--multiple'])
+        game_kwargs = py2187.game_kwargs_from_args(args)
+        self.assertEqual(game_kwargs['rows'], 6)
+        self.assertEqual(game_kwargs['merge_lengths_func'], py2187.power_merge_lengths)
+        self.assertEqual([seed[0] for seed in game_kwargs['seeds']], [2, 3])
+
+        args = argparser.parse_args(['--basic', '4', '--cols', '3'])
+        game_kwargs = py2187.game_kwargs_from_args(args)
+        self.assertEqual(game_kwargs['merge_length'], 4)
+        self.assertEqual(game_kwargs['cols'], 3)
+        self.assertEqual(game_kwargs['seeds'], ((4, 0.9), (16, 0.1)))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+'''
+unit test for sparse.py
+'''
+
+import random
+import unittest
+
+import py2187
+import packed
+import sparse
+
+
+N = None
+
+MOVES = [py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE]
+
+
+class Test(unittest.TestCase):
+
+    def test_same_as_make_move(self):
+        rng = random.Random(1)
+        rules = [(None, 2), (None, 3), (py2187.power_merge_lengths, None)]
+
+        for i in range(500):
+            rows = rng.randint(1, 6)
+            cols = rng.randint(1, 6)
+            board = [[rng.choice([N, N, 2, 2, 3, 4, 9]) for x in range(cols)] for y in range(rows)]
+            sparse_board = sparse.SparseBoard.from_lists(board)
+
+            merge_lengths_func, merge_length = rng.choice(rules)
+            merge_rule = py2187.get_merge_rule(merge_lengths_func, merge_length)
+
+            for vector in MOVES:
+                merges = []
+                new_board, moved = py2187.make_move(board, vector, merge_rule, merges=merges)
+                sparse_merges = []
+                new_sparse, sparse_moved = py2187.make_move(sparse_board, vector, merge_rule,
+                                                            merges=sparse_merges)
+
+                self.assertEqual(new_sparse.to_lists(), new_board)
+                self.assertEqual(new_sparse, sparse.SparseBoard.from_lists(new_board))
+                self.assertEqual(sparse_moved, moved)
+                self.assertEqual(sorted(sparse_merges), sorted(merges))
+
+
+    def test_set(self):
+        board = sparse.SparseBoard(3, 4)
+        board.set(1, 2, 3)
+        board.set(1, 2, 9)
+        board.set(0, 2, 3)
+        self.assertEqual(board.count, 2)
+        self.assertEqual(board.get(1, 2), 9)
+        self.assertEqual(board.col_tiles, {2: {0: 3, 1: 9}})
+
+        board.set(1, 2, N)
+        board.set(2, 2, N)
+        self.assertEqual(board.count, 1)
+        self.assertEqual(board.row_tiles, {0: {2: 3}})
+        self.assertEqual(board.to_lists(), [[N, N, 3, N], [N, N, N, N], [N, N, N, N]])
+
+
+    def test_large_board(self):
+        game = py2187.create_game('sparse', rows=1000, cols=1000, merge_length=2,
+                                  seeds=((2,0.9),(4,0.1)), random_seed=3)
+        game.initialise()
+        for i in range(200):
+            game.make_move(MOVES[i % 4])
+            game.add_seed_tile()
+
+        self.assertTrue(game.valid_move_exists())
+        self.assertTrue(0 < game.board.count <= 202)
+
+
+    def test_game_over(self):
+        game = sparse.SparseGame(rows=2, cols=2, merge_length=2)
+        self.assertFalse(game.valid_move_exists())
+
+        game.set_board([[2, 4], [4, 2]])
+        self.assertFalse(game.valid_move_exists())
+
+        game.set_cell(0, 1, 2)
+        self.assertTrue(game.valid_move_exists())
+
+        game.set_board([[2, N], [4, 2]])
+        self.assertTrue(game.valid_move_exists())
+
+        # The last empty cell is filled
+        game.add_seed_tile()
+        self.assertEqual(game.get_empty_cells(), [])
+
+
+    def test_create_game(self):
+        self.assertTrue(isinstance(py2187.create_game(), py2187.Game))
+        self.assertTrue(isinstance(py2187.create_game('packed'), packed.PackedGame))
+        self.assertTrue(isinstance(py2187.create_game('sparse', rows=3), sparse.SparseGame))
+        self.assertRaises(ValueError, py2187.create_game, 'dense')
+
+
+    def test_create_game_random_seed(self):
+        for backend in ('list', 'packed', 'sparse', 'topology'):
+            with self.subTest(backend=backend):
+                state = random.getstate()
+
+                boards = []
+                for i in range(2):
+                    game = py2187.create_game(backend, rows=4, cols=4, merge_length=2,
+                                              seeds=((2,0.9),(4,0.1)), random_seed=11)
+                    self.assertEqual(game.random_seed, 11)
+
+                    game.initialise()
+                    for vector in MOVES * 5:
+                        game.make_move(vector)
+                        if game.moved:
+                            game.add_seed_tile()
+                    boards.append(game.get_board())
+
+                # The same seed plays the same game, without touching the
+                # global random numbers
+                self.assertEqual(boards[0], boards[1])
+                self.assertEqual(random.getstate(), state)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+'''
+unit test for stats.py
+'''
+
+import io
+import os
+import json
+import random
+import tempfile
+import unittest
+
+import stats
+import simulate
+
+
+class Test(unittest.TestCase):
+
+    def test_running_mean(self):
+        values = [3.0, 1.0, 4.0, 1.0, 5.0, 9.0, 2.0, 6.0]
+        mean = stats.RunningMean()
+        for value in values:
+            mean.add(value)
+
+        average = sum(values) / len(values)
+        variance = sum((value - average) ** 2 for value in values) / (len(values) - 1)
+        self.assertAlmostEqual(mean.mean, average)
+        self.assertAlmostEqual(mean.std(), variance ** 0.5)
+        self.assertEqual((mean.min, mean.max, mean.count), (1.0, 9.0, 8))
+
+
+    def test_quantile_sketch(self):
+        rng = random.Random(1)
+        values = [rng.lognormvariate(0, 2) for i in range(20000)] + [0.0] * 100
+        sketch = stats.QuantileSketch(relative_accuracy=0.01)
+        for value in values:
+            sketch.add(value)
+
+        values.sort()
+        for fraction in (0.1, 0.5, 0.9, 0.99):
+            exact = values[int(fraction * (len(values) - 1))]
+            self.assertTrue(abs(sketch.quantile(fraction) - exact) <= 0.011 * exact)
+
+        self.assertEqual(sketch.quantile(0.0), 0.0)
+
+        # The buckets only cover the range of the values
+        self.assertTrue(len(sketch.buckets) < 2000)
+
+
+    def test_histogram(self):
+        histogram = stats.Histogram()
+        for value in (27, 81, 27):
+            histogram.add(value)
+        self.assertEqual(histogram.snapshot(), {'27': 2, '81': 1})
+
+
+    def test_collect_writes_snapshots(self):
+        game_kwargs = {'rows': 3, 'cols': 3, 'merge_length': 2, 'seeds': ((2, 0.9), (4, 0.1))}
+        records = simulate.iter_records(game_kwargs, 20, 'random', workers=1, seed=3)
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'stats.json')
+        snapshots = []
+
+        def watch(records):
+            # Passes the records on, looking at the snapshot file as it goes
+            for record in records:
+                if os.path.exists(path):
+                    with open(path) as f:
+                        snapshots.append(json.load(f)['games'])
+                yield record
+
+        # A clock that moves one second a call, so there is a snapshot
+        # after every other game
+        ticks = iter(range(1000))
+        try:
+            game_stats = stats.collect(watch(records), stats.GameStats(), path, every=3,
+                                       clock=lambda: next(ticks))
+            with open(path) as f:
+                snapshot = json.load(f)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rmdir(directory)
+
+        self.assertEqual(snapshot['games'], 20)
+        self.assertEqual(snapshot, json.loads(json.dumps(game_stats.snapshot())))
+        self.assertTrue(len(set(snapshots)) > 5)
+        self.assertEqual(sum(int(count) for count in snapshot['max_tile'].values()), 20)
+        self.assertEqual(list(snapshot['merges_per_game']), ['2'])
+
+
+    def test_report(self):
+        game_stats = stats.GameStats()
+        for moves, max_tile in ((10, 27), (20, 81), (30, 81)):
+            game_stats.add(simulate.GameRecord(0, moves, max_tile, 100, {3: 4}, 0.001))
+
+        out = io.StringIO()
+        stats.report(game_stats, 2.0, out)
+
+        text = out.getvalue()
+        self.assertTrue("1.5 games/sec, 30.0 moves/sec" in text)
+        self.assertTrue("81        2" in text)
+        self.assertTrue("3 tiles      4.0" in text)
+
+        out = io.StringIO()
+        stats.report(stats.GameStats(), 0.0, out)
+        self.assertEqual(out.getvalue().splitlines()[-1], "No games, so no statistics")
+
+
+
+if __name__ == "__main__":
+    unittest.main()
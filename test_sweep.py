@@ -0,0 +1,104 @@
+'''
+unit test for sweep.py
+'''
+
+import io
+import shutil
+import argparse
+import tempfile
+import unittest
+
+import py2187
+import sweep
+
+
+class Test(unittest.TestCase):
+
+    def test_sweep_points(self):
+        points = sweep.sweep_points([3, 4], None, [[3, 9], [2, 3]], [0.9], [3, 'power'])
+        self.assertEqual(len(points), 8)
+        self.assertEqual(points[0], {'rows': 3, 'cols': 3, 'seeds': [3, 9],
+                                     'distribution': 0.9, 'rule': 3})
+        self.assertEqual(len(sweep.sweep_points([3, 4], [5, 6, 7], [[3]], [0.9], [3])), 6)
+
+        kwargs = sweep.game_kwargs(points[-1])
+        self.assertEqual(kwargs['merge_lengths_func'], py2187.power_merge_lengths)
+        self.assertEqual(kwargs['seeds'], py2187.create_seed_distribution([2, 3], 0.9))
+
+
+    def test_point_key(self):
+        config = sweep.sweep_points([4], None, [[3, 9]], [0.9], [3])[0]
+        key = sweep.point_key(config, 10, 'random', 0)
+        self.assertEqual(key, sweep.point_key(dict(config), 10, 'random', 0))
+        self.assertNotEqual(key, sweep.point_key(dict(config, rows=5), 10, 'random', 0))
+        self.assertNotEqual(key, sweep.point_key(config, 11, 'random', 0))
+
+        version = py2187.ENGINE_VERSION
+        try:
+            py2187.ENGINE_VERSION = version + 1
+            self.assertNotEqual(key, sweep.point_key(config, 10, 'random', 0))
+        finally:
+            py2187.ENGINE_VERSION = version
+
+        source = sweep.source_hash()
+        self.assertEqual(len(source), 64)
+        try:
+            sweep._source_hash = 'changed'
+            self.assertNotEqual(key, sweep.point_key(config, 10, 'random', 0))
+        finally:
+            sweep._source_hash = source
+        self.assertEqual(key, sweep.point_key(config, 10, 'random', 0))
+
+
+    def test_only_new_points_are_played(self):
+        directory = tempfile.mkdtemp()
+        cache = sweep.ResultCache(directory)
+
+        try:
+            points = sweep.sweep_points([3], None, [[2, 4]], [0.9], [2])
+            out = io.StringIO()
+            first = sweep.sweep(points, 5, workers=1, cache=cache, out=out)
+            self.assertEqual(out.getvalue().count('\n'), 1)
+            self.assertFalse(first[0][2])
+
+            points = sweep.sweep_points([3, 4], None, [[2, 4]], [0.9], [2])
+            out = io.StringIO()
+            second = sweep.sweep(points, 5, workers=1, cache=cache, out=out)
+            self.assertEqual(out.getvalue(), "[2/2] 4x4 seeds 2,4 d=0.9 rule 2\n")
+            self.assertEqual([cached for config, result, cached in second], [True, False])
+            self.assertEqual(second[0][1], first[0][1])
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(second[1][1]['stats']['games'], 5)
+
+        out = io.StringIO()
+        sweep.report(second, out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith("3x3 seeds 2,4 d=0.9 rule 2"))
+        self.assertTrue(lines[1].endswith("yes"))
+
+
+    def test_no_games(self):
+        points = sweep.sweep_points([3], None, [[2, 4]], [0.9], [2])
+        results = sweep.sweep(points, 0, workers=1)
+        self.assertEqual(results[0][1]['stats']['games'], 0)
+
+        out = io.StringIO()
+        sweep.report(results, out)
+        self.assertEqual(out.getvalue().splitlines()[1].split()[-7:],
+                         ['0', '-', '-', '-', '-', '-', '-'])
+
+        self.assertRaises(argparse.ArgumentTypeError, py2187.positive_int, '0')
+        self.assertEqual(py2187.positive_int('5'), 5)
+
+
+    def test_median_tile(self):
+        self.assertEqual(sweep.median_tile({'27': 3, '81': 2, '9': 1}), 27)
+        self.assertEqual(sweep.median_tile({'27': 1, '81': 1}), 27)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
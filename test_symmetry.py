@@ -0,0 +1,79 @@
+'''
+unit test for symmetry.py
+'''
+
+import random
+import unittest
+
+import py2187
+import packed
+import symmetry
+
+
+N = None
+
+MOVES = [py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE]
+
+
+class Test(unittest.TestCase):
+
+    def test_canonical_is_smallest_turn(self):
+        rng = random.Random(1)
+        engine = packed.get_engine(None, 3)
+
+        for rows, cols in ((6, 6), (4, 4), (3, 5), (5, 2), (1, 4), (1, 1)):
+            symmetries = symmetry.get_symmetries(rows, cols)
+            self.assertEqual(len(symmetries.symmetries), 8 if rows == cols else 4)
+
+            for i in range(50):
+                board = [[rng.choice([N, N, 3, 9, 27]) for x in range(cols)] for y in range(rows)]
+                packed_board = engine.pack(board)
+                turned = [engine.pack(s.apply_board(board)) for s in symmetries.symmetries]
+
+                key, board_symmetry = symmetries.canonical(packed_board)
+                self.assertEqual(key, min(turned))
+                self.assertEqual(engine.pack(board_symmetry.apply_board(board)), key)
+                self.assertEqual(symmetries.canonical_key(packed_board), key)
+
+                # Every turned copy has the same canonical form
+                for turned_board in turned:
+                    self.assertEqual(symmetries.canonical_key(turned_board), key)
+
+
+    def test_moves_map_through_symmetries(self):
+        rng = random.Random(2)
+        merge_rule = py2187.get_merge_rule(None, 2)
+
+        for rows, cols in ((4, 4), (3, 5)):
+            for s in symmetry.get_symmetries(rows, cols).symmetries:
+                board = [[rng.choice([N, 2, 2, 4, 8]) for x in range(cols)] for y in range(rows)]
+                turned = s.apply_board(board)
+
+                for vector in MOVES:
+                    self.assertTrue(s.to_canonical(vector) in MOVES)
+                    self.assertEqual(s.from_canonical(s.to_canonical(vector)), vector)
+
+                    new_board, moved = py2187.make_move(board, vector, merge_rule)
+                    new_turned, turned_moved = py2187.make_move(turned, s.to_canonical(vector),
+                                                                merge_rule)
+                    self.assertEqual(s.apply_board(new_board), new_turned)
+
+
+    def test_canonical_game(self):
+        game = py2187.Game(rows=3, cols=3, merge_length=3)
+        game.board = [[N, N, N], [N, N, N], [N, N, 3]]
+
+        key, board_symmetry = symmetry.canonical(game)
+        engine = packed.engine_for_game(game)
+        self.assertEqual(engine.unpack(key, 3, 3), [[3, N, N], [N, N, N], [N, N, N]])
+
+        # Pushing the canonical tile into its corner is pushing the real
+        # one into its corner
+        self.assertEqual(sorted(board_symmetry.from_canonical(vector)
+                                for vector in (py2187.LEFT_MOVE, py2187.UP_MOVE)),
+                         sorted([py2187.RIGHT_MOVE, py2187.DOWN_MOVE]))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
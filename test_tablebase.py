@@ -0,0 +1,114 @@
+'''
+unit test for tablebase.py
+'''
+
+import shutil
+import tempfile
+import unittest
+
+import py2187
+import tablebase
+
+
+SEEDS = ((3,0.9),(9,0.1))
+
+
+def expected_score(board, rule, cache):
+    # The score to come under the best play, by plain expectimax
+    key = tuple(tuple(row) for row in board)
+    if key in cache:
+        return cache[key]
+
+    best = None
+    for vector in tablebase.MOVES:
+        merges = []
+        after, moved = py2187.make_move(board, vector, rule, merges=merges)
+        if not moved:
+            continue
+
+        empty = [(y, x) for y in range(len(after)) for x in range(len(after[0]))
+                 if after[y][x] == None]
+        chance = 0.0
+        for y, x in empty:
+            for value, probability in SEEDS:
+                after[y][x] = value
+                chance += probability * expected_score(after, rule, cache)
+                after[y][x] = None
+
+        score = sum(merges) + chance / len(empty)
+        if best == None or score > best:
+            best = score
+
+    if best == None:
+        best = 0.0
+    cache[key] = best
+    return best
+
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.count = tablebase.build(cls.directory, 2, 3, SEEDS, merge_length=3, target=27)
+        cls.table = tablebase.Tablebase(cls.directory)
+
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+
+    def test_scores_match_expectimax(self):
+        self.assertEqual(len(self.table), self.count)
+
+        rule = py2187.get_merge_rule(None, 3)
+        cache = {}
+        boards = [
+            [[3, None, None], [None, None, 3]],
+            [[3, 3, None], [9, None, None]],
+            [[9, 3, 9], [3, 9, 3]],
+        ]
+        for board in boards:
+            score, vector, win = self.table.lookup(board)
+            self.assertAlmostEqual(score, expected_score(board, rule, cache))
+
+            if vector != None:
+                self.assertTrue(py2187.make_move(board, vector, rule)[1])
+
+
+    def test_unreachable_boards(self):
+        self.assertEqual(self.table.lookup([[None, None, None], [None, None, None]]), None)
+        self.assertEqual(self.table.lookup([[5, 3, None], [None, None, None]]), None)
+        self.assertEqual(self.table.lookup([[3, None], [None, 3]]), None)
+
+
+    def test_target(self):
+        board = [[9, 9, None], [None, None, 9]]
+        score, vector, win = self.table.lookup(board)
+        self.assertTrue(0.0 < win <= 1.0)
+        self.assertEqual(self.table.lookup([[27, 3, None], [None, None, None]])[2], 1.0)
+
+
+    def test_check_game(self):
+        self.table.check_game({'rows': 2, 'cols': 3, 'seeds': SEEDS, 'merge_length': 3})
+
+        self.assertRaises(ValueError, self.table.check_game, {'rows': 3, 'cols': 3})
+        self.assertRaises(ValueError, self.table.check_game,
+                          {'rows': 2, 'cols': 3, 'seeds': ((3,1.0),)})
+        self.assertRaises(ValueError, self.table.check_game,
+                          {'rows': 2, 'cols': 3, 'seeds': SEEDS, 'merge_length': 2})
+        self.assertRaises(ValueError, self.table.check_game,
+                          {'rows': 2, 'cols': 3, 'seeds': SEEDS,
+                           'merge_lengths_func': py2187.power_merge_lengths})
+
+
+    def test_finished_board(self):
+        board = [[3, 9, 3], [9, 3, 9]]
+        self.assertEqual(self.table.lookup(board), (0.0, None, 0.0))
+
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+'''
+unit test for topology.py
+'''
+
+import random
+import unittest
+
+import py2187
+import topology
+
+
+N = None
+
+
+class Test(unittest.TestCase):
+
+    def test_square_same_as_make_move(self):
+        rng = random.Random(1)
+        rules = [(None, 2), (None, 3), (py2187.power_merge_lengths, None)]
+
+        for i in range(500):
+            rows = rng.randint(1, 6)
+            cols = rng.randint(1, 6)
+            board = [[rng.choice([N, N, 2, 2, 3, 4, 9]) for x in range(cols)] for y in range(rows)]
+            topology_board = topology.TopologyBoard.from_lists(board)
+
+            merge_lengths_func, merge_length = rng.choice(rules)
+            merge_rule = py2187.get_merge_rule(merge_lengths_func, merge_length)
+
+            for vector in topology.SQUARE_MOVES:
+                merges = []
+                new_board, moved = py2187.make_move(board, vector, merge_rule, merges=merges)
+                topology_merges = []
+                new_topology_board, topology_moved = py2187.make_move(
+                    topology_board, vector, merge_rule, merges=topology_merges)
+
+                self.assertEqual(new_topology_board.to_lists(), new_board)
+                self.assertEqual(topology_moved, moved)
+                self.assertEqual(sorted(topology_merges), sorted(merges))
+
+
+    def test_hex_lines(self):
+        hex_topology = topology.HexTopology(2)
+        self.assertEqual(len(hex_topology), 19)
+
+        for vector in topology.HEX_MOVES:
+            lines = hex_topology.lines(vector)
+            self.assertEqual(sorted(len(line) for line in lines), [3, 3, 4, 4, 5])
+            self.assertEqual(sorted(i for line in lines for i in line), list(range(19)))
+
+            # Each line runs back from its front cell, against the move
+            for line in lines:
+                q, r = hex_topology.cells[line[0]]
+                self.assertFalse((q + vector[0], r + vector[1]) in hex_topology.index)
+                for k in range(1, len(line)):
+                    self.assertEqual(hex_topology.cells[line[k]], (q - k * vector[0], r - k * vector[1]))
+
+        self.assertRaises(ValueError, hex_topology.lines, (1, 1))
+
+
+    def test_hex_move(self):
+        hex_topology = topology.HexTopology(1)
+        merge_rule = py2187.get_merge_rule(None, 2)
+
+        board = topology.TopologyBoard(hex_topology)
+        board.set((0, 0), 2)
+        board.set((-1, 0), 2)
+        board.set((-1, 1), 4)
+
+        merges = []
+        new_board, moved = py2187.make_move(board, topology.HEX_EAST, merge_rule, merges=merges)
+        self.assertTrue(moved)
+        self.assertEqual(merges, [4])
+        self.assertEqual(sorted(new_board.tiles()), [((0, 1), 4), ((1, 0), 4)])
+
+        new_board, moved = py2187.make_move(new_board, topology.HEX_SOUTH_WEST, merge_rule)
+        self.assertEqual(sorted(new_board.tiles()), [((0, 1), 8)])
+
+        self.assertEqual(hex_topology.format_board(new_board.values), " . .\n. . .\n . 8")
+
+
+    def test_hex_game(self):
+        game = topology.TopologyGame(topology.HexTopology(2), seeds=((2,0.9),(4,0.1)),
+                                     merge_length=2, random_seed=5)
+        game.initialise()
+        self.assertEqual(len(list(game.board.tiles())), 2)
+
+        moves = 0
+        while game.valid_move_exists() and moves < 1000:
+            game.make_move(game.rng.choice(topology.HEX_MOVES))
+            if game.moved:
+                game.add_seed_tile()
+                moves += 1
+
+        self.assertFalse(game.valid_move_exists())
+        self.assertTrue(game.score > 0)
+
+
+    def test_maze_segments(self):
+        maze = topology.MazeTopology.from_text(
+            ". .|. .\n"
+            "    -\n"
+            ". # . .\n")
+        self.assertEqual(maze.holes, set([(1, 1)]))
+        self.assertEqual(maze.walls, set([frozenset([(0, 1), (0, 2)]), frozenset([(0, 2), (1, 2)])]))
+
+        def cell_lines(vector):
+            return sorted([maze.cells[i] for i in line] for line in maze.lines(vector))
+
+        self.assertEqual(cell_lines(py2187.LEFT_MOVE),
+                         [[(0, 0), (0, 1)], [(0, 2), (0, 3)], [(1, 0)], [(1, 2), (1, 3)]])
+        self.assertEqual(cell_lines(py2187.DOWN_MOVE),
+                         [[(0, 1)], [(0, 2)], [(1, 0), (0, 0)], [(1, 2)], [(1, 3), (0, 3)]])
+
+        self.assertRaises(ValueError, topology.MazeTopology, 2, 2, (), [((0, 0), (1, 1))])
+
+
+    def test_maze_move(self):
+        H = py2187.HOLE
+        board = topology.TopologyBoard.from_lists([[2, 2, H, 2], [N, 4, H, 4]])
+        self.assertEqual(board.topology.holes, set([(0, 2), (1, 2)]))
+
+        merge_rule = py2187.get_merge_rule(None, 2)
+        new_board, moved = py2187.make_move(board, py2187.RIGHT_MOVE, merge_rule)
+        self.assertTrue(moved)
+        self.assertEqual(new_board.to_lists(), [[N, 4, H, 2], [N, 4, H, 4]])
+
+        game = topology.TopologyGame(board.topology, merge_length=2)
+        game.set_board([[2, 2, H, 2], [N, 4, H, 4]])
+        self.assertEqual(game.get_empty_cells(), [(1, 0)])
+        game.add_seed_tile()
+        self.assertEqual(game.get_empty_cells(), [])
+        self.assertTrue(H in game.get_board()[0])
+
+
+    def test_maze_game_over(self):
+        # The empty cell is walled in, so nothing can move into it
+        maze = topology.MazeTopology.from_text(
+            ". .|.\n"
+            "    -\n"
+            ". . .\n")
+        game = topology.TopologyGame(maze, merge_length=2)
+        game.set_board([[2, 4, N], [4, 2, 4]])
+        self.assertFalse(game.valid_move_exists())
+
+        game.set_board([[2, 4, N], [4, 2, 2]])
+        self.assertTrue(game.valid_move_exists())
+
+
+    def test_create_game(self):
+        game = py2187.create_game('topology', rows=3, cols=4, merge_length=2)
+        self.assertTrue(isinstance(game, topology.TopologyGame))
+
+        game.set_board([[2, 2, N, N], [N, N, N, N], [N, N, N, 4]])
+        game.make_move(py2187.LEFT_MOVE)
+        self.assertEqual(game.get_board(), [[4, N, N, N], [N, N, N, N], [4, N, N, N]])
+        self.assertEqual(game.score, 4)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
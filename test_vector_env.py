@@ -0,0 +1,112 @@
+'''
+unit test for vector_env.py
+'''
+
+import unittest
+
+import numpy as np
+
+import py2187
+import batched
+import vector_env
+
+
+N = None
+
+
+class Test(unittest.TestCase):
+
+    def test_channels(self):
+        self.assertEqual(vector_env.observation_channels(((3,0.9),(9,0.1)), merge_length=3),
+                         [(1, 3)])
+        self.assertEqual(vector_env.observation_channels(((2,0.5),(3,0.5)), merge_length=3),
+                         [(1, 3), (2, 3)])
+        self.assertEqual(vector_env.observation_channels(((2,0.6),(3,0.3),(4,0.1)),
+                                                         py2187.power_merge_lengths),
+                         [(1, 2), (1, 3)])
+        self.assertRaises(ValueError, vector_env.observation_channels, ((2,1),), lambda v: [2])
+        self.assertRaises(ValueError, vector_env.observation_channels, ((1,1.0),), None, 1)
+        self.assertRaises(ValueError, vector_env.observation_channels, ((1,1.0),),
+                          py2187.power_merge_lengths)
+
+        self.assertEqual(vector_env.channel_exponent(27, [(1, 3)]), (0, 4))
+        self.assertEqual(vector_env.channel_exponent(18, [(1, 3), (2, 3)]), (1, 3))
+        self.assertEqual(vector_env.channel_exponent(64, [(1, 2), (1, 3)]), (0, 7))
+        self.assertRaises(ValueError, vector_env.channel_exponent, 5, [(1, 2)])
+        self.assertRaises(ValueError, vector_env.channel_exponent, 1, [(1, 1)])
+
+        self.assertEqual(vector_env.integer_root(64), 2)
+        self.assertEqual(vector_env.integer_root(9), 3)
+        self.assertEqual(vector_env.integer_root(12), 12)
+
+
+    def test_step_matches_game(self):
+        env = vector_env.VectorEnv(50, rows=4, cols=4, seeds=((2,0.9),(4,0.1)),
+                                   merge_length=2, random_seed=1)
+        observations = env.reset()
+        self.assertEqual(np.count_nonzero(env.codes.reshape(50, -1), axis=1).tolist(), [2] * 50)
+
+        rng = np.random.default_rng(2)
+        game = py2187.Game(rows=4, cols=4, merge_length=2)
+        for i in range(100):
+            boards = env.get_boards()
+            actions = rng.integers(0, 4, 50)
+            masks = env.action_masks().copy()
+            scores = env.scores.copy()
+
+            result = env.step(actions)
+            self.assertTrue(result[0] is observations)
+            rewards, dones, info = result[1:]
+
+            for n in range(50):
+                board = batched.array_to_board(boards[n])
+                game.board = board
+                merges = []
+                new_board, moved = py2187.make_move(board, batched.DIRECTIONS[actions[n]],
+                                                    game.merge_rule, merges=merges)
+
+                self.assertEqual(moved, info['moved'][n])
+                self.assertEqual(moved, masks[n, actions[n]])
+                self.assertEqual(masks[n].any(), game.valid_move_exists())
+                self.assertEqual(rewards[n], sum(merges))
+                if dones[n]:
+                    self.assertEqual(info['final_scores'][n], scores[n] + rewards[n])
+
+        self.assertTrue(env.action_masks().any(axis=1).all())
+
+
+    def test_observations(self):
+        env = vector_env.VectorEnv(2, rows=2, cols=3, seeds=((2,0.5),(3,0.5)), merge_length=3)
+        env.reset()
+        env.codes[...] = batched.to_codes(env.engine, np.array([
+                                [[2, 6, 0], [3, 9, 18]],
+                                [[0, 0, 0], [0, 0, 27]],
+                               ]))
+        env._update_observations()
+
+        self.assertEqual(env.channels, [(1, 3), (2, 3)])
+        self.assertEqual(env.observations[0, 0].tolist(), [[0, 0, 0], [2, 3, 0]])
+        self.assertEqual(env.observations[0, 1].tolist(), [[1, 2, 0], [0, 0, 3]])
+        self.assertEqual(env.observations[1, 0].tolist(), [[0, 0, 0], [0, 0, 4]])
+
+
+    def test_cli_configurations(self):
+        argparser = py2187.create_argparser()
+        for argv in (['--basic', '3'], ['--basic', '4', '--multiple'], ['--seeds', '2', '5'],
+                     ['--multiple', '--seeds', '2', '3', '5', '-r', '5', '-c', '5']):
+            env = vector_env.VectorEnv(8, random_seed=0,
+                                       **py2187.game_kwargs_from_args(argparser.parse_args(argv)))
+            env.reset()
+            for i in range(50):
+                env.step(np.argmax(env.action_masks(), axis=1))
+
+            self.assertTrue(env.observations.max() > 1)
+
+        env = vector_env.VectorEnv(2)
+        self.assertRaises(ValueError, env.step, [0, 4])
+        self.assertRaises(ValueError, env.step, [0])
+
+
+
+if __name__ == "__main__":
+    unittest.main()
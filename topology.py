@@ -0,0 +1,448 @@
+"""
+
+Board topologies for py2187
+
+A topology is the shape of a board: its cells and the directions tiles can
+be tilted in. When a topology is made it works out, for every direction,
+the lines of cells a move acts on, as lists of cell indexes ordered from
+the cell the tiles move towards. A move then only runs over those lines
+with py2187.move_tiles, so there is no coordinate arithmetic or bounds
+checking while moving.
+
+A line runs from a cell with no neighbour in the direction of the move back
+through each cell's neighbour on the other side, until it leaves the board
+or meets a wall. So any set of cells works, not just rectangles, and holes
+and walls cost nothing while moving: they only split the lines into
+shorter segments.
+
+    SquareTopology(rows, cols)   the usual board, with the four move vectors
+                                 of py2187 and cells (y, x)
+    HexTopology(radius)          a hexagon of hexagons, with the six vectors
+                                 of HEX_MOVES and cells in axial
+                                 coordinates (q, r)
+    MazeTopology(rows, cols,     a square board with missing cells and
+                 holes, walls)   walls between cells, which can be read
+                                 from text with MazeTopology.from_text
+
+A TopologyBoard holds a value for each cell of a topology in a flat list.
+py2187.make_move moves it with its own make_move, and a TopologyGame plays
+a game on one.
+
+"""
+
+import random
+
+import py2187
+
+
+# The six directions of a hex board in axial coordinates (q, r), where
+# q goes across and r goes down and to the left
+HEX_EAST = (1, 0)
+HEX_WEST = (-1, 0)
+HEX_NORTH_EAST = (1, -1)
+HEX_SOUTH_WEST = (-1, 1)
+HEX_NORTH_WEST = (0, -1)
+HEX_SOUTH_EAST = (0, 1)
+
+HEX_MOVES = (HEX_EAST, HEX_WEST, HEX_NORTH_EAST, HEX_SOUTH_WEST, HEX_NORTH_WEST, HEX_SOUTH_EAST)
+
+SQUARE_MOVES = (py2187.UP_MOVE, py2187.DOWN_MOVE, py2187.LEFT_MOVE, py2187.RIGHT_MOVE)
+
+
+
+class Topology:
+    """
+    A board shape. cells is a list of coordinate tuples and steps maps each
+    move vector, as a tuple, to the coordinate step of that move. walls is
+    a list of pairs of neighbouring cells that tiles can't move between.
+    """
+
+    def __init__(self, cells, steps, walls=()):
+        self.cells = list(cells)
+        self.index = dict((cell, i) for i, cell in enumerate(self.cells))
+        self.directions = [vector for vector, step in steps]
+        self.steps = dict(steps)
+        self.walls = set(frozenset(wall) for wall in walls)
+
+        self._lines = {}
+        for vector, step in self.steps.items():
+            self._lines[vector] = self._find_lines(step)
+
+        # The cells a tile can move to each cell from
+        self.neighbours = [[] for cell in self.cells]
+        for lines in self._lines.values():
+            for line in lines:
+                for k in range(1, len(line)):
+                    self.neighbours[line[k - 1]].append(line[k])
+
+
+    def __len__(self):
+        return len(self.cells)
+
+
+    def _find_lines(self, step):
+        lines = []
+        for cell in self.cells:
+            if self._linked(cell, self._step(cell, step)):
+                continue
+
+            # cell is at the front of a line
+            line = [self.index[cell]]
+            behind = self._step(cell, step, -1)
+            while self._linked(cell, behind):
+                line.append(self.index[behind])
+                cell = behind
+                behind = self._step(cell, step, -1)
+            lines.append(line)
+
+        return lines
+
+
+    def _linked(self, cell, other):
+        return other in self.index and frozenset((cell, other)) not in self.walls
+
+
+    def _step(self, cell, step, sign=1):
+        return tuple(c + sign * s for c, s in zip(cell, step))
+
+
+    def lines(self, vector):
+        """
+        Returns the lines of cell indexes a move acts on, each ordered from
+        the cell the tiles move towards.
+        """
+
+        lines = self._lines.get(tuple(vector))
+        if lines == None:
+            raise ValueError("%s isn't a direction of this board." % (vector,))
+
+        return lines
+
+
+
+class SquareTopology(Topology):
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+
+        # A move vector is [dx, dy] and a cell is (y, x)
+        steps = [(tuple(vector), (vector[1], vector[0])) for vector in SQUARE_MOVES]
+        Topology.__init__(self, [(y, x) for y in range(rows) for x in range(cols)], steps)
+
+
+
+class MazeTopology(SquareTopology):
+    """
+    A square board without the cells in holes and with walls between the
+    pairs of neighbouring cells in walls, each given as (y, x).
+    """
+
+    def __init__(self, rows, cols, holes=(), walls=()):
+        self.rows = rows
+        self.cols = cols
+        self.holes = set(tuple(cell) for cell in holes)
+
+        for wall in walls:
+            (y1, x1), (y2, x2) = wall
+            if abs(y1 - y2) + abs(x1 - x2) != 1:
+                raise ValueError("A wall has to be between neighbouring cells: %s" % (wall,))
+
+        steps = [(tuple(vector), (vector[1], vector[0])) for vector in SQUARE_MOVES]
+        cells = [(y, x) for y in range(rows) for x in range(cols) if (y, x) not in self.holes]
+        Topology.__init__(self, cells, steps, [tuple(tuple(cell) for cell in wall) for wall in walls])
+
+
+    @classmethod
+    def from_text(cls, text):
+        """
+        Reads a maze drawn as text. Rows of cells are on alternate lines,
+        with a cell in every other column: '.' for a cell and '#' or a
+        space for a hole. A '|' between two cells is a wall between them, and a '-' on
+        the line between two rows is a wall under the cell above it.
+
+            . .|. .
+                -
+            . # . .
+        """
+
+        lines = text.rstrip().split('\n')
+        row_lines = lines[0::2]
+        wall_lines = lines[1::2]
+        rows = len(row_lines)
+        cols = max((len(line) + 1) // 2 for line in row_lines)
+
+        holes = []
+        walls = []
+        for y in range(rows):
+            line = row_lines[y].ljust(2 * cols)
+            for x in range(cols):
+                if line[2 * x] in '# ':
+                    holes.append((y, x))
+                elif line[2 * x] != '.':
+                    raise ValueError("Unknown cell %r in row %d" % (line[2 * x], y))
+                if x + 1 < cols and line[2 * x + 1] == '|':
+                    walls.append(((y, x), (y, x + 1)))
+
+        for y in range(len(wall_lines)):
+            line = wall_lines[y]
+            for x in range(min(cols, (len(line) + 1) // 2)):
+                if line[2 * x] == '-':
+                    walls.append(((y, x), (y + 1, x)))
+
+        return cls(rows, cols, holes, walls)
+
+
+
+class HexTopology(Topology):
+    """
+    A hexagonal board of hexagonal cells, radius cells from the centre to
+    each edge, so it has 3 * radius * (radius + 1) + 1 cells.
+    """
+
+    def __init__(self, radius):
+        self.radius = radius
+
+        cells = []
+        for r in range(-radius, radius + 1):
+            for q in range(max(-radius, -radius - r), min(radius, radius - r) + 1):
+                cells.append((q, r))
+
+        Topology.__init__(self, cells, [(vector, vector) for vector in HEX_MOVES])
+
+
+    def format_board(self, values):
+        """
+        Returns the values of a hex board as text, a row of cells per line
+        with each row shifted by half a cell.
+        """
+
+        width = max([len(str(value)) for value in values if value != None] + [1])
+        text = []
+        for r in range(-self.radius, self.radius + 1):
+            row = [values[self.index[(q, r)]] for q in range(-self.radius, self.radius + 1)
+                   if (q, r) in self.index]
+            cells = ['.'.center(width) if value == None else str(value).center(width)
+                     for value in row]
+            text.append(' ' * ((width + 1) * abs(r) // 2) + ' '.join(cells))
+
+        return '\n'.join(text)
+
+
+
+_square_topologies = {}
+
+
+def square_topology(rows, cols):
+    """
+    Returns a shared SquareTopology, so the lines of each board shape are
+    only worked out once.
+    """
+
+    key = (rows, cols)
+    topology = _square_topologies.get(key)
+    if topology == None:
+        topology = SquareTopology(rows, cols)
+        _square_topologies[key] = topology
+
+    return topology
+
+
+
+def move_values(values, lines, merge_rule, merges=None):
+    """
+    Moves the tiles of a flat list of cell values along lines of cell
+    indexes. Returns (new_values, moved).
+    """
+
+    new_values = list(values)
+    something_moved = False
+
+    for line in lines:
+        tiles = []
+        for i in range(len(line)):
+            value = values[line[i]]
+            if value != None:
+                tiles.append((i, value))
+
+        if len(tiles) == 0:
+            continue
+
+        new_tiles, moved = py2187.move_tiles(tiles, len(line), merge_rule, None, merges)
+
+        if moved:
+            something_moved = True
+
+            for i, value in tiles:
+                new_values[line[i]] = None
+            for i, value in new_tiles:
+                new_values[line[i]] = value
+
+    return (new_values, something_moved)
+
+
+
+class TopologyBoard:
+
+    def __init__(self, topology, values=None):
+        self.topology = topology
+        if values == None:
+            values = [None] * len(topology)
+        self.values = values
+
+
+    @classmethod
+    def from_lists(cls, board):
+        """
+        Makes a board on a square topology from lists. Cells that are
+        py2187.HOLE become holes.
+        """
+
+        holes = [(y, x) for y in range(len(board)) for x in range(len(board[0]))
+                 if board[y][x] is py2187.HOLE]
+        if len(holes) > 0:
+            topology = MazeTopology(len(board), len(board[0]), holes)
+        else:
+            topology = square_topology(len(board), len(board[0]))
+
+        return cls(topology, [board[y][x] for y, x in topology.cells])
+
+
+    def to_lists(self):
+        """
+        Returns the board of a square topology as lists, with py2187.HOLE
+        in the holes.
+        """
+
+        board = [[py2187.HOLE for x in range(self.topology.cols)] for y in range(self.topology.rows)]
+        for i in range(len(self.values)):
+            y, x = self.topology.cells[i]
+            board[y][x] = self.values[i]
+
+        return board
+
+
+    def __eq__(self, other):
+        return (isinstance(other, TopologyBoard) and self.topology is other.topology and
+                self.values == other.values)
+
+
+    def __ne__(self, other):
+        return not self == other
+
+
+    def get(self, cell):
+        return self.values[self.topology.index[cell]]
+
+
+    def set(self, cell, value):
+        self.values[self.topology.index[cell]] = value
+
+
+    def tiles(self):
+        """
+        Yields (cell, value) for every tile.
+        """
+
+        for i in range(len(self.values)):
+            if self.values[i] != None:
+                yield (self.topology.cells[i], self.values[i])
+
+
+    def make_move(self, vector, merge_rule, merges=None):
+        """
+        Returns (new_board, moved) like py2187.make_move.
+        """
+
+        values, moved = move_values(self.values, self.topology.lines(vector), merge_rule, merges)
+        return (TopologyBoard(self.topology, values), moved)
+
+
+
+class TopologyGame:
+    """
+    A game on a TopologyBoard. It has the same interface as py2187.Game
+    except for undo and redo, and cells are the topology's coordinates.
+    get_board() and set_board() are only for square topologies.
+    """
+
+    def __init__(self, topology, seeds=((3,0.9),(9,0.1)),
+                 merge_length=3, merge_lengths_func=None, random_seed=None):
+
+        self.merge_rule = py2187.get_merge_rule(merge_lengths_func, merge_length)
+
+        if merge_lengths_func == None:
+            self.merge_lengths_func = self.merge_rule
+            self.merge_length = merge_length
+        else:
+            self.merge_lengths_func = merge_lengths_func
+            self.merge_length = None
+
+        if random_seed == None:
+            random_seed = random.getrandbits(63)
+        self.random_seed = random_seed
+        self.rng = random.Random(random_seed)
+
+        self.topology = topology
+        self.seeds = seeds
+        self.board = TopologyBoard(topology)
+        self.score = 0
+        self.moved = False
+        self._seed_table = None
+
+
+    def initialise(self):
+        self.add_seed_tile()
+        self.add_seed_tile()
+
+
+    def get_board(self):
+        return self.board.to_lists()
+
+
+    def set_board(self, board):
+        self.board = TopologyBoard(self.topology, [board[y][x] for y, x in self.topology.cells])
+
+
+    def set_cell(self, cell, value):
+        self.board.set(cell, value)
+
+
+    def make_move(self, vector, animate=False):
+        merges = []
+        self.board, self.moved = self.board.make_move(vector, self.merge_rule, merges)
+        self.score += sum(merges)
+
+
+    def get_empty_cells(self):
+        return [self.topology.cells[i] for i in range(len(self.topology))
+                if self.board.values[i] == None]
+
+
+    def add_seed_tile(self):
+        if self._seed_table == None or self._seed_table.seeds is not self.seeds:
+            self._seed_table = py2187.AliasTable(self.seeds)
+
+        empty_cells = self.get_empty_cells()
+        if len(empty_cells) > 0:
+            self.set_cell(self.rng.choice(empty_cells), self._seed_table.sample(self.rng))
+
+
+    def valid_move_exists(self):
+        # An empty cell only gives a move if a tile can move into it, which
+        # it might not next to holes and walls
+        values = self.board.values
+        if None in values:
+            neighbours = self.topology.neighbours
+            for i in range(len(values)):
+                if values[i] == None:
+                    for j in neighbours[i]:
+                        if values[j] != None:
+                            return True
+
+        for vector in self.topology.directions:
+            new_board, moved = self.board.make_move(vector, self.merge_rule)
+            if moved:
+                return True
+
+        return False
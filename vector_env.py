@@ -0,0 +1,274 @@
+"""
+
+A vectorised reinforcement learning environment for py2187
+
+VectorEnv plays N games at once in the style of a Gym vector environment:
+reset() starts every game and step(actions) makes one move on each board.
+The moves are made by the batched engine, so they follow the same rules as
+py2187.make_move.
+
+Observations are held in one preallocated uint8 array of shape
+(N, channels, rows, cols) that is updated in place; reset and step return
+the same array every time. Each channel is a (coefficient, base) pair and a
+tile of value coefficient * base ** e is shown in its channel as e + 1,
+with 0 for an empty cell. The channels are worked out from the game's rules
+and seeds:
+
+    merge_length m      a channel (c, m) for each seed, where c is the seed
+                        with every factor of m divided out
+    power merge rule    a channel (1, r) for each seed, where r is the
+                        smallest root of the seed
+
+So a --basic 3 game has the single channel (1, 3), and the 3, 9 and 27
+tiles show as 2, 3 and 4.
+
+Rewards are the sum of the tiles made by merges, like Game.score. An action
+that moves nothing gets no reward and no seed tile. The legal actions are
+the ones that move a tile, and a game is done when there are none; done
+games are reset straight away.
+
+    env = VectorEnv(64, **py2187.game_kwargs_from_args(args))
+    observations = env.reset()
+    observations, rewards, dones, info = env.step(actions)
+
+"""
+
+import numpy as np
+
+import py2187
+import packed
+import batched
+
+
+
+def integer_root(value):
+    """
+    Returns the smallest r such that value is a power of r.
+    """
+
+    for k in range(value.bit_length(), 1, -1):
+        root = int(round(value ** (1.0 / k)))
+        for r in (root - 1, root, root + 1):
+            if r >= 2 and r ** k == value:
+                return r
+
+    return value
+
+
+
+def observation_channels(seeds, merge_lengths_func=None, merge_length=3):
+    """
+    Returns the list of (coefficient, base) observation channels for a game.
+    Raises ValueError if a channel's base would be less than 2, as tiles of
+    base 1 don't have an exponent.
+    """
+
+    channels = []
+    for seed in seeds:
+        value = seed[0]
+        if merge_lengths_func == None:
+            if merge_length < 2:
+                raise ValueError("Observations need a merge length of at least 2.")
+            coefficient = value
+            while coefficient % merge_length == 0:
+                coefficient //= merge_length
+            channel = (coefficient, merge_length)
+        elif merge_lengths_func is py2187.power_merge_lengths:
+            if value < 2:
+                raise ValueError("Observations need seed tiles of at least 2 with "
+                                 "power_merge_lengths, not %d." % value)
+            channel = (1, integer_root(value))
+        else:
+            raise ValueError("Observations are only defined for a fixed merge length "
+                             "or power_merge_lengths.")
+
+        if channel not in channels:
+            channels.append(channel)
+
+    return sorted(channels)
+
+
+
+def channel_exponent(value, channels):
+    """
+    Returns (channel index, e + 1) for value = coefficient * base ** e, using
+    the first channel that fits.
+    """
+
+    for i in range(len(channels)):
+        coefficient, base = channels[i]
+        if base < 2:
+            raise ValueError("Observation channel base %d is less than 2." % base)
+        if value % coefficient == 0:
+            rest = value // coefficient
+            e = 0
+            while rest % base == 0:
+                rest //= base
+                e += 1
+            if rest == 1:
+                return (i, e + 1)
+
+    raise ValueError("Tile %d doesn't fit any observation channel." % value)
+
+
+
+class VectorEnv:
+
+    def __init__(self, num_envs, rows=6, cols=6, seeds=((3,0.9),(9,0.1)),
+                 merge_length=3, merge_lengths_func=None, random_seed=None):
+
+        self.num_envs = num_envs
+        self.rows = rows
+        self.cols = cols
+        self.engine = packed.get_engine(merge_lengths_func, merge_length)
+        self.channels = observation_channels(seeds, merge_lengths_func, merge_length)
+        self.rng = np.random.default_rng(random_seed)
+
+        self.codes = np.zeros((num_envs, rows, cols), dtype=np.uint8)
+        self.observations = np.zeros((num_envs, len(self.channels), rows, cols), dtype=np.uint8)
+        self.scores = np.zeros(num_envs, dtype=np.int64)
+        self.masks = np.zeros((num_envs, len(batched.DIRECTIONS)), dtype=bool)
+
+        # The observation of each engine code in each channel
+        self._exponents = np.zeros((len(self.channels), packed.MAX_CODES), dtype=np.uint8)
+        self._known_codes = 1
+        self._unfit_codes = []
+
+        # A seed of None (no tile) has code 0
+        probabilities = py2187.seed_probabilities(seeds)
+        self._seed_codes = np.array([self.engine.code(value) for value, probability in probabilities],
+                                    dtype=np.uint8)
+        self._seed_thresholds = np.cumsum([probability for value, probability in probabilities])
+
+
+    def reset(self):
+        self.codes[...] = 0
+        self.scores[...] = 0
+
+        everything = np.arange(self.num_envs)
+        self._spawn(everything)
+        self._spawn(everything)
+
+        self._update_masks()
+        self._update_observations()
+        return self.observations
+
+
+    def step(self, actions):
+        """
+        Makes one move on every board. actions holds an index into
+        batched.DIRECTIONS for each board.
+
+        Returns (observations, rewards, dones, info). info['final_scores']
+        holds the score of each game that finished, which has already been
+        reset, and info['moved'] says which boards moved.
+        """
+
+        actions = np.asarray(actions)
+        if actions.shape != (self.num_envs,):
+            raise ValueError("There must be one action per board.")
+        if not np.isin(actions, range(len(batched.DIRECTIONS))).all():
+            raise ValueError("Actions must be between 0 and %d." % (len(batched.DIRECTIONS) - 1))
+
+        new_codes = np.empty_like(self.codes)
+        rewards = np.zeros(self.num_envs, dtype=np.int64)
+        for direction in range(len(batched.DIRECTIONS)):
+            selected = actions == direction
+            if selected.any():
+                new_codes[selected], rewards[selected] = batched.move_codes(
+                    self.engine, self.codes[selected], direction, True)
+
+        moved = (new_codes != self.codes).any(axis=(1, 2))
+        self.codes[...] = new_codes
+        self.scores += rewards
+        self._spawn(np.nonzero(moved)[0])
+
+        self._update_masks()
+        dones = ~self.masks.any(axis=1)
+        final_scores = np.where(dones, self.scores, 0)
+
+        finished = np.nonzero(dones)[0]
+        if len(finished) > 0:
+            self.codes[finished] = 0
+            self.scores[finished] = 0
+            self._spawn(finished)
+            self._spawn(finished)
+            self._update_masks(finished)
+
+        self._update_observations()
+
+        info = {'final_scores': final_scores, 'moved': moved}
+        return (self.observations, rewards, dones, info)
+
+
+    def action_masks(self):
+        """
+        Returns an (N, 4) bool array of the actions that move a tile.
+        """
+
+        return self.masks
+
+
+    def get_boards(self):
+        """
+        Returns the boards as an (N, rows, cols) array of tile values.
+        """
+
+        return batched.from_codes(self.engine, self.codes)
+
+
+    def _spawn(self, boards):
+        # Adds a seed tile to a random empty cell of each of the boards
+        if len(boards) == 0:
+            return
+
+        cells = self.codes.reshape(self.num_envs, -1)
+        empty = cells[boards] == 0
+
+        choice = self.rng.random(empty.shape)
+        choice[~empty] = -1.0
+        chosen = choice.argmax(axis=1)
+
+        seed_codes = self._seed_codes[batched.seed_indexes(self._seed_thresholds,
+                                                           self.rng.random(len(boards)))]
+
+        has_empty = empty.any(axis=1)
+        cells[boards[has_empty], chosen[has_empty]] = seed_codes[has_empty]
+
+
+    def _update_masks(self, boards=None):
+        if boards is None:
+            codes = self.codes
+        else:
+            codes = self.codes[boards]
+
+        masks = np.empty((len(codes), len(batched.DIRECTIONS)), dtype=bool)
+        for direction in range(len(batched.DIRECTIONS)):
+            masks[:, direction] = (batched.move_codes(self.engine, codes, direction)
+                                   != codes).any(axis=(1, 2))
+
+        if boards is None:
+            self.masks[...] = masks
+        else:
+            self.masks[boards] = masks
+
+
+    def _update_observations(self):
+        # New tile values may have been given codes since the last update.
+        # The engine is shared with other games, so some of its tiles may
+        # not fit these channels, but then they can't be on these boards.
+        while self._known_codes < len(self.engine.values):
+            code = self._known_codes
+            try:
+                channel, exponent = channel_exponent(self.engine.values[code], self.channels)
+                self._exponents[channel, code] = exponent
+            except ValueError:
+                self._unfit_codes.append(code)
+            self._known_codes += 1
+
+        if len(self._unfit_codes) > 0 and np.isin(self.codes, self._unfit_codes).any():
+            raise ValueError("A tile doesn't fit any observation channel.")
+
+        for channel in range(len(self.channels)):
+            np.take(self._exponents[channel], self.codes, out=self.observations[:, channel],
+                    mode='clip')